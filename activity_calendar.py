@@ -0,0 +1,110 @@
+# Import bisect to search the sorted calendar lists quickly.
+from bisect import bisect_right
+# Import date for the largest possible date in calendar lookups.
+from datetime import date
+
+# Import the shared activities dictionary from common.py.
+from common import activities
+# Import the date and day parsing helpers.
+from schedule import parse_date, parse_days, parse_time_range, session_dates, today
+
+# --- Parsed Schedules ---
+# The 'start_date', 'end_date' and 'days' strings in data.json are parsed once per activity and reused.
+# Key: activity_id, Value: dictionary with 'start', 'end' (date or None), 'weekdays' (list of ints),
+# 'times' ((start, end) minutes or None) and 'source' (the raw strings the values came from).
+_parsed = {}
+
+# --- Calendar Index ---
+# For each weekday (0 = Monday), a list of (start_date, end_date, activity_id) sorted by start date.
+# Finding what runs on a date only has to look at that weekday's list, and bisect skips every
+# activity that hasn't started yet.
+_by_weekday = {}
+# Whether _by_weekday matches the current activities. Cleared by invalidate_calendar().
+_index_valid = False
+
+def get_schedule(activity_id):
+    """Returns the parsed schedule for an activity, parsing its strings only if they have changed."""
+    data = activities.get(activity_id, {})
+    source = (data.get("start_date", ""), data.get("end_date", ""), data.get("days", ""), data.get("time", ""))
+    cached = _parsed.get(activity_id)
+    if cached is None or cached["source"] != source:
+        cached = {
+            "start": parse_date(source[0]),
+            "end": parse_date(source[1]),
+            "weekdays": parse_days(source[2]),
+            "times": parse_time_range(source[3]),
+            "source": source,
+        }
+        _parsed[activity_id] = cached
+    return cached
+
+def invalidate_calendar(activity_id=None):
+    """Marks the calendar index as out of date after activities are added, edited or deleted.
+
+    Passing an activity_id also drops that activity's parsed schedule.
+    """
+    global _index_valid
+    _index_valid = False
+    if activity_id is not None:
+        _parsed.pop(activity_id, None)
+
+def _ensure_index():
+    """Rebuilds the weekday index if it is out of date."""
+    global _index_valid
+    if _index_valid:
+        return
+    _by_weekday.clear()
+    # Forget parsed schedules for activities that no longer exist.
+    for act_id in list(_parsed):
+        if act_id not in activities:
+            del _parsed[act_id]
+    for act_id in activities:
+        sched = get_schedule(act_id)
+        # Activities without valid dates can't be placed on the calendar.
+        if not sched["start"] or not sched["end"]:
+            continue
+        for weekday in sched["weekdays"]:
+            _by_weekday.setdefault(weekday, []).append((sched["start"], sched["end"], act_id))
+    for entries in _by_weekday.values():
+        entries.sort()
+    _index_valid = True
+
+# --- Calendar Queries ---
+
+def activities_on(day):
+    """Returns the IDs of activities with a session on the given date, sorted by start time."""
+    _ensure_index()
+    entries = _by_weekday.get(day.weekday(), [])
+    # Every entry after this point starts later than 'day', so only earlier entries need checking.
+    cutoff = bisect_right(entries, (day, date.max, float("inf")))
+    running = [act_id for start, end, act_id in entries[:cutoff] if end >= day]
+    return sorted(running, key=lambda act_id: (get_schedule(act_id)["times"] or (24 * 60, 0), act_id))
+
+def activities_running_today():
+    """Returns the IDs of activities with a session today."""
+    return activities_on(today())
+
+def active_between(first_day, last_day):
+    """Returns the IDs of activities whose date range overlaps the period (e.g., a school term)."""
+    active = []
+    for act_id in sorted(activities):
+        sched = get_schedule(act_id)
+        if sched["start"] and sched["end"] and sched["start"] <= last_day and sched["end"] >= first_day:
+            active.append(act_id)
+    return active
+
+def has_ended(activity_id, on=None):
+    """Returns True if an activity's end date is before the given date (today by default).
+
+    Activities with no valid end date are never treated as ended.
+    """
+    end = get_schedule(activity_id)["end"]
+    return end is not None and end < (on or today())
+
+def iter_sessions(activity_id, first_day=None):
+    """Lazily yields the dates of an activity's sessions, starting from 'first_day' if given.
+
+    Dates are produced one at a time, so callers can stop early (e.g., "next 3 sessions") for free.
+    Uses schedule.session_dates(), so the calendar, attendance and fees all agree on the sessions.
+    """
+    yield from session_dates(activities.get(activity_id, {}), first_day=first_day)
@@ -1,12 +1,47 @@
 # Import the tkinter library for creating graphical user interfaces (GUIs)
 import tkinter as tk
 # Import specific widgets (ttk for themed widgets, messagebox for pop-up messages)
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+# Import threading so the batch jobs (reports, statements, feeds) run without freezing the window.
+import threading
 
 # Import shared data (dictionaries like activities, students, USERS, teachers)
 # and functions (save_data, format_student_info) from the common.py file.
 # This allows different parts of the application to access the same information.
-from common import activities, students, USERS, teachers, save_data, format_student_info
+from common import activities, students, USERS, teachers, save_data, format_student_info, get_enrolled_students, touch_record, delete_activity
+from common import apply_enrolment_changes, is_year_eligible, format_teacher_name, remaining_seats
+# Import the bulk roster generator used by the "Generate Reports" button.
+from reports import generate_reports, REPORTS_DIR
+# Import the email notification helpers used when activities are changed or cancelled.
+from notifications import build_change_messages, build_cancellation_messages, send_in_background
+# Import the calendar index so it can be refreshed when activities change.
+from activity_calendar import invalidate_calendar
+# Import the end-of-year rollover job.
+from rollover import run_rollover
+# Import the query API used by the activity filter bar.
+from query import run_query, QueryError
+# Import the helper that makes Treeview columns sortable by clicking their headings.
+from sortable_tree import SortableTree
+# Import the cross-campus summary (one line per school plus totals).
+from tenants import cross_campus_report, format_report, list_tenants
+# Import the preference allocation engine for oversubscribed activities.
+from allocation import allocate, preview_lines, commit_allocation
+# Import the fee ledger's statement batch job (importing it also turns on automatic join/leave charges).
+from ledger import generate_statements, STATEMENTS_DIR
+# Import the backup helpers used by the "Backups" panel.
+from backups import list_backups, describe_backup, take_backup, restore_backup
+# Import the duplicate-student detection used on import and by the "Find Duplicates" audit.
+from duplicates import import_students, add_students, find_duplicates, merge_students, describe_student
+# Import the cold archive of ended activities.
+from archive import find_archivable, archive_ended_activities, get_archive
+# Import the enrolment history (importing it also records every join and leave) for the trends chart.
+from enrolment_history import series, peak
+# Import the data integrity audit and repair.
+from integrity import check_integrity, repair_issues, describe_issue, summarise_issues
+# Import the teacher workload figures, worked out from the teacher -> activities index.
+from teacher_view import workload_rows
+# Import the batch job that writes calendar feeds.
+from calendar_feeds import generate_feeds, FEEDS_DIR
 
 # Define a class named AdminFrame, which inherits from ttk.Frame.
 # This class represents the main panel for the administrator view.
@@ -38,6 +73,17 @@ class AdminFrame(ttk.Frame):
         # 'anchor=tk.NW' aligns the label to the top-left (North-West). 'pady=(0, 10)' adds padding below the label.
         ttk.Label(left_panel, text="Activities Overview", font=("Arial", 16, "bold")).pack(anchor=tk.NW, pady=(0, 10))
 
+        # Filter bar, e.g. "cost<30 day=Tue spare_seats>0" (see query.py for the syntax).
+        filter_frame = ttk.Frame(left_panel)
+        filter_frame.pack(fill=tk.X)
+        ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.filter_entry = ttk.Entry(filter_frame)
+        self.filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        # Pressing Enter in the filter box applies it.
+        self.filter_entry.bind("<Return>", lambda event: self.refresh_activities())
+        ttk.Button(filter_frame, text="Apply", command=self.refresh_activities).pack(side=tk.LEFT)
+        ttk.Button(filter_frame, text="Clear", command=self.clear_filter).pack(side=tk.LEFT, padx=(5, 0))
+
         # Create a Treeview widget to display the list of activities in a table format.
         # Define the column identifiers.
         columns = ("activity_id", "activity", "cost", "enrollments", "income")
@@ -45,7 +91,7 @@ class AdminFrame(ttk.Frame):
         self.activity_tree = ttk.Treeview(left_panel, columns=columns, show="headings", height=15)
         # Call a helper method to configure the appearance of the columns (headings, widths).
         # Pass the tree, column names, and specific widths for some columns.
-        self.setup_treeview_columns(self.activity_tree, columns, {"cost": 60, "enrollments": 90, "income": 90, "activity_id": 80})
+        self.activity_sorter = self.setup_treeview_columns(self.activity_tree, columns, {"cost": 60, "enrollments": 90, "income": 90, "activity_id": 80})
         # Place the Treeview in the left panel, making it fill the available space.
         self.activity_tree.pack(fill=tk.BOTH, expand=True, pady=5)
         # Bind the '<<TreeviewSelect>>' event (when an item is selected) to the 'on_activity_select' method.
@@ -61,6 +107,35 @@ class AdminFrame(ttk.Frame):
         ttk.Button(btn_frame, text="Add/Edit Activity", command=self.show_activity_editor).pack(side=tk.LEFT, padx=5)
         # Create a "Delete Activity" button, linking its click action to the 'delete_selected_activity' method.
         ttk.Button(btn_frame, text="Delete Activity", command=self.delete_selected_activity).pack(side=tk.LEFT, padx=5)
+        # The other admin tools are in a "Tools" drop-down menu, so the button row fits in the window.
+        tools_button = ttk.Menubutton(btn_frame, text="Tools")
+        tools_button.pack(side=tk.LEFT, padx=5)
+        tools_menu = tk.Menu(tools_button, tearoff=False)
+        tools_button["menu"] = tools_menu
+        # Enrolment tools: seat allocation, student import and duplicate merging.
+        tools_menu.add_command(label="Allocate Seats", command=self.allocate_seats)
+        tools_menu.add_command(label="Import Students", command=self.import_students_csv)
+        tools_menu.add_command(label="Find Duplicates", command=self.show_duplicates)
+        tools_menu.add_separator()
+        # Reports and exports: rosters, fee statements, calendar feeds, workload and trends.
+        tools_menu.add_command(label="Generate Reports", command=self.generate_all_reports)
+        tools_menu.add_command(label="Fee Statements", command=self.write_fee_statements)
+        tools_menu.add_command(label="Calendar Feeds", command=self.write_calendar_feeds)
+        tools_menu.add_command(label="Teacher Workload", command=self.show_teacher_workload)
+        tools_menu.add_command(label="Enrolment Trends", command=self.show_enrolment_trends)
+        # Only shown when more than one campus is set up in tenants.json.
+        if len(list_tenants()) > 1:
+            tools_menu.add_command(label="Campus Summary", command=self.show_campus_summary)
+        tools_menu.add_separator()
+        # Data maintenance: year rollover, archiving, integrity checks and backups.
+        tools_menu.add_command(label="Year Rollover", command=self.year_rollover)
+        tools_menu.add_command(label="Archive Ended", command=self.archive_ended)
+        tools_menu.add_command(label="Check Data", command=self.show_integrity_check)
+        tools_menu.add_command(label="Backups", command=self.show_backups)
+        # Shows the progress of a batch job running in the background (blank when none is running).
+        self.batch_status = ttk.Label(btn_frame, text="")
+        self.batch_status.pack(side=tk.LEFT, padx=5)
+        self.batch_running = False
 
         # --- Right Panel Initial State ---
         # Call a method to clear the right panel and display an initial message.
@@ -72,7 +147,7 @@ class AdminFrame(ttk.Frame):
 
     # Method to configure the columns of a Treeview widget.
     def setup_treeview_columns(self, tree, cols, widths=None):
-        """Helper to configure Treeview columns."""
+        """Helper to configure Treeview columns. Returns the SortableTree used to fill the tree."""
         # Initialize widths dictionary if not provided.
         widths = widths or {}
         # Loop through each column identifier.
@@ -81,6 +156,8 @@ class AdminFrame(ttk.Frame):
             tree.heading(col, text=col.replace("_", " ").title()) # Make headings readable
             # Set the column width (use provided width or default to 100), align content to the left (West).
             tree.column(col, width=widths.get(col, 100), anchor=tk.W) # Default width 100
+        # Clicking a heading sorts by that column. Rows must be added through the returned sorter.
+        return SortableTree(tree, cols)
 
     # Method to clear all widgets from the right panel.
     def clear_right_panel(self, message=""):
@@ -96,31 +173,51 @@ class AdminFrame(ttk.Frame):
     # Method to reload and display the activity data in the main Treeview.
     def refresh_activities(self):
         """Reload and display activity data in the treeview."""
-        # Delete all existing items currently in the activity tree.
-        self.activity_tree.delete(*self.activity_tree.get_children()) # Clear existing items
-        # Access the global 'activities' dictionary imported from common.py.
-        # Sort the activities by their ID (key) before displaying.
-        sorted_activities = sorted(activities.items()) # Display sorted by ID
-
-        # Loop through each activity ID and its data in the sorted list.
-        for act_id, data in sorted_activities:
+        # Work out which activities to show. With a filter, the query API returns just the matching IDs.
+        filter_text = self.filter_entry.get().strip()
+        if filter_text:
+            try:
+                activity_ids = run_query("activity", filter_text)
+            except QueryError as e:
+                messagebox.showerror("Filter Error", str(e))
+                return
+        else:
+            activity_ids = activities.keys()
+
+        # Build the rows for the activities to show (row ID -> values).
+        rows = {}
+        # Loop through each activity ID in the list.
+        for act_id in activity_ids:
+            data = activities.get(act_id, {})
             # Get the cost, defaulting to 0 if not found.
             cost = data.get("cost", 0)
             # Count how many students are enrolled in this activity using a helper method.
             enroll_count = self.count_enrollments(act_id)
             # Calculate the total income for this activity.
             income = cost * enroll_count
-            # Insert a new row into the activity tree with the calculated values.
-            # Format cost and income as currency strings.
-            self.activity_tree.insert("", tk.END, values=(act_id, data.get("activity", "N/A"), f"${cost}", enroll_count, f"${income}"))
+            # Format cost and income as currency strings (they still sort as numbers).
+            rows[act_id] = (act_id, data.get("activity", "N/A"), f"${cost}", enroll_count, f"${income}")
+        # Only new, changed or removed rows are updated; the list keeps its current sort order.
+        self.activity_sorter.sync(rows)
+
+    # Method called when the data file was changed outside the program (see data_watcher.py).
+    def refresh_after_reload(self, changes):
+        """Update the activity list with reloaded changes."""
+        # Enrolment counts come from students, so either kind of change can alter the list.
+        if changes["activity"] or changes["student"]:
+            self.refresh_activities()
+
+    # Method to remove the activity filter and show every activity again.
+    def clear_filter(self):
+        """Clear the filter box and reload the full activity list."""
+        self.filter_entry.delete(0, tk.END)
+        self.refresh_activities()
 
     # Method to count enrollments for a specific activity ID.
     def count_enrollments(self, activity_id):
         """Count how many students are enrolled in a specific activity."""
-        # Access the global 'students' dictionary imported from common.py.
-        # Use a generator expression and sum() to count students.
-        # It checks if the 'activity_id' is present in the 'activities_enrolled' list for each student.
-        return sum(1 for s_data in students.values() if activity_id in s_data.get("activities_enrolled", []))
+        # Look the activity up in the enrolment index (from common.py) instead of scanning every student.
+        return len(get_enrolled_students(activity_id))
 
     # Method to display the form for adding a new activity or editing an existing one.
     def show_activity_editor(self, activity_id_to_edit=None):
@@ -157,7 +254,11 @@ class AdminFrame(ttk.Frame):
             "Cost ($)": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("cost", ""), "row": 7},
             "Teacher ID": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("teacher_id", ""), "row": 8},
             "Start Date (DD/MM/YYYY)": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("start_date", ""), "row": 9},
-            "End Date (DD/MM/YYYY)": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("end_date", ""), "row": 10}
+            "End Date (DD/MM/YYYY)": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("end_date", ""), "row": 10},
+            # Optional seat limit; leave blank for no limit.
+            "Capacity": {"entry": ttk.Entry(editor_frame), "value": activity_data.get("capacity", ""), "row": 11},
+            # "Yes" means students rank this activity and seats are allocated instead of first come, first served.
+            "Preference Round (Yes/No)": {"entry": ttk.Entry(editor_frame), "value": "Yes" if activity_data.get("by_preference") else "No", "row": 12}
         }
 
         # Loop through the defined fields to create labels and entry widgets.
@@ -245,10 +346,10 @@ class AdminFrame(ttk.Frame):
 
         # Define the columns for the enrolled students Treeview.
         cols = ("student_id", "name", "year_level", "house")
-        # Create the Treeview widget.
-        student_tree = ttk.Treeview(enroll_frame, columns=cols, show="headings", height=12)
+        # Create the Treeview widget. 'extended' lets the admin select many students (Shift/Ctrl-click).
+        student_tree = ttk.Treeview(enroll_frame, columns=cols, show="headings", height=12, selectmode="extended")
         # Configure the columns using the helper method.
-        self.setup_treeview_columns(student_tree, cols, {"year_level": 80, "house": 100, "student_id": 80})
+        student_sorter = self.setup_treeview_columns(student_tree, cols, {"year_level": 80, "house": 100, "student_id": 80})
         # Place the Treeview, making it fill the available space.
         student_tree.pack(fill=tk.BOTH, expand=True, pady=5)
         # Bind the selection event to the 'on_student_select' method (to potentially show more details later, though not implemented here).
@@ -256,18 +357,14 @@ class AdminFrame(ttk.Frame):
 
         # Populate the Treeview with enrolled students.
         enrolled_count = 0
-        # Access the global 'students' dictionary.
-        # Sort students by ID for consistent display order.
-        sorted_students_view = sorted(students.items())
-        # Iterate through all students.
-        for s_id, s_data in sorted_students_view:
-            # Check if the current student is enrolled in the selected activity.
-            if activity_id in s_data.get("activities_enrolled", []):
-                # Construct the student's full name.
-                fullname = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
-                # Insert the student's information into the Treeview.
-                student_tree.insert("", tk.END, values=(s_id, fullname, s_data.get("year_level", "N/A"), s_data.get("house", "N/A")))
-                enrolled_count += 1
+        # Use the enrolment index to visit only the enrolled students (the sorter keeps them in ID order).
+        for s_id in get_enrolled_students(activity_id):
+            s_data = students.get(s_id, {})
+            # Construct the student's full name.
+            fullname = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
+            # Insert the student's information into the Treeview.
+            student_sorter.insert((s_id, fullname, s_data.get("year_level", "N/A"), s_data.get("house", "N/A")), s_id)
+            enrolled_count += 1
 
         # If no students are enrolled, display a message below the (empty) tree.
         if enrolled_count == 0:
@@ -286,6 +383,20 @@ class AdminFrame(ttk.Frame):
         close_button = ttk.Button(button_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit."))
         close_button.pack(side=tk.LEFT, padx=5)
 
+        # --- Bulk Actions ---
+        bulk_frame = ttk.Frame(enroll_frame)
+        bulk_frame.pack(pady=(0, 10), anchor=tk.SW)
+        # Button to open the panel for enrolling many students at once.
+        ttk.Button(bulk_frame, text="Bulk Enrol...", command=lambda: self.show_bulk_enrol(activity_id, activity_name)).pack(side=tk.LEFT, padx=5)
+        # Button to unenrol every student selected in the list above.
+        ttk.Button(bulk_frame, text="Unenrol Selected", command=lambda: self.unenrol_selected(student_tree, activity_id, activity_name)).pack(side=tk.LEFT, padx=5)
+        # Drop-down and button for moving the whole roster to another activity.
+        ttk.Label(bulk_frame, text="Move all to:").pack(side=tk.LEFT, padx=(10, 5))
+        move_combo = ttk.Combobox(bulk_frame, state="readonly", width=22,
+                                  values=[f"{a_id} - {a_data.get('activity', 'N/A')}" for a_id, a_data in sorted(activities.items()) if a_id != activity_id])
+        move_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Button(bulk_frame, text="Move Roster", command=lambda: self.move_roster(activity_id, activity_name, move_combo.get())).pack(side=tk.LEFT, padx=5)
+
 
     # Method called when a student is selected in the 'enrolled students' Treeview.
     # Currently, this method doesn't do anything significant, but it's here as a placeholder
@@ -305,6 +416,162 @@ class AdminFrame(ttk.Frame):
             print("Student deselected.")
 
 
+    # --- Bulk Enrolment Methods ---
+
+    # Method to display the bulk enrolment panel for an activity.
+    def show_bulk_enrol(self, activity_id, activity_name):
+        """Display filters and a multi-select student list for enrolling many students at once."""
+        self.clear_right_panel()
+        bulk_frame = ttk.Frame(self.right_panel, padding=10)
+        bulk_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(bulk_frame, text=f"Bulk Enrol into: {activity_name} (ID: {activity_id})", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+
+        # --- Filters ---
+        filter_frame = ttk.Frame(bulk_frame)
+        filter_frame.pack(fill=tk.X)
+        # Year level and house choices are taken from the students that actually exist.
+        years = sorted({s.get("year_level") for s in students.values() if s.get("year_level") is not None})
+        houses = sorted({s.get("house") for s in students.values() if s.get("house")})
+        ttk.Label(filter_frame, text="Year:").pack(side=tk.LEFT)
+        year_combo = ttk.Combobox(filter_frame, state="readonly", width=5, values=["All"] + years)
+        year_combo.set("All")
+        year_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="House:").pack(side=tk.LEFT)
+        house_combo = ttk.Combobox(filter_frame, state="readonly", width=10, values=["All"] + houses)
+        house_combo.set("All")
+        house_combo.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="Name:").pack(side=tk.LEFT)
+        name_entry = ttk.Entry(filter_frame, width=12)
+        name_entry.pack(side=tk.LEFT, padx=5)
+        # Only show students whose year level is allowed in this activity (ticked by default).
+        eligible_only = tk.BooleanVar(value=True)
+        ttk.Checkbutton(filter_frame, text="Eligible only", variable=eligible_only).pack(side=tk.LEFT, padx=5)
+
+        # --- Matching Students ---
+        cols = ("student_id", "name", "year_level", "house")
+        match_tree = ttk.Treeview(bulk_frame, columns=cols, show="headings", height=12, selectmode="extended")
+        match_sorter = self.setup_treeview_columns(match_tree, cols, {"year_level": 80, "house": 100, "student_id": 80})
+        match_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        count_label = ttk.Label(bulk_frame, text="")
+        count_label.pack(anchor=tk.W)
+
+        # Inner function that fills the list using the current filter values.
+        def apply_filters(event=None):
+            rows = {}
+            year = year_combo.get()
+            house = house_combo.get()
+            name_text = name_entry.get().strip().lower()
+            allowed_years = activities.get(activity_id, {}).get("year_level", "N/A")
+            already_enrolled = get_enrolled_students(activity_id)
+            shown = 0
+            for s_id, s_data in students.items():
+                # Students already in the activity are left out.
+                if s_id in already_enrolled:
+                    continue
+                if year != "All" and str(s_data.get("year_level")) != year:
+                    continue
+                if house != "All" and s_data.get("house") != house:
+                    continue
+                fullname = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
+                if name_text and name_text not in fullname.lower():
+                    continue
+                if eligible_only.get() and not is_year_eligible(s_data.get("year_level"), allowed_years):
+                    continue
+                rows[s_id] = (s_id, fullname, s_data.get("year_level", "N/A"), s_data.get("house", "N/A"))
+                shown += 1
+            # Only rows that start or stop matching are added or removed, in the current sort order.
+            match_sorter.sync(rows)
+            count_label.config(text=f"{shown} student(s) match. Select students (Shift/Ctrl-click) or use 'Select All Shown'.")
+
+        # Re-filter whenever a filter changes.
+        year_combo.bind("<<ComboboxSelected>>", apply_filters)
+        house_combo.bind("<<ComboboxSelected>>", apply_filters)
+        name_entry.bind("<KeyRelease>", apply_filters)
+        eligible_only.trace_add("write", lambda *args: apply_filters())
+        apply_filters()
+
+        # --- Buttons ---
+        button_frame = ttk.Frame(bulk_frame)
+        button_frame.pack(pady=10, anchor=tk.SW)
+        ttk.Button(button_frame, text="Select All Shown", command=lambda: match_tree.selection_set(match_tree.get_children())).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Enrol Selected", command=lambda: self.enrol_selected(match_tree, activity_id, activity_name)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Back", command=lambda: self.show_enrolled_students(activity_id, activity_name)).pack(side=tk.LEFT, padx=5)
+
+    # Helper that reads the student IDs of the selected rows of a student Treeview.
+    def get_selected_student_ids(self, tree):
+        """Return the student IDs of the selected rows (the first column of each row)."""
+        return [int(tree.item(item, "values")[0]) for item in tree.selection()]
+
+    # Method to enrol every selected student in an activity as one transaction.
+    def enrol_selected(self, tree, activity_id, activity_name):
+        """Enrol all selected students in the activity with a single save."""
+        student_ids = self.get_selected_student_ids(tree)
+        if not student_ids:
+            messagebox.showinfo("Bulk Enrol", "Please select at least one student.")
+            return
+        if not messagebox.askyesno("Confirm Bulk Enrol", f"Enrol {len(student_ids)} student(s) in '{activity_name}'?"):
+            return
+        result = apply_enrolment_changes(enrolments=[(s_id, activity_id) for s_id in student_ids])
+        # Students who couldn't be enrolled because the activity filled up are reported with the result.
+        refused = [s_id for s_id in student_ids if s_id in students and activity_id not in students[s_id].get("activities_enrolled", [])]
+        self.finish_bulk_change(result, activity_id, activity_name, "Bulk Enrol", refused if result else ())
+
+    # Method to unenrol every selected student from an activity as one transaction.
+    def unenrol_selected(self, tree, activity_id, activity_name):
+        """Unenrol all selected students from the activity with a single save."""
+        student_ids = self.get_selected_student_ids(tree)
+        if not student_ids:
+            messagebox.showinfo("Unenrol", "Please select at least one student in the list.")
+            return
+        if not messagebox.askyesno("Confirm Unenrol", f"Unenrol {len(student_ids)} student(s) from '{activity_name}'?"):
+            return
+        result = apply_enrolment_changes(unenrolments=[(s_id, activity_id) for s_id in student_ids])
+        self.finish_bulk_change(result, activity_id, activity_name, "Unenrol")
+
+    # Method to move every student in one activity into another.
+    def move_roster(self, activity_id, activity_name, target_text):
+        """Move the whole roster of an activity to the activity chosen in the drop-down."""
+        try:
+            target_id = int(target_text.split(" - ", 1)[0])
+        except ValueError:
+            messagebox.showinfo("Move Roster", "Please choose an activity to move the students to.")
+            return
+        student_ids = sorted(get_enrolled_students(activity_id))
+        if not student_ids:
+            messagebox.showinfo("Move Roster", "There are no students to move.")
+            return
+        target_name = activities.get(target_id, {}).get("activity", target_id)
+        # Moving is all or nothing: students who didn't fit would lose their place in both activities.
+        moving = [s_id for s_id in student_ids if target_id not in students.get(s_id, {}).get("activities_enrolled", [])]
+        seats = remaining_seats(target_id)
+        if seats is not None and len(moving) > seats:
+            messagebox.showerror("Move Roster", f"'{target_name}' only has {seats} seat(s) left for {len(moving)} student(s).")
+            return
+        if not messagebox.askyesno("Confirm Move", f"Move all {len(student_ids)} student(s) from '{activity_name}' to '{target_name}'?"):
+            return
+        # Unenrolments and enrolments are applied together and saved once.
+        result = apply_enrolment_changes(enrolments=[(s_id, target_id) for s_id in student_ids],
+                                         unenrolments=[(s_id, activity_id) for s_id in student_ids])
+        self.finish_bulk_change(result, activity_id, activity_name, "Move Roster")
+
+    # Helper that reports the outcome of a bulk change and refreshes the views.
+    def finish_bulk_change(self, result, activity_id, activity_name, title, refused=()):
+        """Show the result of a bulk enrolment change and refresh the lists.
+
+        'refused' lists students who weren't enrolled because the activity was full.
+        """
+        if result is None:
+            # save_data() has already shown the error; nothing was changed.
+            messagebox.showerror(title, "The changes could not be saved and have been undone.")
+        else:
+            added, removed = result
+            message = f"{added} enrolment(s) added, {removed} removed."
+            if refused:
+                message += f"\n{len(refused)} student(s) were not enrolled because '{activity_name}' is full."
+            messagebox.showinfo(title, message)
+        self.refresh_activities()
+        self.show_enrolled_students(activity_id, activity_name)
+
     # Method to delete the activity currently selected in the main activity Treeview.
     def delete_selected_activity(self):
         """Delete the selected activity after confirmation."""
@@ -338,21 +605,19 @@ class AdminFrame(ttk.Frame):
             confirm_message = f"Are you sure you want to delete the activity:\n'{activity_name}' (ID: {activity_id})?"
             # If there are enrollments, add a warning to the message.
             if enrollment_count > 0:
-                confirm_message += f"\n\nWarning: {enrollment_count} student(s) are currently enrolled. Deleting the activity will NOT automatically unenroll them (manual cleanup might be needed in student records if this feature isn't added)."
+                confirm_message += f"\n\nWarning: {enrollment_count} student(s) are currently enrolled. They will be unenrolled and credited for the part of the activity that hasn't run yet."
 
             # Show a confirmation dialog box ('askyesno' returns True for Yes, False for No).
             if messagebox.askyesno("Confirm Deletion", confirm_message):
                 # --- Perform Deletion ---
                 # Check if the activity ID exists in the global 'activities' dictionary.
                 if activity_id in activities:
-                    # Remove the activity from the dictionary.
-                    del activities[activity_id]
-                    # --- Optional: Unenroll students (Good Practice) ---
-                    # Iterate through all students and remove this activity_id from their enrollment list.
-                    for s_id, s_data in students.items():
-                        if activity_id in s_data.get("activities_enrolled", []):
-                            s_data["activities_enrolled"].remove(activity_id)
-                            print(f"Unenrolled student {s_id} from deleted activity {activity_id}") # Log action
+                    # Unenrol every student (while the activity still exists, so they are credited
+                    # for what is left of it), then remove it. The IDs are kept to tell them about the cancellation.
+                    notify_ids = delete_activity(activity_id)
+                    print(f"Unenrolled {len(notify_ids)} student(s) from deleted activity {activity_id}") # Log action
+                    # The calendar index and any cached details no longer match the activities.
+                    invalidate_calendar(activity_id)
 
                     # Save the updated data (activities and students) to the JSON file.
                     save_data(activities, students, USERS, teachers)
@@ -362,6 +627,8 @@ class AdminFrame(ttk.Frame):
                     self.refresh_activities()
                     # Clear the right panel as the deleted activity's details are no longer relevant.
                     self.clear_right_panel("Activity deleted. Select another activity.")
+                    # Offer to email the students who were enrolled.
+                    self.offer_notifications(*build_cancellation_messages(activity_name, notify_ids))
                 else:
                     # If the activity ID wasn't found (shouldn't happen if list is up-to-date).
                     messagebox.showerror("Error", "Activity not found in data. It might have been deleted already.")
@@ -394,6 +661,8 @@ class AdminFrame(ttk.Frame):
             elif label == "Teacher ID": key = "teacher_id"
             elif label == "Start Date (DD/MM/YYYY)": key = "start_date"
             elif label == "End Date (DD/MM/YYYY)": key = "end_date"
+            elif label == "Capacity": key = "capacity"
+            elif label == "Preference Round (Yes/No)": key = "by_preference"
             else: continue # Skip Activity ID field
 
             # --- Basic Input Validation ---
@@ -411,6 +680,23 @@ class AdminFrame(ttk.Frame):
                     # If conversion fails, show an error and stop saving.
                     messagebox.showerror("Input Error", "'Cost' must be a valid number (e.g., 25).")
                     return
+            elif key == "capacity":
+                # A blank capacity means no limit (the key is left out of the activity).
+                if value:
+                    try:
+                        new_data[key] = int(value)
+                        if new_data[key] < 0:
+                            raise ValueError
+                    except ValueError:
+                        messagebox.showerror("Input Error", "'Capacity' must be a whole number of seats (or blank for no limit).")
+                        return
+            elif key == "by_preference":
+                # Accept yes/no in any case; only store the flag when it is on.
+                if value.lower() in ("yes", "y", "true"):
+                    new_data[key] = True
+                elif value.lower() not in ("", "no", "n", "false"):
+                    messagebox.showerror("Input Error", "'Preference Round' must be Yes or No.")
+                    return
             elif key == "teacher_id":
                 try:
                     # Attempt to convert the teacher ID to an integer.
@@ -437,8 +723,10 @@ class AdminFrame(ttk.Frame):
             # Find the next available activity ID.
             # If 'activities' is not empty, start from max existing ID + 1.
             # Otherwise, start from a base ID (e.g., 2001).
-            if activities:
-                new_id = max(activities.keys()) + 1
+            # Archived activities keep their IDs, so they are counted too.
+            highest = max(max(activities, default=0), get_archive().highest_id())
+            if highest:
+                new_id = highest + 1
             else:
                 new_id = 2001 # Starting ID if no activities exist
             # Add the new activity data to the global 'activities' dictionary using the new ID.
@@ -449,8 +737,14 @@ class AdminFrame(ttk.Frame):
             # --- Editing Existing Activity ---
             # Check if the activity ID still exists (it should, but double-check).
             if activity_id_to_edit in activities:
+                # Keep a copy of the old details so changes can be reported to enrolled students.
+                old_data = dict(activities[activity_id_to_edit])
                 # Update the existing entry in the 'activities' dictionary with the new data.
                 activities[activity_id_to_edit].update(new_data)
+                # Optional fields left blank (or switched off) are removed rather than kept from before.
+                for optional_key in ("capacity", "by_preference"):
+                    if optional_key not in new_data:
+                        activities[activity_id_to_edit].pop(optional_key, None)
                 # Set success message for editing.
                 success_message = f"Activity '{new_data['activity']}' (ID: {activity_id_to_edit}) updated successfully."
             else:
@@ -459,6 +753,12 @@ class AdminFrame(ttk.Frame):
                 return
 
         # --- Save and Update GUI ---
+        # The ID of the activity that was just added or edited.
+        saved_id = new_id if activity_id_to_edit is None else activity_id_to_edit
+        # Dates or days may have changed, so the calendar index needs rebuilding.
+        invalidate_calendar(saved_id)
+        # Mark the activity as changed so cached details and other indexes are rebuilt.
+        touch_record("activity", saved_id)
         # Save all data (including the changes to 'activities') to the JSON file.
         save_data(activities, students, USERS, teachers)
         # Show the appropriate success message.
@@ -466,4 +766,438 @@ class AdminFrame(ttk.Frame):
         # Refresh the main activity list in the GUI to show the changes.
         self.refresh_activities()
         # Clear the right panel (remove the editor form) and show the default message.
-        self.clear_right_panel("Select an activity to see details or edit.")
\ No newline at end of file
+        self.clear_right_panel("Select an activity to see details or edit.")
+        # If an existing activity moved or changed time, offer to email its enrolled students.
+        if activity_id_to_edit is not None:
+            self.offer_notifications(*build_change_messages(activity_id_to_edit, old_data))
+
+    # Method to ask the admin whether to email students about a change, then send in the background.
+    def offer_notifications(self, messages, skipped_ids):
+        """Ask to send notification emails and dispatch them without blocking the GUI."""
+        # Nothing to do if no enrolled student needs to be told.
+        if not messages and not skipped_ids:
+            return
+        prompt = f"Email {len(messages)} enrolled student(s) about this change?"
+        # Mention students who can't be emailed so staff can contact them another way.
+        if skipped_ids:
+            prompt += f"\n\n{len(skipped_ids)} student(s) have no email address: {', '.join(map(str, skipped_ids))}"
+        if messages and messagebox.askyesno("Notify Students", prompt):
+            send_in_background(messages)
+        elif not messages:
+            messagebox.showinfo("Notify Students", prompt.split("\n\n", 1)[1])
+
+    # Helper used by the batch jobs in the Tools menu (reports, fee statements and calendar feeds).
+    def run_batch(self, title, job, describe, error_title, error_text):
+        """Runs a batch job on a background thread so the window stays responsive while it works.
+
+        'job' is called with a progress function and its result is passed to describe() for the message
+        shown when it finishes. Progress and the final message are sent back with self.after(), because
+        only the main thread may touch the widgets.
+        """
+        if self.batch_running:
+            messagebox.showinfo(title, f"{self.batch_running} is still running. Please wait for it to finish.")
+            return
+        self.batch_running = title
+        self.batch_status.config(text=f"{title}: starting...")
+
+        def post(callback):
+            # The window may have been closed (e.g., on logout) while the job was running.
+            try:
+                self.after(0, callback)
+            except (tk.TclError, RuntimeError):
+                pass
+
+        def progress(count):
+            # Update the label every 20 files rather than flooding the main thread with updates.
+            if count % 20 == 0:
+                post(lambda: self.batch_status.config(text=f"{title}: {count} done..."))
+
+        def finish(message, error):
+            self.batch_running = False
+            self.batch_status.config(text="")
+            if error is None:
+                messagebox.showinfo(title, message)
+            else:
+                messagebox.showerror(error_title, f"{error_text}: {error}")
+
+        def worker():
+            try:
+                message, error = describe(job(progress)), None
+            except Exception as e:
+                # Report any problem (e.g., the folder can't be written) instead of losing it on the thread.
+                message, error = None, e
+            post(lambda: finish(message, error))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    # Method called when "Generate Reports" is chosen from the Tools menu.
+    def generate_all_reports(self):
+        """Generate HTML and CSV rosters for every activity into the reports folder."""
+        # Build every roster in one pass; rendering is spread across worker processes.
+        self.run_batch("Reports Generated", lambda progress: generate_reports(REPORTS_DIR, progress=progress),
+                       lambda result: f"Generated {result[0]} roster(s).\nSummary: {result[1]}",
+                       "Report Error", "Failed to generate reports")
+
+    # Method called when "Campus Summary" is chosen from the Tools menu.
+    def show_campus_summary(self):
+        """Show enrolments and income for every campus, read from each campus's saved summary."""
+        try:
+            # Campuses that aren't loaded are read from their small summary files, not their full data.
+            lines = format_report(*cross_campus_report())
+        except Exception as e:
+            messagebox.showerror("Campus Summary", f"Failed to build the campus summary: {e}")
+            return
+        messagebox.showinfo("Campus Summary", "\n".join(lines))
+
+    # Method called when "Fee Statements" is chosen from the Tools menu.
+    def write_fee_statements(self):
+        """Write fee statements for every student into the statements folder."""
+        # The ledger is read once and statements are rendered on worker processes.
+        self.run_batch("Fee Statements", lambda progress: generate_statements(STATEMENTS_DIR, progress=progress),
+                       lambda result: f"Wrote {result[0]} statement(s).\nSummary: {result[1]}",
+                       "Statement Error", "Failed to write statements")
+
+    # Method called when "Archive Ended" is chosen from the Tools menu.
+    def archive_ended(self):
+        """Move every activity that has ended, with its enrolments, into the archive after confirming."""
+        ended = find_archivable()
+        if not ended:
+            messagebox.showinfo("Archive Ended", "No activities have ended.")
+            return
+        names = "\n".join(f"- {activities[a].get('activity', a)}" for a in ended[:15])
+        more = f"\n...and {len(ended) - 15} more" if len(ended) > 15 else ""
+        if not messagebox.askyesno("Confirm Archive", f"Move {len(ended)} ended activit{'y' if len(ended) == 1 else 'ies'} and their enrolments "
+                                                      f"into the archive?\n\n{names}{more}\n\nThey stay available to reports with 'python reports.py --archived'."):
+            return
+        try:
+            archived = archive_ended_activities()
+        except Exception as e:
+            messagebox.showerror("Archive Error", f"Failed to archive activities: {e}")
+            return
+        messagebox.showinfo("Archive Ended", f"Archived {len(archived)} activit{'y' if len(archived) == 1 else 'ies'}.")
+        self.refresh_activities()
+        self.clear_right_panel("Select an activity to see details or edit.")
+
+    # Method called when "Calendar Feeds" is chosen from the Tools menu.
+    def write_calendar_feeds(self):
+        """Write (or refresh) the calendar feeds in the feeds folder."""
+        # Only feeds whose clubs changed since the last run are rewritten.
+        self.run_batch("Calendar Feeds", lambda progress: generate_feeds(FEEDS_DIR, progress=progress),
+                       lambda result: f"Wrote {result[0]} feed(s), {result[1]} unchanged, {result[2]} removed.\nFeeds are in '{FEEDS_DIR}'.",
+                       "Calendar Feed Error", "Failed to write calendar feeds")
+
+    # Method called when "Import Students" is chosen from the Tools menu.
+    def import_students_csv(self):
+        """Import students from a CSV file, asking before adding rows that look like existing students."""
+        path = filedialog.askopenfilename(title="Import Students", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            # Likely duplicates are held back; everything else is added with a single save.
+            result = import_students(path)
+        except Exception as e:
+            messagebox.showerror("Import Error", f"Failed to import '{path}': {e}")
+            return
+        lines = [f"Added {len(result['added'])} student(s)."]
+        lines += result["errors"][:10]
+        if result["flagged"]:
+            lines.append(f"\n{len(result['flagged'])} row(s) look like students who already exist and were not added:")
+            for line, record, matches in result["flagged"][:10]:
+                lines.append(f"Line {line}: {describe_student(record)} ~ {describe_student(matches[0][1]) if matches[0][1] in students else matches[0][1]}")
+            lines.append("\nAdd them anyway?")
+            if messagebox.askyesno("Import Students", "\n".join(lines)):
+                added = add_students([record for _, record, _ in result["flagged"]])
+                messagebox.showinfo("Import Students", f"Added {len(added)} more student(s).")
+        else:
+            messagebox.showinfo("Import Students", "\n".join(lines))
+
+    # Method called when "Enrolment Trends" is chosen from the Tools menu.
+    def show_enrolment_trends(self):
+        """Display a chart of joins, leaves and enrolment over time for a chosen activity."""
+        self.clear_right_panel()
+        trend_frame = ttk.Frame(self.right_panel, padding=10)
+        trend_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(trend_frame, text="Enrolment Trends", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+
+        # Drop-downs for the activity ("2001 - Basketball") and the bucket size.
+        choose_frame = ttk.Frame(trend_frame)
+        choose_frame.pack(fill=tk.X)
+        activity_combo = ttk.Combobox(choose_frame, state="readonly", width=30,
+                                      values=[f"{act_id} - {data.get('activity', 'N/A')}" for act_id, data in sorted(activities.items())])
+        activity_combo.pack(side=tk.LEFT)
+        resolution_combo = ttk.Combobox(choose_frame, state="readonly", width=8, values=("day", "hour"))
+        resolution_combo.set("day")
+        resolution_combo.pack(side=tk.LEFT, padx=5)
+
+        canvas = tk.Canvas(trend_frame, width=520, height=280, background="white", highlightthickness=1, highlightbackground="#999")
+        canvas.pack(pady=5)
+        summary_label = ttk.Label(trend_frame, text="Choose an activity to see its trend.", wraplength=500)
+        summary_label.pack(anchor=tk.W)
+
+        def redraw(event=None):
+            if not activity_combo.get():
+                return
+            # The ID is read back from the start of the entry, e.g. "2001 - Basketball".
+            act_id = int(activity_combo.get().split(" - ")[0])
+            resolution = resolution_combo.get()
+            # The counts are already added up per bucket, so this doesn't depend on how many joins there were.
+            rows = series(act_id, resolution)
+            self.draw_enrolment_trend(canvas, rows)
+            if not rows:
+                summary_label.config(text="No joins or leaves have been recorded for this activity yet.")
+                return
+            busiest = peak(act_id, resolution)
+            summary_label.config(text=f"{sum(r[1] for r in rows)} join(s) and {sum(r[2] for r in rows)} leave(s) from {rows[0][0]} to {rows[-1][0]}. "
+                                      f"Busiest {resolution}: {busiest[0]} ({busiest[1]} join(s)). Now enrolled: {rows[-1][3]}.")
+
+        activity_combo.bind("<<ComboboxSelected>>", redraw)
+        resolution_combo.bind("<<ComboboxSelected>>", redraw)
+        ttk.Button(trend_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit.")).pack(anchor=tk.SW, pady=10)
+
+    # Helper that draws a trend (rows from enrolment_history.series()) on a canvas.
+    def draw_enrolment_trend(self, canvas, rows, max_bars=60):
+        """Draw joins (green, up) and leaves (red, down) as bars and the number enrolled as a line."""
+        canvas.delete("all")
+        # Only the most recent buckets fit across the chart.
+        rows = rows[-max_bars:]
+        if not rows:
+            return
+        width, height = int(canvas["width"]), int(canvas["height"])
+        left, right, top, bottom = 40, width - 10, 15, height - 25
+        # Bars share the chart with the axis 70% of the way down; leaves hang below it.
+        axis = top + (bottom - top) * 0.7
+        most = max(max(r[1], r[2]) for r in rows) or 1
+        bar_scale = (axis - top) / most
+        slot = (right - left) / len(rows)
+        canvas.create_line(left, axis, right, axis, fill="#999")
+        for i, (label, joins, leaves, _) in enumerate(rows):
+            x0, x1 = left + i * slot + 1, left + (i + 1) * slot - 1
+            if joins:
+                canvas.create_rectangle(x0, axis - joins * bar_scale, x1, axis, fill="#4caf50", outline="")
+            if leaves:
+                canvas.create_rectangle(x0, axis, x1, min(axis + leaves * bar_scale, bottom), fill="#e53935", outline="")
+        # The enrolled line uses its own scale, from 0 to the highest count.
+        highest = max(r[3] for r in rows) or 1
+        points = []
+        for i, row in enumerate(rows):
+            points += [left + (i + 0.5) * slot, bottom - (bottom - top) * max(row[3], 0) / highest]
+        if len(points) >= 4:
+            canvas.create_line(*points, fill="black", width=2)
+        canvas.create_text(left - 5, top, text=str(highest), anchor=tk.E)
+        canvas.create_text(left - 5, bottom, text="0", anchor=tk.E)
+        canvas.create_text(left, height - 5, text=rows[0][0], anchor=tk.SW)
+        canvas.create_text(right, height - 5, text=rows[-1][0], anchor=tk.SE)
+
+    # Method called when "Find Duplicates" is chosen from the Tools menu.
+    def show_duplicates(self):
+        """Display likely duplicate students (best matches first) with a button to merge a pair."""
+        self.clear_right_panel()
+        dup_frame = ttk.Frame(self.right_panel, padding=10)
+        dup_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(dup_frame, text="Likely Duplicate Students", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+        cols = ("score", "keep_id", "keep", "merge_id", "merge")
+        dup_tree = ttk.Treeview(dup_frame, columns=cols, show="headings", height=12, selectmode="browse")
+        dup_sorter = self.setup_treeview_columns(dup_tree, cols, {"score": 60, "keep_id": 70, "merge_id": 70, "keep": 220, "merge": 220})
+        dup_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        # Only students sharing a block (surname sound + date of birth, or house + year) are compared.
+        pairs = find_duplicates()
+        for score, a, b in pairs:
+            dup_sorter.insert((f"{score:.2f}", a, describe_student(a), b, describe_student(b)), iid=f"{a}-{b}")
+        dup_sorter.sort_by("score", descending=True)
+        ttk.Label(dup_frame, text=f"{len(pairs)} likely duplicate pair(s). Merging keeps the first student and "
+                                  f"moves the second one's clubs, login, attendance and fees onto it.").pack(anchor=tk.W)
+
+        button_frame = ttk.Frame(dup_frame)
+        button_frame.pack(pady=10, anchor=tk.SW)
+        ttk.Button(button_frame, text="Merge Selected", command=lambda: self.merge_selected_duplicate(dup_tree)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit.")).pack(side=tk.LEFT, padx=5)
+
+    # Method called when the "Merge Selected" button is clicked.
+    def merge_selected_duplicate(self, tree):
+        """Merge the second student of the selected pair into the first after confirmation."""
+        selection = tree.selection()
+        if not selection:
+            messagebox.showinfo("Merge Students", "Please select a pair of students to merge.")
+            return
+        # The row ID is "keep-merge".
+        keep_id, drop_id = (int(part) for part in selection[0].split("-"))
+        if not messagebox.askyesno("Confirm Merge", f"Keep {keep_id} {describe_student(keep_id)}\n"
+                                                    f"and merge {drop_id} {describe_student(drop_id)} into it?\n\n"
+                                                    f"Student {drop_id} is removed."):
+            return
+        try:
+            merged = merge_students(keep_id, drop_id)
+        except ValueError as e:
+            messagebox.showerror("Merge Students", str(e))
+            return
+        if merged:
+            messagebox.showinfo("Merge Students", f"Student {drop_id} was merged into {keep_id}.")
+        self.refresh_activities()
+        self.show_duplicates()
+
+    # Method called when "Teacher Workload" is chosen from the Tools menu.
+    def show_teacher_workload(self):
+        """Display every teacher's activities, sessions, hours and students per week."""
+        self.clear_right_panel()
+        workload_frame = ttk.Frame(self.right_panel, padding=10)
+        workload_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(workload_frame, text="Teacher Workload", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+        cols = ("teacher_id", "teacher", "activities", "sessions_per_week", "hours_per_week", "students", "ended")
+        workload_tree = ttk.Treeview(workload_frame, columns=cols, show="headings", height=15)
+        workload_sorter = self.setup_treeview_columns(workload_tree, cols, {"teacher_id": 70, "teacher": 160, "activities": 70,
+                                                                            "sessions_per_week": 110, "hours_per_week": 100,
+                                                                            "students": 70, "ended": 60})
+        workload_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        # Each teacher's figures only look at their own activities, through the teacher index.
+        for row in workload_rows():
+            workload_sorter.insert((row["teacher_id"], format_teacher_name(row["teacher_id"]), row["activities"], row["sessions_per_week"],
+                                    f"{row['hours_per_week']:.1f}", row["students"], row["ended"]), row["teacher_id"])
+        workload_sorter.sort_by("hours_per_week", descending=True)
+        ttk.Label(workload_frame, text="Only activities that haven't ended are counted; 'Ended' shows how many more each teacher has.",
+                  wraplength=500).pack(anchor=tk.W)
+        ttk.Button(workload_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit.")).pack(anchor=tk.SW, pady=10)
+
+    # Method called when "Check Data" is chosen from the Tools menu.
+    def show_integrity_check(self):
+        """Display every problem found in the data, with a button to repair the ones that can be repaired."""
+        self.clear_right_panel()
+        check_frame = ttk.Frame(self.right_panel, padding=10)
+        check_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(check_frame, text="Data Check", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+        issues = check_integrity()
+        ttk.Label(check_frame, text=summarise_issues(issues), wraplength=500).pack(anchor=tk.W)
+        issue_list = tk.Listbox(check_frame, height=15)
+        issue_list.pack(fill=tk.BOTH, expand=True, pady=5)
+        for issue in issues:
+            issue_list.insert(tk.END, describe_issue(issue))
+
+        button_frame = ttk.Frame(check_frame)
+        button_frame.pack(pady=10, anchor=tk.SW)
+        repair_button = ttk.Button(button_frame, text="Repair All", command=lambda: self.repair_data(issues))
+        repair_button.pack(side=tk.LEFT, padx=5)
+        if not any(issue["fix"] for issue in issues):
+            repair_button.config(state=tk.DISABLED)
+        ttk.Button(button_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit.")).pack(side=tk.LEFT, padx=5)
+
+    # Method called when the "Repair All" button is clicked.
+    def repair_data(self, issues):
+        """Repair every problem that can be repaired, with a single save, after confirmation."""
+        fixable = [issue for issue in issues if issue["fix"]]
+        if not messagebox.askyesno("Confirm Repair", f"Repair {len(fixable)} problem(s)? Enrolments in missing activities are removed, "
+                                                     f"missing teachers are cleared and logins for missing students are deleted."):
+            return
+        changed = repair_issues(fixable)
+        if changed is not None:
+            messagebox.showinfo("Data Check", f"Repaired {changed} record(s).")
+        self.refresh_activities()
+        self.show_integrity_check()
+
+    # Method called when "Backups" is chosen from the Tools menu.
+    def show_backups(self):
+        """Display the kept backups (newest first) with buttons to take one now or restore the selected one."""
+        self.clear_right_panel()
+        backup_frame = ttk.Frame(self.right_panel, padding=10)
+        backup_frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(backup_frame, text="Backups", font=("Arial", 14, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+        ttk.Label(backup_frame, text="Every save is backed up in the background. Restoring replaces all current data\n"
+                                     "(the current data is backed up first, so a restore can be undone).").pack(anchor=tk.W)
+        backup_list = tk.Listbox(backup_frame, height=15, font=("Courier", 10))
+        backup_list.pack(fill=tk.BOTH, expand=True, pady=5)
+        # Newest first; the list position maps back to the backup number.
+        points = list(reversed(list_backups()))
+        for point in points:
+            backup_list.insert(tk.END, describe_backup(point))
+        if not points:
+            backup_list.insert(tk.END, "No backups yet.")
+
+        button_frame = ttk.Frame(backup_frame)
+        button_frame.pack(pady=10, anchor=tk.SW)
+        ttk.Button(button_frame, text="Back Up Now", command=self.backup_now).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Restore Selected", command=lambda: self.restore_selected_backup(backup_list, points)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close View", command=lambda: self.clear_right_panel("Select an activity to see details or edit.")).pack(side=tk.LEFT, padx=5)
+
+    # Method called when the "Back Up Now" button is clicked.
+    def backup_now(self):
+        """Take a backup of the saved data straight away."""
+        try:
+            point = take_backup()
+        except Exception as e:
+            messagebox.showerror("Backup Error", f"Failed to take a backup: {e}")
+            return
+        if point is None:
+            messagebox.showinfo("Backups", "Nothing has changed since the last backup.")
+        self.show_backups()
+
+    # Method called when the "Restore Selected" button is clicked.
+    def restore_selected_backup(self, backup_list, points):
+        """Restore all data to the selected backup after confirmation."""
+        selection = backup_list.curselection()
+        if not selection or not points:
+            messagebox.showinfo("Restore Backup", "Please select a backup to restore.")
+            return
+        point = points[selection[0]]
+        if not messagebox.askyesno("Confirm Restore", f"Replace ALL current data with backup {point['seq']} "
+                                                      f"from {point['time'].strftime('%d/%m/%Y %H:%M:%S')}?"):
+            return
+        try:
+            saved = restore_backup(point["seq"])
+        except Exception as e:
+            messagebox.showerror("Restore Error", f"Failed to restore backup {point['seq']}: {e}")
+            return
+        # Activity dates may have changed, so the calendar is rebuilt on next use.
+        invalidate_calendar()
+        self.refresh_activities()
+        if saved:
+            messagebox.showinfo("Restore Backup", f"Backup {point['seq']} restored.")
+        self.show_backups()
+
+    # Method called when "Allocate Seats" is chosen from the Tools menu.
+    def allocate_seats(self):
+        """Preview the preference allocation, then enrol everyone placed if the admin confirms."""
+        try:
+            # Nothing changes yet; the same result (and lottery) is committed if the admin confirms.
+            result = allocate()
+        except Exception as e:
+            messagebox.showerror("Allocation Error", f"Failed to run the allocation: {e}")
+            return
+        if not result["assignments"] and not result["unplaced"]:
+            messagebox.showinfo("Allocate Seats", "No student has ranked any preference-round activities.")
+            return
+        message = "\n".join(preview_lines(result)) + "\n\nEnrol the placed students now? Everyone's preferences are then cleared."
+        if not messagebox.askyesno("Confirm Allocation", message):
+            return
+        added = commit_allocation(result)
+        if added is None:
+            messagebox.showerror("Allocation Error", "Saving failed, so no enrolments were made.")
+            return
+        messagebox.showinfo("Allocate Seats", f"Made {added} enrolment(s).")
+        self.refresh_activities()
+        self.clear_right_panel("Select an activity to see details or edit.")
+
+    # Method called when "Year Rollover" is chosen from the Tools menu.
+    def year_rollover(self):
+        """Preview the end-of-year rollover, then apply it if the admin confirms."""
+        try:
+            # A dry run changes nothing; it only counts the changes and writes a report.
+            preview = run_rollover(dry_run=True)
+        except Exception as e:
+            messagebox.showerror("Rollover Error", f"Failed to prepare the rollover: {e}")
+            return
+        message = (f"The rollover will:\n"
+                   f"- promote {preview['promoted']} student(s)\n"
+                   f"- graduate {preview['graduated']} year 12 student(s)\n"
+                   f"- archive {preview['enrolments_cleared']} enrolment(s)\n"
+                   f"- retire {preview['activities_retired']} ended activit(ies)\n\n"
+                   f"Full list: {preview['report']}\n\nApply the rollover now? A snapshot is taken first so it can be undone.")
+        if not messagebox.askyesno("Confirm Year Rollover", message):
+            return
+        try:
+            result = run_rollover(dry_run=False)
+        except Exception as e:
+            messagebox.showerror("Rollover Error", f"The rollover failed and all data has been restored: {e}")
+            self.refresh_activities()
+            return
+        messagebox.showinfo("Rollover Complete", f"Rollover complete.\nSnapshot for undo: {result['snapshot']}\n"
+                                                 f"(restore with: python rollover.py --rollback \"{result['snapshot']}\")")
+        self.refresh_activities()
+        self.clear_right_panel("Select an activity to see details or edit.")
@@ -0,0 +1,168 @@
+# Import heapq to keep each activity's provisional seat holders ordered by priority.
+import heapq
+# Import random for the lottery that decides priority between students.
+import random
+# Import deque for the queue of students still looking for a seat.
+from collections import deque
+
+# Import shared data, the enrolment helpers and the year level rule from common.py.
+from common import activities, students, USERS, teachers, save_data, touch_record, apply_enrolment_changes, is_year_eligible
+from common import remaining_seats
+# Import the calendar helper for ended activities and the timetable clash check.
+from activity_calendar import has_ended
+from recommendations import clashes
+
+# --- Preference Rounds ---
+# An activity with "by_preference": true can't be joined directly. Students rank such activities instead
+# (stored in their record as 'preferences', best first) and an admin allocates the seats in one run.
+# Seats are limited by the activity's optional 'capacity' (missing means unlimited).
+# Most choices a student can rank.
+MAX_PREFERENCES = 5
+
+def is_preference_activity(activity_id):
+    """Returns True if seats in an activity are given out by preference rather than first come, first served."""
+    return bool(activities.get(activity_id, {}).get("by_preference"))
+
+def get_preferences(student_id):
+    """Returns a student's ranked preferences (activity IDs, best first)."""
+    return list(students.get(student_id, {}).get("preferences", []))
+
+def set_preferences(student_id, activity_ids, save=True):
+    """Replaces a student's ranked preferences. Returns True if they were saved."""
+    ranked = []
+    for act_id in activity_ids:
+        # Keep the first mention of each activity, up to the limit.
+        if act_id not in ranked and len(ranked) < MAX_PREFERENCES:
+            ranked.append(act_id)
+    if ranked:
+        students[student_id]["preferences"] = ranked
+    else:
+        students[student_id].pop("preferences", None)
+    touch_record("student", student_id)
+    return save_data(activities, students, USERS, teachers) if save else True
+
+# --- Allocation ---
+
+def _valid_choices(student_id, on=None):
+    """Returns a student's preferences with anything they can't take removed (in rank order)."""
+    s_data = students.get(student_id, {})
+    enrolled = [a for a in s_data.get("activities_enrolled", []) if a in activities]
+    year = s_data.get("year_level")
+    choices = []
+    for act_id in get_preferences(student_id):
+        data = activities.get(act_id)
+        if data is None or not is_preference_activity(act_id) or act_id in enrolled:
+            continue
+        if not is_year_eligible(year, data.get("year_level", "N/A")) or has_ended(act_id, on):
+            continue
+        if any(clashes(act_id, other) for other in enrolled):
+            continue
+        choices.append(act_id)
+    return choices
+
+def _deferred_acceptance(choices, seats, priority):
+    """Student-proposing deferred acceptance (Gale-Shapley) for one seat per student.
+
+    'choices': student -> ranked activity IDs. 'seats': activity -> seats left (None = unlimited).
+    'priority': student -> lottery number (lower wins). Returns {student: activity}.
+    The result is stable: no student and activity would both rather have each other than what they got.
+    """
+    next_choice = {s_id: 0 for s_id in choices}
+    # activity -> heap of (-priority, student), so the weakest holder is always at the top.
+    held = {}
+    free = deque(choices)
+    while free:
+        s_id = free.popleft()
+        ranked = choices[s_id]
+        if next_choice[s_id] >= len(ranked):
+            continue  # Run out of choices; stays unplaced.
+        act_id = ranked[next_choice[s_id]]
+        next_choice[s_id] += 1
+        limit = seats.get(act_id)
+        heap = held.setdefault(act_id, [])
+        if limit is None or len(heap) < limit:
+            heapq.heappush(heap, (-priority[s_id], s_id))
+        elif heap and -heap[0][0] > priority[s_id]:
+            # This student outranks the weakest holder, who goes back to propose to their next choice.
+            _, bumped = heapq.heapreplace(heap, (-priority[s_id], s_id))
+            free.append(bumped)
+        else:
+            free.append(s_id)
+    return {s_id: act_id for act_id, heap in held.items() for _, s_id in heap}
+
+def allocate(seats_per_student=1, seed=None, on=None):
+    """Works out who gets a seat in each preference activity, without changing anything.
+
+    Each round gives every student at most one more seat, so with seats_per_student=2 everyone's
+    first placement is settled before anyone gets a second. Priority between students is a lottery
+    drawn from 'seed' (a new seed is picked if none is given), so a preview can be committed exactly.
+    Returns a result dictionary for preview_lines() and commit_allocation().
+    """
+    seed = seed if seed is not None else random.randrange(2 ** 32)
+    lottery = random.Random(seed)
+    choices = {s_id: _valid_choices(s_id, on) for s_id, s_data in students.items() if s_data.get("preferences")}
+    priority = {s_id: lottery.random() for s_id in sorted(choices)}
+    seats = {act_id: remaining_seats(act_id) for act_id in activities if is_preference_activity(act_id)}
+
+    assignments = {s_id: [] for s_id in choices}
+    for _ in range(seats_per_student):
+        matched = _deferred_acceptance({s: c for s, c in choices.items() if c}, seats, priority)
+        if not matched:
+            break
+        for s_id, act_id in matched.items():
+            assignments[s_id].append(act_id)
+            if seats[act_id] is not None:
+                seats[act_id] -= 1
+            # Later rounds skip the activity just given and anything that clashes with it.
+            choices[s_id] = [a for a in choices[s_id] if a != act_id and not clashes(a, act_id)]
+
+    # Which preference each first placement was (1 = first choice), for the preview.
+    ranks = {}
+    for s_id, placed in assignments.items():
+        if placed:
+            rank = get_preferences(s_id).index(placed[0]) + 1
+            ranks[rank] = ranks.get(rank, 0) + 1
+    filled = {}
+    for placed in assignments.values():
+        for act_id in placed:
+            filled[act_id] = filled.get(act_id, 0) + 1
+    return {
+        "seed": seed,
+        "assignments": {s_id: placed for s_id, placed in assignments.items() if placed},
+        "unplaced": sorted(s_id for s_id, placed in assignments.items() if not placed),
+        "filled": filled,
+        "choice_ranks": ranks,
+    }
+
+def preview_lines(result):
+    """Summarises an allocation result as lines of text."""
+    placed = len(result["assignments"])
+    lines = [f"{placed} student(s) placed, {len(result['unplaced'])} without a seat."]
+    for rank in sorted(result["choice_ranks"]):
+        lines.append(f"  Choice {rank}: {result['choice_ranks'][rank]} student(s)")
+    for act_id in sorted(result["filled"]):
+        seats = remaining_seats(act_id)
+        limit = "no limit" if seats is None else f"{seats} seat(s) were free"
+        lines.append(f"  {activities.get(act_id, {}).get('activity', act_id)}: {result['filled'][act_id]} placed ({limit})")
+    return lines
+
+def commit_allocation(result):
+    """Enrols every placed student with a single save and closes their preferences.
+
+    Returns the number of enrolments added, or None if saving failed (nothing is changed then).
+    """
+    pairs = [(s_id, act_id) for s_id, placed in result["assignments"].items() for act_id in placed]
+    # Preferences are cleared in the same save as the enrolments, so the round can't be run twice by mistake.
+    cleared = {s_id: students[s_id].pop("preferences") for s_id in list(students) if "preferences" in students[s_id]}
+    changed = apply_enrolment_changes(enrolments=pairs)
+    # With no new enrolments nothing was saved, so save the cleared preferences directly.
+    if changed == (0, 0) and cleared and not save_data(activities, students, USERS, teachers):
+        changed = None
+    if changed is None:
+        # The save failed and the enrolments were rolled back; put the preferences back too.
+        for s_id, prefs in cleared.items():
+            students[s_id]["preferences"] = prefs
+        return None
+    for s_id in cleared:
+        touch_record("student", s_id)
+    return changed[0]
@@ -0,0 +1,387 @@
+# Import json and gzip to write and read the compressed archive files.
+import json
+import gzip
+# Import os for the archive folders and file names.
+import os
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import datetime for the date each activity was archived and for the --as-of option.
+from datetime import datetime
+
+# Import common as a module so the current DATA_FILE is read each time (it changes when switching campus).
+import common
+from common import activities, students, USERS, teachers, save_data, enrolment_index, co_enrolment, touch_record
+from common import format_teacher_name
+# Import the LRU cache that keeps recently read archive files decoded.
+from view_cache import LRUCache
+# Import the calendar helpers to find ended activities and drop their schedules afterwards.
+from activity_calendar import has_ended, invalidate_calendar
+from schedule import today
+
+# --- Cold Archive of Ended Activities ---
+# Activities that have ended are moved out of data.json, together with the list of students who were
+# enrolled in them, so the data loaded at startup (and every list built from it) only holds the
+# activities that are still running. Each data file has its own folder under ARCHIVE_DIR
+# (e.g. archive/data/) holding:
+#   - one gzip-compressed file per archiving run, one JSON record per line:
+#       {"activity_id": 2001, "data": {...activity...}, "enrolled": [101908, ...], "archived_on": "2025-12-01"}
+#     named like 000003-20251201T090000.jsonl.gz;
+#   - index.json: which activities (ID -> name) are in each file.
+# Nothing is read at startup. ArchiveReader reads index.json the first time it is needed and opens an
+# archive file only when one of its activities is asked for.
+ARCHIVE_DIR = "archive"
+ARCHIVE_INDEX = "index.json"
+# How many decoded archive files ArchiveReader keeps in memory.
+SEGMENT_CACHE_SIZE = 4
+
+def archive_dir(data_file=None):
+    """Returns the archive folder for a data file (the current one by default)."""
+    name = os.path.splitext(os.path.basename(data_file or common.DATA_FILE))[0]
+    return os.path.join(ARCHIVE_DIR, name)
+
+def _read_segment(path):
+    """Yields the records in one archive file, one line at a time."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+# --- Lazy Reader ---
+
+class ArchiveReader:
+    """Reads one archive folder on demand. Nothing is loaded until a method needs it."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        # Archive file name -> {activity_id: name}. None until first used.
+        self._index = None
+        # activity_id -> archive file name.
+        self._locations = {}
+        # Student ID -> archived activity IDs they were enrolled in. Built on the first student lookup.
+        self._by_student = None
+        # Archive file name -> {activity_id: record}, for the most recently read files.
+        self._segments = LRUCache(SEGMENT_CACHE_SIZE)
+
+    def _segment_names(self):
+        """Returns the archive files in the folder, oldest first."""
+        try:
+            return sorted(name for name in os.listdir(self.folder) if name.endswith(".jsonl.gz"))
+        except FileNotFoundError:
+            return []
+
+    def _load_index(self):
+        """Reads index.json, adding any archive file it doesn't list yet (e.g. after an interrupted run)."""
+        if self._index is not None:
+            return
+        try:
+            with open(os.path.join(self.folder, ARCHIVE_INDEX), "r") as f:
+                # JSON keys are strings; activity IDs are integers everywhere else.
+                index = {name: {int(k): v for k, v in names.items()} for name, names in json.load(f).items()}
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        missing = [name for name in self._segment_names() if name not in index]
+        for name in missing:
+            index[name] = {r["activity_id"]: r["data"].get("activity", "") for r in _read_segment(os.path.join(self.folder, name))}
+        # Files in the index that were deleted by hand are forgotten.
+        index = {name: names for name, names in index.items() if os.path.exists(os.path.join(self.folder, name))}
+        self._index = index
+        self._locations = {act_id: name for name, names in sorted(index.items()) for act_id in names}
+        if missing:
+            self._write_index()
+
+    def _write_index(self):
+        """Writes index.json (through a temporary file)."""
+        path = os.path.join(self.folder, ARCHIVE_INDEX)
+        temp_file = path + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(self._index, f)
+        os.replace(temp_file, path)
+
+    def _segment(self, name):
+        """Returns {activity_id: record} for one archive file, reading it only if it isn't cached."""
+        return self._segments.get_or_build(name, 0, lambda: {r["activity_id"]: r for r in _read_segment(os.path.join(self.folder, name))})
+
+    def activity_ids(self):
+        """Returns the IDs of every archived activity, sorted."""
+        self._load_index()
+        return sorted(self._locations)
+
+    def highest_id(self):
+        """Returns the largest archived activity ID (0 if nothing is archived), so new activities don't reuse one."""
+        self._load_index()
+        return max(self._locations, default=0)
+
+    def __contains__(self, activity_id):
+        self._load_index()
+        return activity_id in self._locations
+
+    def activity_name(self, activity_id, default=None):
+        """Returns an archived activity's name from the index, without opening any archive file."""
+        self._load_index()
+        name = self._locations.get(activity_id)
+        return self._index[name][activity_id] if name else default
+
+    def get(self, activity_id):
+        """Returns an archived activity's record ('data', 'enrolled', 'archived_on'), or None."""
+        self._load_index()
+        name = self._locations.get(activity_id)
+        return self._segment(name).get(activity_id) if name else None
+
+    def iter_records(self, activity_ids=None):
+        """Yields archived records in ID order (all of them, or just 'activity_ids'), one archive file at a time."""
+        self._load_index()
+        wanted = set(self._locations if activity_ids is None else activity_ids) & self._locations.keys()
+        by_file = {}
+        for act_id in wanted:
+            by_file.setdefault(self._locations[act_id], []).append(act_id)
+        for name in sorted(by_file):
+            segment = self._segment(name)
+            for act_id in sorted(by_file[name]):
+                yield segment[act_id]
+
+    def student_history(self, student_id):
+        """Returns the archived activity IDs a student was enrolled in."""
+        if self._by_student is None:
+            by_student = {}
+            for record in self.iter_records():
+                for s_id in record.get("enrolled", []):
+                    by_student.setdefault(s_id, []).append(record["activity_id"])
+            self._by_student = by_student
+        return list(self._by_student.get(student_id, []))
+
+    def add_segment(self, name, records):
+        """Records a newly written archive file in the index."""
+        self._load_index()
+        self._index[name] = {r["activity_id"]: r["data"].get("activity", "") for r in records}
+        for r in records:
+            self._locations[r["activity_id"]] = name
+        self._by_student = None
+        self._write_index()
+
+    def remove_segment(self, name):
+        """Deletes an archive file and takes it out of the index (used when a rollover is rolled back)."""
+        self._load_index()
+        # The file goes first: if writing the index then fails, _load_index() forgets the missing file anyway.
+        try:
+            os.remove(os.path.join(self.folder, name))
+        except FileNotFoundError:
+            pass
+        self._index.pop(name, None)
+        # An activity archived more than once is found in the newest file that still has it.
+        self._locations = {act_id: n for n, names in sorted(self._index.items()) for act_id in names}
+        self._segments.invalidate(name)
+        self._by_student = None
+        self._write_index()
+
+# Archive folder -> its ArchiveReader, so the index is only read once per folder.
+_readers = {}
+
+def get_archive(data_file=None):
+    """Returns the ArchiveReader for a data file's archive (the current data file by default)."""
+    folder = archive_dir(data_file)
+    if folder not in _readers:
+        _readers[folder] = ArchiveReader(folder)
+    return _readers[folder]
+
+def activity_name(activity_id, default="N/A"):
+    """Returns an activity's name, looking in the archive if it is no longer in the live data."""
+    if activity_id in activities:
+        return activities[activity_id].get("activity", default)
+    return get_archive().activity_name(activity_id, default)
+
+# --- Archiving ---
+
+def find_archivable(as_of=None):
+    """Returns the sorted IDs of activities that ended before 'as_of' (today by default)."""
+    as_of = as_of or today()
+    return sorted(act_id for act_id in activities if has_ended(act_id, as_of))
+
+def build_archive_records(activity_ids):
+    """Returns the archive records for live activities, with the students currently enrolled in each."""
+    archived_on = today().isoformat()
+    return [{"activity_id": act_id, "data": activities[act_id], "enrolled": sorted(enrolment_index.get(act_id, set())),
+             "archived_on": archived_on} for act_id in activity_ids]
+
+def write_archive_file(records):
+    """Writes records to a new archive file for the current data file. Returns (file name, path).
+
+    The file isn't in the index until get_archive().add_segment() is called, which is done once the
+    activities have been removed from the data and saved. If that save fails, delete the file instead.
+    """
+    reader = get_archive()
+    os.makedirs(reader.folder, exist_ok=True)
+    names = reader._segment_names()
+    seq = int(names[-1].split("-")[0]) + 1 if names else 1
+    name = f"{seq:06d}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.jsonl.gz"
+    path = os.path.join(reader.folder, name)
+    temp_file = path + ".tmp"
+    with gzip.open(temp_file, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    os.replace(temp_file, path)
+    return name, path
+
+def archive_ended_activities(as_of=None, dry_run=False):
+    """Moves every activity that ended before 'as_of' (with its enrolments) into the archive.
+
+    The archive file is written first and the data is saved once; if the save fails, the archive file
+    is deleted and the data is put back as it was. Enrolment listeners are not called, since nobody is
+    leaving: the enrolments move to the archive with the activity. Returns the archived activity IDs.
+    """
+    as_of = as_of or today()
+    archived_ids = find_archivable(as_of)
+    if dry_run or not archived_ids:
+        return archived_ids
+
+    records = build_archive_records(archived_ids)
+    reader = get_archive()
+    name, path = write_archive_file(records)
+
+    # --- Remove From the Live Data ---
+    # Remember what is changed, so a failed save can be undone.
+    archived_set = set(archived_ids)
+    affected = {s_id for record in records for s_id in record["enrolled"]}
+    affected.update(s_id for s_id, s_data in students.items() if archived_set & set(s_data.get("preferences", [])))
+    originals = {s_id: (list(students[s_id].get("activities_enrolled", [])), students[s_id].get("preferences"))
+                 for s_id in affected if s_id in students}
+    for s_id in originals:
+        s_data = students[s_id]
+        s_data["activities_enrolled"] = [a for a in s_data.get("activities_enrolled", []) if a not in archived_set]
+        if "preferences" in s_data:
+            s_data["preferences"] = [a for a in s_data["preferences"] if a not in archived_set]
+    for act_id in archived_ids:
+        del activities[act_id]
+
+    if not save_data(activities, students, USERS, teachers):
+        for record in records:
+            activities[record["activity_id"]] = record["data"]
+        for s_id, (enrolled, preferences) in originals.items():
+            students[s_id]["activities_enrolled"] = enrolled
+            if preferences is not None:
+                students[s_id]["preferences"] = preferences
+        os.remove(path)
+        return []
+    reader.add_segment(name, records)
+
+    # --- Indexes ---
+    # Only the archived activities' rows and the changed students need updating.
+    for act_id in archived_ids:
+        enrolment_index.pop(act_id, None)
+        for other in co_enrolment.pop(act_id, {}):
+            co_enrolment.get(other, {}).pop(act_id, None)
+        touch_record("activity", act_id)
+        invalidate_calendar(act_id)
+    for s_id in originals:
+        touch_record("student", s_id)
+    return archived_ids
+
+# --- Activities Retired by Older Rollovers ---
+# Before rollover.py used this archive, it wrote retired activities to rollover/archive_*.jsonl.
+# import_rollover_archives() copies them in, so their IDs aren't reused and reports can find them.
+
+def import_rollover_archives(rollover_dir="rollover"):
+    """Adds activities from older rollover archive files that aren't in the archive yet. Returns how many were added.
+
+    Those files don't list who was enrolled, so it is worked out from the students' 'past_enrolments'
+    and from the graduated students written to the same file.
+    """
+    reader = get_archive()
+    found = {}
+    try:
+        file_names = sorted(n for n in os.listdir(rollover_dir) if n.startswith("archive_") and n.endswith(".jsonl"))
+    except FileNotFoundError:
+        file_names = []
+    for file_name in file_names:
+        graduates = []
+        retired = []
+        with open(os.path.join(rollover_dir, file_name), "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("type") == "student":
+                    graduates.append(entry)
+                elif entry.get("type") == "activity" and entry["activity_id"] not in reader and entry["activity_id"] not in activities:
+                    retired.append(entry)
+        for entry in retired:
+            act_id = entry["activity_id"]
+            enrolled = {g["student_id"] for g in graduates if act_id in g["data"].get("activities_enrolled", [])}
+            found[act_id] = {"activity_id": act_id, "data": entry["data"], "enrolled": enrolled,
+                             "archived_on": datetime.strptime(file_name[8:16], "%Y%m%d").date().isoformat()}
+    if not found:
+        return 0
+    for s_id, s_data in students.items():
+        for year_ids in s_data.get("past_enrolments", {}).values():
+            for act_id in year_ids:
+                if act_id in found:
+                    found[act_id]["enrolled"].add(s_id)
+    records = [dict(record, enrolled=sorted(record["enrolled"])) for _, record in sorted(found.items())]
+    name, _ = write_archive_file(records)
+    reader.add_segment(name, records)
+    return len(records)
+
+# --- Reports on Archived Activities ---
+
+def build_archived_roster(record):
+    """Builds a roster (the same dictionary as reports.build_roster) for an archived activity."""
+    # Imported here because reports.py imports this module for its --archived option.
+    from reports import roster_student
+    data = record["data"]
+    # Students who have since left the school are shown by ID only.
+    roster_students = [roster_student(s_id) for s_id in record.get("enrolled", [])]
+    cost = data.get("cost", 0)
+    return {
+        "activity_id": record["activity_id"],
+        "activity": data.get("activity", "N/A"),
+        "teacher": format_teacher_name(data.get("teacher_id")),
+        "location": data.get("location", "N/A"),
+        "schedule": f"{data.get('days', 'N/A')} at {data.get('time', 'N/A')}",
+        "dates": f"{data.get('start_date', 'N/A')} to {data.get('end_date', 'N/A')}",
+        "cost": cost,
+        "income": cost * len(roster_students),
+        "students": roster_students,
+    }
+
+def iter_archived_rosters(activity_ids=None):
+    """Yields rosters for archived activities one at a time (sorted by ID within each archive file)."""
+    for record in get_archive().iter_records(activity_ids):
+        yield build_archived_roster(record)
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python archive.py [--commit] [--as-of DD/MM/YYYY] | --list | --show ID | --student ID | --import-rollover"""
+    parser = argparse.ArgumentParser(description="Move ended activities and their enrolments into the compressed archive.")
+    parser.add_argument("--commit", action="store_true", help="Archive them (default is a dry run that only lists them).")
+    parser.add_argument("--as-of", help="Archive activities that ended before this date (DD/MM/YYYY, default today).")
+    parser.add_argument("--list", action="store_true", help="List the archived activities.")
+    parser.add_argument("--show", type=int, metavar="ID", help="Show one archived activity and its enrolments.")
+    parser.add_argument("--student", type=int, metavar="ID", help="List the archived activities a student was enrolled in.")
+    parser.add_argument("--import-rollover", nargs="?", const="rollover", metavar="FOLDER",
+                        help="Add activities retired by older rollovers of this data file (FOLDER/archive_*.jsonl, default rollover).")
+    args = parser.parse_args(argv)
+
+    reader = get_archive()
+    if args.import_rollover:
+        print(f"Added {import_rollover_archives(args.import_rollover)} activit(ies) from older rollovers.")
+    elif args.list:
+        for act_id in reader.activity_ids():
+            print(f"{act_id}  {reader.activity_name(act_id)}")
+    elif args.show is not None:
+        record = reader.get(args.show)
+        if record is None:
+            print(f"Activity {args.show} is not in the archive.")
+            return
+        print(json.dumps(record, indent=4))
+    elif args.student is not None:
+        for act_id in reader.student_history(args.student):
+            print(f"{act_id}  {reader.activity_name(act_id)}")
+    else:
+        as_of = datetime.strptime(args.as_of, "%d/%m/%Y").date() if args.as_of else None
+        archived = archive_ended_activities(as_of, dry_run=not args.commit)
+        for act_id in archived:
+            print(f"{act_id}  {activity_name(act_id)}")
+        print(f"{'Archived' if args.commit else 'Would archive'} {len(archived)} activit{'y' if len(archived) == 1 else 'ies'}.")
+
+if __name__ == "__main__":
+    main()
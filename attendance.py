@@ -0,0 +1,282 @@
+# Import json to read and write the attendance file.
+import json
+# Import csv for the bulk attendance export.
+import csv
+# Import os and threading to save through a temporary file named after the process and thread.
+import os
+import threading
+# Import messagebox to report file problems the same way common.py does.
+from tkinter import messagebox
+
+# Import shared data and the enrolment index from common.py.
+from common import activities, students, get_enrolled_students
+# Import the helpers that turn an activity's days and dates into session dates.
+from schedule import session_dates, parse_date, format_date
+
+# Attendance is kept in its own file so data.json stays small and unchanged.
+ATTENDANCE_FILE = "attendance.json"
+
+# --- How Attendance Is Stored ---
+# Each activity gets a 'roster': a list of student IDs in the order they were first marked.
+# A student's index in this list is their 'roster position' and never changes, even if they leave.
+# A position is only emptied (set to None) when a duplicate student is merged into another one.
+# Each session is then stored as two whole numbers used as bitsets, where bit N belongs to roster position N:
+#   - 'present': bit set if the student attended.
+#   - 'expected': bit set if the student was enrolled when the roll was taken.
+# This takes a few bytes per session instead of one dictionary entry per student per session.
+#
+# _attendance layout:
+# Key: activity_id (integer), Value: {
+#     "roster": [student_id, ...],
+#     "positions": {student_id: position},         (rebuilt from the roster when loading)
+#     "sessions": {"DD/MM/YYYY": [present, expected]},
+#     "present_total": int, "expected_total": int   (running totals for fast activity rates)
+# }
+_attendance = {}
+# Running totals per student, so a student's rate doesn't need every activity's sessions:
+# Key: student_id, Value: {activity_id: [present_count, expected_count]}
+_student_totals = {}
+# Tracks whether the attendance file has been read yet (it is loaded on first use).
+_loaded = False
+
+# --- Loading and Saving ---
+
+def _new_record():
+    """Creates an empty attendance record for one activity."""
+    return {"roster": [], "positions": {}, "sessions": {}, "present_total": 0, "expected_total": 0}
+
+def load_attendance():
+    """Reads the attendance file into memory (only the first time it is needed)."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(ATTENDANCE_FILE, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        # No attendance has been recorded yet.
+        return
+    except json.JSONDecodeError:
+        messagebox.showerror("Error", f"Error decoding JSON from '{ATTENDANCE_FILE}'. Attendance will start empty.")
+        return
+
+    for act_key, saved in data.items():
+        record = _new_record()
+        record["roster"] = [None if s_id is None else int(s_id) for s_id in saved.get("roster", [])]
+        record["positions"] = {s_id: pos for pos, s_id in enumerate(record["roster"]) if s_id is not None}
+        # Bitsets are saved as hexadecimal strings, which are much shorter than lists of booleans.
+        for session_key, (present_hex, expected_hex) in saved.get("sessions", {}).items():
+            present, expected = int(present_hex, 16), int(expected_hex, 16)
+            record["sessions"][session_key] = [present, expected]
+            record["present_total"] += present.bit_count()
+            record["expected_total"] += expected.bit_count()
+            _count_students(int(act_key), record, present, expected, 1)
+        _attendance[int(act_key)] = record
+
+def use_attendance_file(path):
+    """Switches to a different attendance file (each campus has its own). It is read on next use."""
+    global ATTENDANCE_FILE, _loaded
+    ATTENDANCE_FILE = path
+    _attendance.clear()
+    _student_totals.clear()
+    _loaded = False
+
+def save_attendance():
+    """Writes all attendance records back to the attendance file."""
+    data = {}
+    for act_id, record in _attendance.items():
+        data[act_id] = {
+            "roster": record["roster"],
+            "sessions": {key: [f"{present:x}", f"{expected:x}"] for key, (present, expected) in record["sessions"].items()},
+        }
+    # Write to a temporary file and then swap it in (like common.save_data()), so a failed save
+    # never leaves a half-written attendance file behind.
+    temp_file = f"{ATTENDANCE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_file, ATTENDANCE_FILE)
+    except Exception as e:
+        messagebox.showerror("Save Error", f"Failed to save attendance to '{ATTENDANCE_FILE}': {e}")
+
+def merge_student_attendance(from_id, to_id, save=True):
+    """Moves one student's attendance onto another student ID (used when merging duplicate records)."""
+    load_attendance()
+    changed = False
+    for act_id, record in _attendance.items():
+        pos_from = record["positions"].get(from_id)
+        if pos_from is None:
+            continue
+        changed = True
+        pos_to = record["positions"].get(to_id)
+        if pos_to is None:
+            # The kept student simply takes over the roster position (and its totals).
+            record["roster"][pos_from] = to_id
+            record["positions"][to_id] = record["positions"].pop(from_id)
+            counts = _student_totals.get(from_id, {}).pop(act_id, None)
+            if counts:
+                _student_totals.setdefault(to_id, {})[act_id] = counts
+            continue
+        # Both were marked: move each bit across, counting a session once if both were set.
+        bit_from, bit_to = 1 << pos_from, 1 << pos_to
+        for bits in record["sessions"].values():
+            for i, total in ((0, "present_total"), (1, "expected_total")):
+                if bits[i] & bit_from:
+                    if bits[i] & bit_to:
+                        record[total] -= 1
+                    bits[i] = (bits[i] & ~bit_from) | bit_to
+        # The old student's position is now empty in every session, so take them off the roster.
+        del record["positions"][from_id]
+        record["roster"][pos_from] = None
+        # Work the kept student's totals out again from the merged sessions.
+        _student_totals.get(from_id, {}).pop(act_id, None)
+        counts = [sum(1 for present, expected in record["sessions"].values() if present & expected & bit_to),
+                  sum(1 for _, expected in record["sessions"].values() if expected & bit_to)]
+        _student_totals.setdefault(to_id, {})[act_id] = counts
+    if changed and save:
+        save_attendance()
+
+# --- Sessions and Roster Positions ---
+
+def get_sessions(activity_id, until=None):
+    """Returns the list of session dates for an activity (optionally only up to 'until')."""
+    return list(session_dates(activities.get(activity_id, {}), until))
+
+def _record(activity_id):
+    """Returns (creating if needed) the attendance record for an activity."""
+    load_attendance()
+    if activity_id not in _attendance:
+        _attendance[activity_id] = _new_record()
+    return _attendance[activity_id]
+
+def _position(record, student_id):
+    """Returns a student's roster position, adding them to the end of the roster if they are new."""
+    if student_id not in record["positions"]:
+        record["positions"][student_id] = len(record["roster"])
+        record["roster"].append(student_id)
+    return record["positions"][student_id]
+
+def _mask(record, student_ids):
+    """Builds a bitset with the bit set for each of the given students."""
+    mask = 0
+    for s_id in student_ids:
+        mask |= 1 << _position(record, s_id)
+    return mask
+
+def _count_students(activity_id, record, present, expected, sign):
+    """Adds (sign=1) or removes (sign=-1) one session's roll to each expected student's running totals."""
+    roster = record["roster"]
+    pos = 0
+    while expected:
+        if expected & 1:
+            counts = _student_totals.setdefault(roster[pos], {}).setdefault(activity_id, [0, 0])
+            counts[1] += sign
+            if present >> pos & 1:
+                counts[0] += sign
+        expected >>= 1
+        pos += 1
+
+def _members(record, mask):
+    """Returns the set of student IDs whose bits are set in a bitset."""
+    roster = record["roster"]
+    members = set()
+    pos = 0
+    while mask:
+        if mask & 1:
+            members.add(roster[pos])
+        mask >>= 1
+        pos += 1
+    return members
+
+# --- Marking Attendance ---
+
+def mark_session(activity_id, session_date, present_ids, save=True):
+    """Records the roll for one session of an activity.
+
+    'session_date' is a date object. Every student currently enrolled is expected; only those in
+    'present_ids' are marked present. Marking the same session again replaces the earlier roll.
+    """
+    record = _record(activity_id)
+    key = format_date(session_date)
+    expected_ids = get_enrolled_students(activity_id)
+    expected = _mask(record, expected_ids)
+    # Only enrolled students can be marked present.
+    present = _mask(record, set(present_ids) & expected_ids)
+
+    # Keep the running totals correct when a session is re-marked.
+    if key in record["sessions"]:
+        old_present, old_expected = record["sessions"][key]
+        record["present_total"] -= old_present.bit_count()
+        record["expected_total"] -= old_expected.bit_count()
+        _count_students(activity_id, record, old_present, old_expected, -1)
+    record["sessions"][key] = [present, expected]
+    record["present_total"] += present.bit_count()
+    record["expected_total"] += expected.bit_count()
+    _count_students(activity_id, record, present, expected, 1)
+
+    if save:
+        save_attendance()
+
+def get_session_attendance(activity_id, session_date):
+    """Returns the set of student IDs marked present at a session (empty if no roll was taken)."""
+    record = _record(activity_id)
+    session = record["sessions"].get(format_date(session_date))
+    return _members(record, session[0]) if session else set()
+
+def is_session_marked(activity_id, session_date):
+    """Returns True if a roll has been taken for the session."""
+    return format_date(session_date) in _record(activity_id)["sessions"]
+
+# --- Attendance Rate Queries ---
+
+def activity_attendance_rate(activity_id):
+    """Returns the fraction (0-1) of expected attendances that were present, or None if no rolls taken."""
+    record = _record(activity_id)
+    if not record["expected_total"]:
+        return None
+    return record["present_total"] / record["expected_total"]
+
+def student_attendance_rate(student_id, activity_id=None):
+    """Returns the fraction (0-1) of sessions a student attended, or None if they were never expected.
+
+    Looks at one activity if 'activity_id' is given, otherwise at every activity the student has been on a roll for.
+    Reads the student's running totals, so it never looks through the sessions themselves.
+    """
+    load_attendance()
+    totals = _student_totals.get(student_id, {})
+    if activity_id is not None:
+        totals = {activity_id: totals[activity_id]} if activity_id in totals else {}
+    attended = sum(present for present, _ in totals.values())
+    expected_count = sum(expected for _, expected in totals.values())
+    if not expected_count:
+        return None
+    return attended / expected_count
+
+# --- Bulk Export ---
+
+def export_attendance_csv(path):
+    """Writes every recorded attendance as CSV rows. Returns the number of rows written.
+
+    Rows are written one at a time, so the export doesn't build a copy of the data in memory.
+    """
+    load_attendance()
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("activity_id", "activity", "session_date", "student_id", "name", "present"))
+        for act_id in sorted(_attendance):
+            record = _attendance[act_id]
+            act_name = activities.get(act_id, {}).get("activity", "N/A")
+            # Sort sessions by real date rather than by the 'DD/MM/YYYY' text.
+            for key in sorted(record["sessions"], key=parse_date):
+                present, expected = record["sessions"][key]
+                for pos, s_id in enumerate(record["roster"]):
+                    bit = 1 << pos
+                    if not expected & bit:
+                        continue
+                    s_data = students.get(s_id, {})
+                    name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}".strip() or "N/A"
+                    writer.writerow((act_id, act_name, key, s_id, name, "Y" if present & bit else "N"))
+                    rows += 1
+    return rows
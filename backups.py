@@ -0,0 +1,249 @@
+# Import json and gzip to write compressed backup files.
+import json
+import gzip
+# Import os for backup folders and file names.
+import os
+# Import threading and time so backups run in the background, at most once per BACKUP_INTERVAL.
+import threading
+import time
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import datetime for the time stamp in each backup's file name.
+from datetime import datetime
+
+# Import common as a module so the current DATA_FILE is read at the moment of each save.
+import common
+from common import activities, students, USERS, teachers, save_data, replace_data, save_listeners
+# Import the change-set helpers used for incremental backups.
+from snapshot_diff import diff_data, apply_change_set
+
+# --- Backup Settings ---
+# Each data file gets its own folder under BACKUP_DIR (e.g. backups/data/).
+# A backup is either a full copy of the data or an incremental one holding only the changes since the
+# backup before it (a snapshot_diff change set). Both are gzip-compressed JSON. File names are
+#   000042-incr-20251019T101500.json.gz
+# so listing the folder gives the backups in order.
+BACKUP_DIR = "backups"
+# A full backup is taken after this many incremental ones. It is also the most that are replayed on a restore.
+FULL_EVERY = 20
+# How many full backups (each with the incremental backups after it) are kept. Older ones are deleted.
+KEEP_FULL = 4
+# Saves closer together than this many seconds are covered by one backup.
+BACKUP_INTERVAL = 30
+
+def backup_dir(data_file=None):
+    """Returns the backup folder for a data file (the current one by default)."""
+    name = os.path.splitext(os.path.basename(data_file or common.DATA_FILE))[0]
+    return os.path.join(BACKUP_DIR, name)
+
+def list_backups(data_file=None):
+    """Returns every backup of a data file, oldest first, as dictionaries with 'seq', 'kind', 'time' and 'path'."""
+    folder = backup_dir(data_file)
+    try:
+        names = sorted(os.listdir(folder))
+    except FileNotFoundError:
+        return []
+    points = []
+    for name in names:
+        parts = name.split(".")[0].split("-")
+        if len(parts) != 3 or parts[1] not in ("full", "incr") or not name.endswith(".json.gz"):
+            continue
+        points.append({"seq": int(parts[0]), "kind": parts[1], "time": datetime.strptime(parts[2], "%Y%m%dT%H%M%S"),
+                       "path": os.path.join(folder, name)})
+    return points
+
+def _read(path):
+    """Reads one compressed backup file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write(path, content):
+    """Writes one compressed backup file (through a temporary file, so a half-written backup is never listed)."""
+    temp_file = path + ".tmp"
+    # Level 6 is gzip's usual balance between size and speed.
+    with gzip.open(temp_file, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(content, f, separators=(",", ":"))
+    os.replace(temp_file, path)
+
+# --- Taking Backups ---
+
+# Data file -> (seq, data, incremental backups since the last full one) for the newest backup.
+# Kept so each incremental backup only needs the new file read, not the whole chain replayed.
+_latest = {}
+# Serialises backups, since the background thread and the command line may both take them.
+_backup_lock = threading.Lock()
+
+def take_backup(data_file=None, full=False):
+    """Backs up a data file as it is on disk now. Returns the new backup's dictionary, or None if nothing changed.
+
+    An incremental backup is taken unless 'full' is True, there is no earlier backup, or FULL_EVERY
+    incremental backups have been taken since the last full one.
+    """
+    data_file = data_file or common.DATA_FILE
+    with _backup_lock:
+        with open(data_file, "r") as f:
+            data = json.load(f)
+        if data_file not in _latest:
+            _latest[data_file] = _load_latest(data_file)
+        seq, previous, since_full = _latest[data_file]
+
+        kind = "full" if full or previous is None or since_full >= FULL_EVERY else "incr"
+        if kind == "incr":
+            content = diff_data(previous, data)
+            if not any(changes[part] for changes in content["sections"].values() for part in ("added", "removed", "modified")):
+                return None
+        else:
+            content = data
+        seq += 1
+        folder = backup_dir(data_file)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{seq:06d}-{kind}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json.gz")
+        _write(path, content)
+        _latest[data_file] = (seq, data, 0 if kind == "full" else since_full + 1)
+        prune_backups(data_file)
+        return {"seq": seq, "kind": kind, "path": path}
+
+def _load_latest(data_file):
+    """Returns (seq, data, incremental backups since the last full one) for a data file's newest backup."""
+    points = list_backups(data_file)
+    if not points:
+        return 0, None, 0
+    chain = _chain(points, points[-1]["seq"])
+    return points[-1]["seq"], _replay(chain), len(chain) - 1
+
+def prune_backups(data_file=None, keep_full=None):
+    """Deletes backups older than the 'keep_full' (default KEEP_FULL) newest full backups. Returns how many files were deleted."""
+    keep_full = keep_full or KEEP_FULL
+    points = list_backups(data_file)
+    fulls = [p["seq"] for p in points if p["kind"] == "full"]
+    if len(fulls) <= keep_full:
+        return 0
+    oldest_kept = fulls[-keep_full]
+    deleted = 0
+    for point in points:
+        if point["seq"] < oldest_kept:
+            os.remove(point["path"])
+            deleted += 1
+    return deleted
+
+# --- Background Backups ---
+# common.save_data() calls request_backup() after every successful save. The save itself only
+# records that a backup is wanted; a background thread reads the saved file and writes the backup,
+# so saving (and the GUI) never waits for compression. Several saves close together share one backup.
+
+# Data files saved since their last backup.
+_pending = set()
+_wake = threading.Event()
+_worker = None
+
+def request_backup(data_file):
+    """Save listener: asks the background thread to back up 'data_file' soon."""
+    global _worker
+    _pending.add(data_file)
+    _wake.set()
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_backup_loop, daemon=True)
+        _worker.start()
+
+def _backup_loop():
+    """Background thread: waits for saves and backs up each saved data file."""
+    while True:
+        _wake.wait()
+        _wake.clear()
+        while _pending:
+            try:
+                data_file = _pending.pop()
+                point = take_backup(data_file)
+            except KeyError:
+                break  # flush_backups() took the last one.
+            except Exception as e:
+                # Log to the console like other background jobs; the save itself has already succeeded.
+                print(f"Backup of '{data_file}' failed: {e}")
+            else:
+                if point:
+                    print(f"Backup {point['seq']} ({point['kind']}) written to {point['path']}")
+        # Let further saves gather before the next backup.
+        time.sleep(BACKUP_INTERVAL)
+
+def flush_backups():
+    """Takes any backups still waiting, straight away (e.g. before the program closes)."""
+    while _pending:
+        try:
+            data_file = _pending.pop()
+        except KeyError:
+            break  # The background thread took the last one.
+        take_backup(data_file)
+
+# Back up the data automatically after every save.
+save_listeners.append(request_backup)
+
+# --- Restoring ---
+
+def _chain(points, seq):
+    """Returns the backups needed to rebuild backup 'seq': its full backup and the incremental ones up to it."""
+    wanted = [p for p in points if p["seq"] <= seq]
+    if not wanted or wanted[-1]["seq"] != seq:
+        raise ValueError(f"There is no backup number {seq}.")
+    start = max((i for i, p in enumerate(wanted) if p["kind"] == "full"), default=None)
+    if start is None:
+        raise ValueError(f"Backup {seq} can't be restored because its full backup has been deleted.")
+    return wanted[start:]
+
+def _replay(chain):
+    """Reads a full backup and applies the incremental backups after it. Returns the data (data.json layout)."""
+    data = _read(chain[0]["path"])
+    for point in chain[1:]:
+        # Each change set must match the data it was taken from, so a damaged chain is noticed.
+        apply_change_set(data, _read(point["path"]))
+    return data
+
+def restore_data(seq, data_file=None):
+    """Returns a data file's contents as they were at backup 'seq', without changing anything."""
+    return _replay(_chain(list_backups(data_file), seq))
+
+def restore_backup(seq):
+    """Restores the running program's data to backup 'seq' and saves it. Returns True if it was saved.
+
+    The data being replaced is backed up first, so a restore can itself be undone.
+    """
+    data = restore_data(seq)
+    take_backup()
+    replace_data(data)
+    return save_data(activities, students, USERS, teachers)
+
+def describe_backup(point):
+    """Returns one line describing a backup, for lists."""
+    kind = "full" if point["kind"] == "full" else "changes"
+    return f"{point['seq']:>4}  {point['time'].strftime('%d/%m/%Y %H:%M:%S')}  {kind}"
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python backups.py [--list | --now [--full] | --restore N [--output FILE]]"""
+    parser = argparse.ArgumentParser(description="Take, list and restore backups of the data file.")
+    parser.add_argument("--data", default=common.DATA_FILE, help="Data file to work with.")
+    parser.add_argument("--list", action="store_true", help="List the backups that are kept.")
+    parser.add_argument("--now", action="store_true", help="Take a backup now.")
+    parser.add_argument("--full", action="store_true", help="With --now, take a full backup.")
+    parser.add_argument("--restore", type=int, metavar="N", help="Restore backup number N.")
+    parser.add_argument("--output", help="With --restore, write the restored data here instead of over the data file.")
+    args = parser.parse_args(argv)
+
+    if args.now:
+        point = take_backup(args.data, full=args.full)
+        print(f"Backup {point['seq']} ({point['kind']}) written to {point['path']}" if point else "Nothing has changed since the last backup.")
+    elif args.restore is not None:
+        data = restore_data(args.restore, args.data)
+        if not args.output:
+            # Keep the current data restorable too.
+            take_backup(args.data)
+        output = args.output or args.data
+        with open(output, "w") as f:
+            json.dump(data, f, indent=4)
+        print(f"Backup {args.restore} restored to {output}")
+    else:
+        for point in list_backups(args.data):
+            print(describe_backup(point))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# Import hashlib to fingerprint feeds, so unchanged ones aren't rewritten.
+import hashlib
+# Import json for the batch job's record of what each feed was built from.
+import json
+# Import os and argparse for the batch job.
+import os
+import argparse
+# Import datetime for the DTSTAMP each calendar event needs.
+from datetime import datetime, timezone
+# Import the process pool so the batch job can write feeds on several CPU cores at once.
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Import shared data and the teacher name formatter from common.py.
+from common import activities, students, teachers, format_teacher_name
+# Import the parsed schedules and the session dates.
+from activity_calendar import get_schedule, iter_sessions
+
+# --- Calendar (ICS) Feeds ---
+# Each activity becomes one repeating event (RRULE) in the iCalendar format that phone and desktop
+# calendars import: weekly on its 'days', at its 'time', from its first session until its 'end_date',
+# with its location and teacher. Times are "floating" (no time zone), so they show as the school's
+# local time wherever the calendar is opened. Activities without a time become all-day events;
+# activities without usable dates or days have no sessions and are left out.
+# Feeds are written a line at a time, so nothing but the current line is built in memory.
+FEEDS_DIR = "feeds"
+# File inside FEEDS_DIR recording the fingerprint each feed was last written from.
+FEEDS_MANIFEST = "manifest.json"
+# Name used in each event's UID, which calendars use to recognise the same event on the next import.
+UID_DOMAIN = "extracurricular.school"
+PRODUCT_ID = "-//School Extracurricular Program//Calendar Feeds//EN"
+ICAL_DAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+def escape_text(value):
+    """Escapes text for an iCalendar property (backslashes, semicolons, commas and new lines)."""
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def fold_line(line):
+    """Splits a content line into 75-byte pieces, as iCalendar requires. Returns the text to write (with CRLFs)."""
+    pieces = []
+    current, size = "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        # Continuation lines start with a space, which counts towards their 75 bytes.
+        if size + width > 75:
+            pieces.append(current)
+            current, size = " ", 1
+        current += char
+        size += width
+    pieces.append(current)
+    return "\r\n".join(pieces) + "\r\n"
+
+def event_lines(activity_id):
+    """Returns the content lines of an activity's repeating event (without DTSTAMP), or None if it has no sessions."""
+    data = activities.get(activity_id, {})
+    schedule = get_schedule(activity_id)
+    first = next(iter_sessions(activity_id), None)
+    if first is None:
+        return None
+    lines = [f"UID:activity-{activity_id}@{UID_DOMAIN}", f"SUMMARY:{escape_text(data.get('activity', 'Activity'))}"]
+    if schedule["times"]:
+        start, end = schedule["times"]
+        lines.append(f"DTSTART:{first:%Y%m%d}T{start // 60:02d}{start % 60:02d}00")
+        lines.append(f"DTEND:{first:%Y%m%d}T{end // 60:02d}{end % 60:02d}00")
+        until = f"{schedule['end']:%Y%m%d}T235959"
+    else:
+        lines.append(f"DTSTART;VALUE=DATE:{first:%Y%m%d}")
+        until = f"{schedule['end']:%Y%m%d}"
+    days = ",".join(ICAL_DAYS[d] for d in schedule["weekdays"])
+    lines.append(f"RRULE:FREQ=WEEKLY;BYDAY={days};UNTIL={until}")
+    if data.get("location"):
+        lines.append(f"LOCATION:{escape_text(data['location'])}")
+    teacher = format_teacher_name(data.get("teacher_id"))
+    description = [f"Teacher: {teacher}"]
+    if data.get("cost"):
+        description.append(f"Cost: ${data['cost']}")
+    lines.append(f"DESCRIPTION:{escape_text(chr(10).join(description))}")
+    return lines
+
+def write_feed(path, title, events, stamp=None):
+    """Streams a calendar file to 'path'. 'events' is an iterable of event_lines() results (None ones are skipped)."""
+    stamp = stamp or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf-8", newline="") as f:
+        for line in ("BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODUCT_ID}", "CALSCALE:GREGORIAN",
+                     f"X-WR-CALNAME:{escape_text(title)}"):
+            f.write(fold_line(line))
+        for lines in events:
+            if not lines:
+                continue
+            f.write("BEGIN:VEVENT\r\n")
+            # DTSTAMP goes straight after the UID.
+            f.write(fold_line(lines[0]))
+            f.write(fold_line(f"DTSTAMP:{stamp}"))
+            for line in lines[1:]:
+                f.write(fold_line(line))
+            f.write("END:VEVENT\r\n")
+        f.write("END:VCALENDAR\r\n")
+    # Swap the finished file in, so a calendar app polling the feed never reads half of it.
+    os.replace(temp_file, path)
+    return path
+
+# --- Single Feeds ---
+
+def student_activity_ids(student_id):
+    """Returns the activities in a student's feed."""
+    return [a for a in students.get(student_id, {}).get("activities_enrolled", []) if a in activities]
+
+def teacher_activity_ids(teacher_id):
+    """Returns the activities in a teacher's feed (every activity they run)."""
+    return [a for a, data in activities.items() if data.get("teacher_id") == teacher_id]
+
+def student_feed_title(student_id):
+    """Returns the calendar name shown for a student's feed."""
+    s_data = students.get(student_id, {})
+    return f"Clubs - {s_data.get('firstname', '')} {s_data.get('surname', '')}".strip()
+
+def write_student_feed(student_id, path):
+    """Writes one student's calendar (all their clubs) to 'path'."""
+    return write_feed(path, student_feed_title(student_id), (event_lines(a) for a in student_activity_ids(student_id)))
+
+def write_teacher_feed(teacher_id, path):
+    """Writes one teacher's calendar (every activity they run) to 'path'."""
+    return write_feed(path, f"Clubs - {format_teacher_name(teacher_id)}", (event_lines(a) for a in teacher_activity_ids(teacher_id)))
+
+def write_activity_feed(activity_id, path):
+    """Writes one activity's calendar to 'path'."""
+    return write_feed(path, activities.get(activity_id, {}).get("activity", "Activity"), [event_lines(activity_id)])
+
+# --- Batch Job for the Whole School ---
+# Every feed's fingerprint is a hash of its title and the events in it. A feed is only rewritten when its
+# fingerprint differs from the one in the manifest (an activity in it changed, or someone joined or left),
+# or its file is missing. Feeds for students, teachers and activities that no longer exist are deleted.
+
+def _fingerprint(title, event_texts):
+    """Returns the fingerprint of a feed from its title and its events' text."""
+    digest = hashlib.blake2b(title.encode("utf-8"), digest_size=16)
+    for text in event_texts:
+        digest.update(b"\0" + text.encode("utf-8"))
+    return digest.hexdigest()
+
+def plan_feeds(output_dir=FEEDS_DIR):
+    """Works out every feed in the school. Returns ({activity_id: event lines}, [(name, path, title, activity_ids, fingerprint)])."""
+    # Copies of the IDs are looped over, because the admin view runs this on a background thread
+    # while the records can still be changed.
+    events = {a: event_lines(a) for a in list(activities)}
+    texts = {a: "\n".join(lines) for a, lines in events.items() if lines}
+    feeds = []
+
+    def add(kind, key, title, activity_ids):
+        ids = sorted(a for a in activity_ids if a in texts)
+        name = f"{kind}/{key}.ics"
+        feeds.append((name, os.path.join(output_dir, kind, f"{key}.ics"), title, ids, _fingerprint(title, (texts[a] for a in ids))))
+
+    for s_id in list(students):
+        add("students", s_id, student_feed_title(s_id), student_activity_ids(s_id))
+    by_teacher = {}
+    for a, data in list(activities.items()):
+        by_teacher.setdefault(data.get("teacher_id"), []).append(a)
+    for t_id in list(teachers):
+        add("teachers", t_id, f"Clubs - {format_teacher_name(t_id)}", by_teacher.get(t_id, []))
+    for a, data in list(activities.items()):
+        add("activities", a, data.get("activity", "Activity"), [a])
+    return events, feeds
+
+# Event lines for the worker processes, sent once per process rather than with every feed.
+_worker_events = {}
+
+def _init_worker(events):
+    """Process pool initialiser: keeps every activity's event lines in the worker."""
+    _worker_events.update(events)
+
+def _write_job(path, title, activity_ids, stamp):
+    """Writes one feed in a worker process. Returns its path."""
+    return write_feed(path, title, (_worker_events.get(a) for a in activity_ids), stamp)
+
+def _write_all(jobs, events, stamp, max_workers):
+    """Writes feeds on a process pool with a bounded queue, yielding each path as it is written."""
+    if max_workers == 1:
+        _init_worker(events)
+        for path, title, ids in jobs:
+            yield _write_job(path, title, ids, stamp)
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(events,)) as executor:
+        queue_limit = max_workers * 2
+        pending = set()
+        for path, title, ids in jobs:
+            pending.add(executor.submit(_write_job, path, title, ids, stamp))
+            if len(pending) >= queue_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+def generate_feeds(output_dir=FEEDS_DIR, max_workers=None, force=False, progress=None):
+    """Writes (or refreshes) every student, teacher and activity feed. Returns (written, unchanged, deleted).
+
+    With force=True every feed is rewritten. 'progress' (optional) is called with the number of feeds
+    written so far as each one finishes.
+    """
+    for kind in ("students", "teachers", "activities"):
+        os.makedirs(os.path.join(output_dir, kind), exist_ok=True)
+    manifest_path = os.path.join(output_dir, FEEDS_MANIFEST)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    events, feeds = plan_feeds(output_dir)
+    jobs = []
+    new_manifest = {}
+    for name, path, title, ids, fingerprint in feeds:
+        new_manifest[name] = fingerprint
+        if force or manifest.get(name) != fingerprint or not os.path.exists(path):
+            jobs.append((path, title, ids))
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    written = 0
+    for _ in _write_all(jobs, events, stamp, max_workers):
+        written += 1
+        if progress:
+            progress(written)
+
+    deleted = 0
+    for name in manifest.keys() - new_manifest.keys():
+        try:
+            os.remove(os.path.join(output_dir, name))
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    # The manifest is written last, so an interrupted run simply redoes its feeds next time.
+    with open(manifest_path, "w") as f:
+        json.dump(new_manifest, f)
+    return written, len(feeds) - written, deleted
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python calendar_feeds.py [output_dir] [--workers N] [--force]"""
+    parser = argparse.ArgumentParser(description="Write iCalendar feeds for every student, teacher and activity.")
+    parser.add_argument("output_dir", nargs="?", default=FEEDS_DIR, help="Folder to write the feeds into.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU).")
+    parser.add_argument("--force", action="store_true", help="Rewrite every feed, even unchanged ones.")
+    args = parser.parse_args(argv)
+    written, unchanged, deleted = generate_feeds(args.output_dir, args.workers, args.force)
+    print(f"Wrote {written} feed(s), {unchanged} unchanged, {deleted} removed. Feeds are in {args.output_dir}")
+
+# The guard is also required so worker processes don't re-run the batch when they import this module.
+if __name__ == "__main__":
+    main()
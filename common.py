@@ -1,10 +1,19 @@
 # Import the json library to work with JSON data (reading from and writing to data.json).
 import json
+# Import os to replace the data file in one step when saving.
+import os
+# Import threading to give each saving thread its own temporary file.
+import threading
 # Import the tkinter library, specifically the messagebox module for showing pop-up messages.
 from tkinter import messagebox
+# Import the LRU cache used to avoid rebuilding detail-panel text on every click.
+from view_cache import LRUCache
 
 # Define the path to the JSON file where all application data is stored.
 DATA_FILE = "data.json"
+# Whether load_data() checks the data for dangling references and malformed fields (see integrity.py):
+# None (don't check), "check" (print the problems) or "repair" (also fix what can be fixed, in one save).
+INTEGRITY_ON_LOAD = None
 
 # --- Global Data Dictionaries ---
 # These dictionaries will hold the application's data after it's loaded from the JSON file.
@@ -26,39 +35,75 @@ USERS = {}
 # Key: teacher_id (integer), Value: dictionary of teacher details.
 teachers = {}
 
+# enrolment_index: The reverse of each student's 'activities_enrolled' list.
+# Key: activity_id (integer), Value: set of student_ids enrolled in that activity.
+# It is rebuilt whenever data is loaded and kept up to date by enrol_student()/unenrol_student(),
+# so views can find an activity's roster without scanning every student.
+enrolment_index = {}
+
+# co_enrolment: how many students are enrolled in each pair of activities, stored both ways round.
+# Key: activity_id, Value: {other_activity_id: number of students enrolled in both}.
+# Only pairs that share at least one student are stored, so it stays small however many students there are.
+# Kept up to date with enrolment_index; used for "students who joined X also joined Y" recommendations.
+co_enrolment = {}
+
+# teacher_index: which activities each teacher runs.
+# Key: teacher_id (integer), Value: set of activity_ids whose 'teacher_id' is that teacher.
+# Rebuilt with the enrolment index and kept up to date by touch_record(), so a teacher's dashboard
+# only looks at their own activities, however large the school is.
+teacher_index = {}
+# The teacher each activity is filed under in teacher_index, so a change of teacher can move it.
+_activity_teachers = {}
+
+# enrolment_listeners: functions called as listener(student_id, activity_id, joined) after every
+# single join (joined=True) or leave (joined=False). Lets other modules (like the fee ledger in
+# ledger.py) react to enrolment changes without common.py having to import them.
+enrolment_listeners = []
+
+# save_listeners: functions called as listener(data_file) after every successful save_data().
+# Used by backups.py to back up each save in the background.
+save_listeners = []
+
+# reload_listeners: functions called as listener(changes) after update_data() has brought in changes
+# made to the data file outside this program (see data_watcher.py). 'changes' maps each kind
+# ('activity', 'student', 'user', 'teacher') to the set of IDs that were added, changed or removed.
+# Used by the open views to refresh themselves.
+reload_listeners = []
+
+# record_listeners: functions called as listener(kind, record_id) after every touch_record(), i.e.
+# whenever a single record has been changed, added or deleted.
+# rebuild_listeners: functions called with no arguments after rebuild_enrolment_index(), i.e. after the
+# whole data set may have changed (install_data(), replace_data(), repairs and merges).
+# Used by query.py to keep its indexes up to date without rebuilding them for every change.
+record_listeners = []
+rebuild_listeners = []
+
+# --- Record Versions and View Cache ---
+# record_versions counts how many times each record has been changed since loading.
+# Key: (kind, id) e.g. ("student", 101908), Value: integer version (missing means 0).
+# Anything that changes a record must call touch_record() so cached views of it are rebuilt.
+record_versions = {}
+# data_generation goes up by one whenever any record changes or the data is reloaded.
+# Derived indexes (like the query indexes) compare it with the value they were built at to know when to rebuild.
+data_generation = 0
+
+# Maximum number of formatted detail strings kept in the view cache.
+VIEW_CACHE_SIZE = 1024
+# view_cache holds formatted text for student info, club details and teacher names.
+view_cache = LRUCache(VIEW_CACHE_SIZE)
+
 # --- Data Loading Function ---
 
 def load_data():
     """Loads data from the JSON file into the global dictionaries."""
-    # Use 'global' keyword to indicate that we want to modify the global variables defined above,
-    # not create new local variables with the same names.
-    global activities, students, USERS, teachers
     try:
         # Open the JSON file specified by DATA_FILE in read mode ('r').
         # 'with open(...)' ensures the file is automatically closed even if errors occur.
         with open(DATA_FILE, 'r') as f:
             # Load the entire JSON structure from the file.
             data = json.load(f)
-
-            # --- Data Conversion and Population ---
-            # The JSON standard only supports string keys. Our application often uses integer IDs
-            # (like student_id, activity_id, teacher_id) as keys in dictionaries for easier lookups.
-            # Therefore, we need to convert the string keys loaded from JSON back into integers
-            # where appropriate when populating our global dictionaries.
-
-            # Convert string keys from 'activities' in JSON to integer keys for the global 'activities' dict.
-            # dict.items() gets key-value pairs. int(k) converts the string key 'k' to an integer.
-            activities = {int(k): v for k, v in data.get('activities', {}).items()}
-
-            # Convert string keys from 'students' in JSON to integer keys for the global 'students' dict.
-            students = {int(k): v for k, v in data.get('students', {}).items()}
-
-            # The 'USERS' dictionary uses usernames (strings) as keys, so no key conversion is needed.
-            # Just assign the loaded 'users' data (or an empty dict if 'users' key is missing).
-            USERS = data.get('users', {})
-
-            # Convert string keys from 'teachers' in JSON to integer keys for the global 'teachers' dict.
-            teachers = {int(k): v for k, v in data.get('teachers', {}).items()}
+            # Copy the loaded data into the global dictionaries.
+            replace_data(data)
 
     # --- Error Handling --- 
     except FileNotFoundError:
@@ -78,13 +123,114 @@ def load_data():
         # Exit the application.
         exit()
 
+    # --- Optional Integrity Check ---
+    if INTEGRITY_ON_LOAD:
+        # Imported here because integrity.py imports this module.
+        from integrity import run_on_load
+        run_on_load(INTEGRITY_ON_LOAD)
+
+def replace_data(data):
+    """Replaces the contents of the global dictionaries with data in the data.json layout.
+
+    The dictionaries are updated in place (cleared and refilled) rather than reassigned, so every
+    module that did 'from common import activities, students, ...' keeps seeing the current data.
+    """
+    # --- Data Conversion and Population ---
+    # The JSON standard only supports string keys. Our application often uses integer IDs
+    # (like student_id, activity_id, teacher_id) as keys in dictionaries for easier lookups.
+    # Therefore, we need to convert the string keys loaded from JSON back into integers
+    # where appropriate when populating our global dictionaries.
+
+    # Convert string keys from 'activities' in JSON to integer keys for the global 'activities' dict.
+    # dict.items() gets key-value pairs. int(k) converts the string key 'k' to an integer.
+    new_activities = {int(k): v for k, v in data.get('activities', {}).items()}
+
+    # Convert string keys from 'students' in JSON to integer keys for the global 'students' dict.
+    new_students = {int(k): v for k, v in data.get('students', {}).items()}
+
+    # The 'USERS' dictionary uses usernames (strings) as keys, so no key conversion is needed.
+    # Just use the loaded 'users' data (or an empty dict if 'users' key is missing).
+    new_users = data.get('users', {})
+
+    # Convert string keys from 'teachers' in JSON to integer keys for the global 'teachers' dict.
+    new_teachers = {int(k): v for k, v in data.get('teachers', {}).items()}
+
+    # Only touch the globals once everything above has converted without errors.
+    install_data(new_activities, new_students, new_users, new_teachers)
+
+def install_data(new_activities, new_students, new_users, new_teachers):
+    """Swaps already-converted dictionaries (integer IDs) into the globals in place.
+
+    Used by replace_data() and when switching between campuses (see tenants.py).
+    """
+    for target, source in ((activities, new_activities), (students, new_students), (USERS, new_users), (teachers, new_teachers)):
+        target.clear()
+        target.update(source)
+
+    # Build the activity -> students lookup from the freshly loaded student records.
+    rebuild_enrolment_index()
+    # Any cached view text was built from the old data.
+    view_cache.clear()
+
+def update_data(new_activities, new_students, new_users, new_teachers):
+    """Brings the globals in line with newly loaded dictionaries (integer IDs), changing only the records that differ.
+
+    Unlike install_data(), the enrolment indexes are only updated for the students and activities
+    that changed, and only their cached views are dropped. Enrolment listeners are not called, because
+    these changes were already made (and saved) elsewhere. Returns {kind: set of changed IDs}.
+    """
+    changes = {}
+    for kind, target, source in (("activity", activities, new_activities), ("student", students, new_students),
+                                 ("user", USERS, new_users), ("teacher", teachers, new_teachers)):
+        # Removed records, plus new records and records whose contents differ.
+        changed = set(target.keys() - source.keys())
+        changed.update(k for k, v in source.items() if target.get(k) != v)
+        changes[kind] = changed
+
+    # New activities get an (empty) roster, like in rebuild_enrolment_index().
+    for act_id in changes["activity"]:
+        if act_id in new_activities:
+            enrolment_index.setdefault(act_id, set())
+
+    # Take each changed student out of the indexes as they were, then put them back as they are now.
+    for s_id in changes["student"]:
+        old_ids = set(students.get(s_id, {}).get("activities_enrolled", []))
+        new_ids = set(new_students.get(s_id, {}).get("activities_enrolled", []))
+        for act_id in old_ids - new_ids:
+            enrolment_index.get(act_id, set()).discard(s_id)
+        for act_id in new_ids - old_ids:
+            enrolment_index.setdefault(act_id, set()).add(s_id)
+        if old_ids != new_ids:
+            _add_co_enrolments(old_ids, -1)
+            _add_co_enrolments(new_ids, 1)
+
+    for kind, target, source in (("activity", activities, new_activities), ("student", students, new_students),
+                                 ("user", USERS, new_users), ("teacher", teachers, new_teachers)):
+        for record_id in changes[kind]:
+            if record_id in source:
+                target[record_id] = source[record_id]
+            else:
+                del target[record_id]
+            if kind != "user":
+                touch_record(kind, record_id)
+
+    # Removed activities keep a roster entry only while some student still points at them.
+    for act_id in changes["activity"]:
+        if act_id not in activities and not enrolment_index.get(act_id):
+            enrolment_index.pop(act_id, None)
+    return changes
+
 # --- Data Saving Function ---
 
 def save_data(activities_data, students_data, users_data, teachers_data):
-    """Saves the current state of the data dictionaries back to the JSON file."""
+    """Saves the current state of the data dictionaries back to the JSON file. Returns True if it worked."""
+    # Write to a temporary file first and then swap it in, so a failed save can never leave
+    # a half-written data.json behind.
+    # The temporary file is named after the process and thread, so two saves at once never write to the same one.
+    temp_file = f"{DATA_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        # Open the JSON file in write mode ('w'). This will overwrite the existing file.
-        with open(DATA_FILE, 'w') as f:
+        # Open the temporary file in write mode ('w').
+        with open(temp_file, 'w') as f:
             # Prepare the data structure to be saved. Combine all dictionaries into one main dictionary.
             # Note: JSON requires keys to be strings. Python dictionary keys (like integer IDs)
             # will be automatically converted to strings by json.dump(). When loading, we convert them back.
@@ -97,14 +243,252 @@ def save_data(activities_data, students_data, users_data, teachers_data):
             # Write the data_to_save dictionary to the file 'f'.
             # 'indent=4' makes the JSON file human-readable with pretty-printing (4 spaces indentation).
             json.dump(data_to_save, f, indent=4)
+        # Replace the real data file with the finished one in a single step.
+        os.replace(temp_file, DATA_FILE)
+        # Tell listeners (like the backup thread) that a new version of the file exists.
+        for listener in save_listeners:
+            listener(DATA_FILE)
+        return True
     except Exception as e:
         # If any error occurs during saving (e.g., file permissions), show an error message.
         messagebox.showerror("Save Error", f"Failed to save data to '{DATA_FILE}': {e}")
+        return False
+
+# --- Enrolment Index Functions ---
+
+def rebuild_enrolment_index():
+    """Rebuilds the activity -> enrolled students index from the 'students' dictionary."""
+    global data_generation
+    # Everything derived from the data is now out of date.
+    data_generation += 1
+    # Clear the existing indexes in place so any module that imported them keeps a valid reference.
+    enrolment_index.clear()
+    co_enrolment.clear()
+    teacher_index.clear()
+    _activity_teachers.clear()
+    # Make sure every known activity has an entry, even if nobody is enrolled yet.
+    for act_id in activities:
+        enrolment_index[act_id] = set()
+        _index_activity_teacher(act_id)
+    # Walk every student once and record them against each activity they are enrolled in.
+    for s_id, s_data in students.items():
+        for act_id in s_data.get("activities_enrolled", []):
+            # setdefault() also covers enrolments pointing at activities that no longer exist.
+            enrolment_index.setdefault(act_id, set()).add(s_id)
+        # Count every pair of this student's activities once.
+        _add_co_enrolments(set(s_data.get("activities_enrolled", [])), 1)
+    for listener in rebuild_listeners:
+        listener()
+
+def _add_co_enrolments(activity_ids, change, only=None):
+    """Adds 'change' (1 or -1) to the co-enrolment counts of pairs of activities a student shares.
+
+    With 'only', just the pairs between that activity and the others are changed (one join or leave).
+    """
+    if only is None:
+        # Every ordered pair, so each count is added to both rows.
+        pairs = [(a, b) for a in activity_ids for b in activity_ids if a != b]
+    else:
+        pairs = [pair for b in activity_ids if b != only for pair in ((only, b), (b, only))]
+    for a, b in pairs:
+        row = co_enrolment.setdefault(a, {})
+        row[b] = row.get(b, 0) + change
+        # Drop pairs that no longer share anyone, so the rows stay sparse.
+        if row[b] <= 0:
+            del row[b]
+
+def _index_activity_teacher(activity_id):
+    """Files an activity under its current teacher in teacher_index (or removes it if it was deleted)."""
+    old = _activity_teachers.pop(activity_id, None)
+    if old is not None:
+        teacher_index.get(old, set()).discard(activity_id)
+    teacher_id = activities.get(activity_id, {}).get("teacher_id")
+    if teacher_id is not None:
+        teacher_index.setdefault(teacher_id, set()).add(activity_id)
+        _activity_teachers[activity_id] = teacher_id
+
+def get_teacher_activities(teacher_id):
+    """Returns the set of activity IDs a teacher runs (empty set if none)."""
+    return teacher_index.get(teacher_id, set())
+
+def get_enrolled_students(activity_id):
+    """Returns the set of student IDs enrolled in an activity (empty set if none)."""
+    return enrolment_index.get(activity_id, set())
+
+def remaining_seats(activity_id):
+    """Returns how many seats are left in an activity, or None if it has no capacity limit."""
+    capacity = activities.get(activity_id, {}).get("capacity")
+    if capacity in (None, ""):
+        return None
+    return max(int(capacity) - len(get_enrolled_students(activity_id)), 0)
+
+def is_full(activity_id):
+    """Returns True if an activity has a capacity and every seat is taken."""
+    return remaining_seats(activity_id) == 0
+
+def enrol_student(student_id, activity_id):
+    """Adds an activity to a student's enrolments and updates the index. Returns True if added.
+
+    Returns False without changing anything if the student is already enrolled or the activity is full.
+    """
+    student_data = students.get(student_id)
+    # Unknown students cannot be enrolled.
+    if student_data is None:
+        return False
+    # Ensure the enrolment list exists and is a list before modifying it.
+    if not isinstance(student_data.get("activities_enrolled"), list):
+        student_data["activities_enrolled"] = []
+    # Do nothing if the student is already enrolled.
+    if activity_id in student_data["activities_enrolled"]:
+        return False
+    # Activities with a capacity (see allocation.py) never take more students than they have seats.
+    if is_full(activity_id):
+        return False
+    # Pair the new activity with each of the student's other activities before adding it.
+    _add_co_enrolments(set(student_data["activities_enrolled"]), 1, only=activity_id)
+    student_data["activities_enrolled"].append(activity_id)
+    enrolment_index.setdefault(activity_id, set()).add(student_id)
+    touch_record("student", student_id)
+    _notify_enrolment(student_id, activity_id, True)
+    return True
+
+def unenrol_student(student_id, activity_id):
+    """Removes an activity from a student's enrolments and updates the index. Returns True if removed."""
+    student_data = students.get(student_id)
+    # Nothing to do if the student doesn't exist or isn't enrolled.
+    if student_data is None or activity_id not in student_data.get("activities_enrolled", []):
+        return False
+    student_data["activities_enrolled"].remove(activity_id)
+    enrolment_index.get(activity_id, set()).discard(student_id)
+    # Unpair the activity from each of the student's remaining activities.
+    _add_co_enrolments(set(student_data["activities_enrolled"]), -1, only=activity_id)
+    touch_record("student", student_id)
+    _notify_enrolment(student_id, activity_id, False)
+    return True
+
+def _notify_enrolment(student_id, activity_id, joined):
+    """Tells every registered listener about one join or leave."""
+    for listener in enrolment_listeners:
+        listener(student_id, activity_id, joined)
+
+def apply_enrolment_changes(enrolments=(), unenrolments=()):
+    """Applies many enrolment changes as one transaction with a single save.
+
+    'enrolments' and 'unenrolments' are iterables of (student_id, activity_id) pairs.
+    Unenrolments are applied first, so moving students between activities works in one call.
+    Enrolments in an activity that fills up are skipped (see enrol_student), so check remaining_seats() first
+    when a skipped enrolment would leave a student without a place.
+    If saving fails, every change is undone. Returns (added, removed) counts, or None if it was rolled back.
+    """
+    enrolments = list(enrolments)
+    unenrolments = list(unenrolments)
+    # Remember the original enrolment lists of every student being changed, for rollback.
+    snapshot = {}
+    for s_id, _ in unenrolments + enrolments:
+        if s_id in students and s_id not in snapshot:
+            snapshot[s_id] = list(students[s_id].get("activities_enrolled", []))
+
+    removed = [pair for pair in unenrolments if unenrol_student(*pair)]
+    added = [pair for pair in enrolments if enrol_student(*pair)]
+
+    if (added or removed) and not save_data(activities, students, USERS, teachers):
+        # Put every student's list back exactly as it was and rebuild the index to match.
+        for s_id, original in snapshot.items():
+            students[s_id]["activities_enrolled"] = original
+            touch_record("student", s_id)
+        rebuild_enrolment_index()
+        # Tell listeners the changes were undone (in reverse order), so they can reverse them too.
+        for s_id, act_id in reversed(added):
+            _notify_enrolment(s_id, act_id, False)
+        for s_id, act_id in reversed(removed):
+            _notify_enrolment(s_id, act_id, True)
+        return None
+    return len(added), len(removed)
+
+def delete_activity(activity_id):
+    """Removes an activity, unenrolling its students first. Returns the IDs of the students who were enrolled.
+
+    The students leave while the activity still exists, so the enrolment listeners (like the fee
+    ledger's credit for the unused share) can still read its cost and dates. Doesn't save.
+    """
+    # sorted() makes a copy, since unenrol_student() changes the set while we loop.
+    enrolled_ids = sorted(get_enrolled_students(activity_id))
+    for s_id in enrolled_ids:
+        unenrol_student(s_id, activity_id)
+    activities.pop(activity_id, None)
+    enrolment_index.pop(activity_id, None)
+    touch_record("activity", activity_id)
+    return enrolled_ids
+
+# --- Eligibility ---
+
+def is_year_eligible(student_year, allowed_years_str):
+    """Returns True if a student in 'student_year' may join an activity with the given 'year_level' string.
+
+    Handles "N/A", "all"/"7-12", ranges ("9-10"), lists ("7, 9, 11") and single years ("10").
+    Malformed strings are treated as open to everyone.
+    """
+    if allowed_years_str is None or allowed_years_str == "N/A":
+        # If no year level is specified for the club, assume eligible.
+        return True
+    if student_year is None:
+        return False
+    try:
+        if "all" in allowed_years_str.lower() or allowed_years_str == "7-12":
+            return True # Eligible for all years
+        if "-" in allowed_years_str: # Range format (e.g., "9-10")
+            min_year, max_year = map(int, allowed_years_str.split('-'))
+            return min_year <= student_year <= max_year
+        if "," in allowed_years_str: # List format (e.g., "7, 9, 11")
+            return student_year in [int(y.strip()) for y in allowed_years_str.split(',')]
+        # Single year format (e.g., "10")
+        return int(allowed_years_str) == student_year
+    except ValueError:
+        # If the year level string is malformed (e.g., "Year 9"), default to eligible.
+        print(f"Warning: Could not parse year level '{allowed_years_str}'")
+        return True
+
+# --- Record Version Functions ---
+
+def record_version(kind, record_id):
+    """Returns the current version number of a record ('student', 'activity' or 'teacher')."""
+    return record_versions.get((kind, record_id), 0)
+
+def touch_record(kind, record_id):
+    """Marks a record as changed so any cached view of it is rebuilt next time it is shown."""
+    global data_generation
+    data_generation += 1
+    record_versions[(kind, record_id)] = record_version(kind, record_id) + 1
+    # Drop the cached text straight away rather than waiting for it to be evicted.
+    if kind == "student":
+        view_cache.invalidate(("student_info", record_id))
+    elif kind == "activity":
+        view_cache.invalidate(("club_details", record_id))
+        # The activity may have been given a different teacher, or deleted.
+        _index_activity_teacher(record_id)
+    elif kind == "teacher":
+        view_cache.invalidate(("teacher_name", record_id))
+        # Club details include the teacher's name, so they are rebuilt through their version key.
+    for listener in record_listeners:
+        listener(kind, record_id)
+
+def get_data_generation():
+    """Returns the current data generation (see 'data_generation' above)."""
+    return data_generation
+
+def view_cache_stats():
+    """Returns hit/miss statistics for the detail-panel view cache (useful for tuning VIEW_CACHE_SIZE)."""
+    return view_cache.stats()
 
 # --- Helper Function --- 
 
 def format_student_info(student_id):
-    """Formats student information into a readable string."""
+    """Formats student information into a readable string (cached until the student changes)."""
+    return view_cache.get_or_build(("student_info", student_id), record_version("student", student_id),
+                                   lambda: _build_student_info(student_id))
+
+def _build_student_info(student_id):
+    """Builds the text shown by format_student_info()."""
     # Access the global 'students' dictionary.
     # Use .get(student_id, {}) to safely retrieve the student's data.
     # If the student_id doesn't exist, it returns an empty dictionary, preventing errors.
@@ -126,6 +510,37 @@ def format_student_info(student_id):
     # Return the formatted string.
     return info
 
+def format_teacher_name(teacher_id):
+    """Returns a teacher's name with their title (e.g., 'Mr John Smith'), or 'N/A' if unknown."""
+    def build():
+        t_data = teachers.get(teacher_id)
+        if not t_data:
+            return "N/A"
+        return f"{t_data.get('title', '')} {t_data.get('firstname', '')} {t_data.get('surname', '')}".strip()
+    return view_cache.get_or_build(("teacher_name", teacher_id), record_version("teacher", teacher_id), build)
+
+def format_club_details(club_id):
+    """Formats an activity's details (including its teacher) for the student details panel."""
+    club = activities.get(club_id)
+    # Missing clubs aren't cached, so a newly added club with this ID shows up straight away.
+    if not club:
+        return "Club details not found."
+    teacher_id = club.get("teacher_id")
+    # The version covers the activity and its teacher, so editing either one rebuilds the text.
+    version = (record_version("activity", club_id), teacher_id, record_version("teacher", teacher_id))
+    def build():
+        details_list = [
+            f"Name: {club.get('activity', 'N/A')}",
+            f"Year Level(s): {club.get('year_level', 'N/A')}",
+            f"Location: {club.get('location', 'N/A')}",
+            f"Schedule: {club.get('days', 'N/A')} at {club.get('time', 'N/A')}",
+            f"Cost: ${club.get('cost', 0)}",
+            f"Dates: {club.get('start_date', 'N/A')} to {club.get('end_date', 'N/A')}",
+            f"Teacher: {format_teacher_name(teacher_id)}",
+        ]
+        return "\n".join(details_list)
+    return view_cache.get_or_build(("club_details", club_id), version, build)
+
 # --- Initial Data Load ---
 # Call load_data() immediately when this module (common.py) is imported.
 # This ensures that the global dictionaries (activities, students, USERS, teachers)
@@ -0,0 +1,264 @@
+# Import hashlib for the scrypt password hashing function.
+import hashlib
+# Import hmac for comparing hashes in constant time (so timing doesn't leak how much matched).
+import hmac
+# Import secrets to generate salts and random initial passwords.
+import secrets
+# Import csv to write the list of new passwords for distribution.
+import csv
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import the process pool so hashing can use every CPU core.
+from concurrent.futures import ProcessPoolExecutor
+
+# Import shared data and the save function from common.py.
+from common import activities, students, USERS, teachers, save_data
+
+# --- Hashing Settings ---
+# scrypt is "memory-hard": each hash needs SCRYPT_N * SCRYPT_R * 128 bytes of memory (16 MB here),
+# which makes guessing passwords on special hardware expensive.
+# These values take roughly 50 ms per hash, which keeps each login well inside LOGIN_LATENCY_BUDGET.
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+# Upper limit on memory scrypt may use (must be above N * R * 128).
+SCRYPT_MAXMEM = 64 * 1024 * 1024
+# Length of the random salt and the stored hash, in bytes.
+SALT_BYTES = 16
+HASH_BYTES = 32
+# Logins should never take longer than this many seconds to verify. Raising SCRYPT_N makes hashes
+# stronger but slower; keep one hash comfortably under this budget on the kiosk hardware.
+LOGIN_LATENCY_BUDGET = 0.25
+
+# Prefix identifying the hash format stored in the 'password_hash' field.
+HASH_SCHEME = "scrypt"
+
+# --- Hashing and Verifying ---
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hashes a password with a new random salt.
+
+    Returns a string 'scrypt$n$r$p$salt$hash' that stores everything needed to verify it later.
+    """
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=HASH_BYTES)
+    return f"{HASH_SCHEME}${n}${r}${p}${salt.hex()}${digest.hex()}"
+
+def _parse_hash(stored):
+    """Splits a stored hash into (n, r, p, salt, digest). Returns None if it is malformed."""
+    try:
+        scheme, n, r, p, salt_hex, digest_hex = stored.split("$")
+        if scheme != HASH_SCHEME:
+            return None
+        return int(n), int(r), int(p), bytes.fromhex(salt_hex), bytes.fromhex(digest_hex)
+    except (AttributeError, ValueError):
+        return None
+
+def verify_password(password, stored):
+    """Returns True if the password matches a hash made by hash_password()."""
+    parsed = _parse_hash(stored)
+    if parsed is None:
+        return False
+    n, r, p, salt, digest = parsed
+    candidate = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM, dklen=len(digest))
+    return hmac.compare_digest(candidate, digest)
+
+def needs_rehash(stored):
+    """Returns True if a hash was made with different settings from the current ones."""
+    parsed = _parse_hash(stored)
+    return parsed is None or parsed[:3] != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+# A hash of a random password, checked against when the username doesn't exist.
+# This makes failed logins for unknown users take as long as for real ones.
+# Made on the first failed lookup rather than at import, so tools that never check a login
+# (and every worker process that imports this module) don't pay for an scrypt hash.
+_dummy_hash = None
+
+def _get_dummy_hash():
+    """Returns the hash used for unknown usernames, making it the first time it is needed."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    return _dummy_hash
+
+# --- Login ---
+
+def check_login(username, password):
+    """Checks a username and password against USERS. Returns the user's info if correct, else None.
+
+    Old accounts that still have a plain-text 'password' are upgraded to a hash the first time
+    they log in successfully. Each check costs a single scrypt hash, so it stays inside LOGIN_LATENCY_BUDGET.
+    """
+    user_info = USERS.get(username)
+    if user_info is None:
+        # Spend the same time as a real check, then fail.
+        verify_password(password, _get_dummy_hash())
+        return None
+
+    if "password_hash" in user_info:
+        if not verify_password(password, user_info["password_hash"]):
+            return None
+        # Quietly strengthen hashes made with older settings.
+        if needs_rehash(user_info["password_hash"]):
+            user_info["password_hash"] = hash_password(password)
+            save_data(activities, students, USERS, teachers)
+        return user_info
+
+    # Legacy plain-text password: compare in constant time, then replace it with a hash.
+    if "password" in user_info and hmac.compare_digest(str(user_info["password"]).encode("utf-8"), password.encode("utf-8")):
+        user_info["password_hash"] = hash_password(password)
+        del user_info["password"]
+        save_data(activities, students, USERS, teachers)
+        return user_info
+    return None
+
+def set_password(username, password, save=True):
+    """Sets (or replaces) a user's password, storing only its hash."""
+    USERS[username]["password_hash"] = hash_password(password)
+    USERS[username].pop("password", None)
+    if save:
+        save_data(activities, students, USERS, teachers)
+
+def migrate_plaintext_passwords(max_workers=None):
+    """Replaces every plain-text password in USERS with a hash, in one batch. Returns how many were changed."""
+    usernames = [name for name, info in USERS.items() if "password" in info]
+    hashes = _hash_many([str(USERS[name]["password"]) for name in usernames], max_workers)
+    for name, hashed in zip(usernames, hashes):
+        USERS[name]["password_hash"] = hashed
+        del USERS[name]["password"]
+    if usernames:
+        save_data(activities, students, USERS, teachers)
+    return len(usernames)
+
+# --- Bulk Provisioning ---
+
+# How many passwords are sent to a worker process at a time.
+HASH_CHUNK_SIZE = 64
+
+def _hash_many(passwords, max_workers=None):
+    """Hashes a list of passwords, spread across worker processes. Results keep the input order."""
+    # With one worker (or very few passwords) a pool would only add start-up time.
+    if max_workers == 1 or len(passwords) < HASH_CHUNK_SIZE:
+        return [hash_password(pw) for pw in passwords]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(hash_password, passwords, chunksize=HASH_CHUNK_SIZE))
+
+def student_username(student_id):
+    """Returns the username given to a provisioned student account (their student ID)."""
+    return str(student_id)
+
+def provision_accounts(output_path="new_passwords.csv", rotate=False, max_workers=None):
+    """Creates a login for every student in 'students' that doesn't have one.
+
+    With rotate=True, existing student accounts also get a new password.
+    New passwords are written to 'output_path' (a CSV to hand out to students) and only their hashes
+    are kept in USERS. All changes are saved with a single save_data() call, and the CSV is only written
+    once that save has worked. Returns a tuple (created, rotated), or None if the save failed (nothing is changed).
+    """
+    # Find which students already have an account (under any username).
+    existing = {}
+    for name, info in USERS.items():
+        if info.get("role") == "student" and info.get("student_id") is not None:
+            existing.setdefault(info["student_id"], []).append(name)
+
+    # Work out which accounts to create or rotate.
+    jobs = []  # (username, student_id, is_new)
+    for s_id in sorted(students):
+        if s_id not in existing:
+            jobs.append((student_username(s_id), s_id, True))
+        elif rotate:
+            for name in existing[s_id]:
+                jobs.append((name, s_id, False))
+
+    passwords = [secrets.token_urlsafe(9) for _ in jobs]
+    hashes = _hash_many(passwords, max_workers)
+
+    created = rotated = 0
+    # Copies of the rotated accounts, so they can be put back if the save fails.
+    originals = {name: dict(USERS[name]) for name, _, is_new in jobs if not is_new}
+    for (name, s_id, is_new), hashed in zip(jobs, hashes):
+        if is_new:
+            USERS[name] = {"password_hash": hashed, "role": "student", "student_id": s_id}
+            created += 1
+        else:
+            USERS[name]["password_hash"] = hashed
+            USERS[name].pop("password", None)
+            rotated += 1
+
+    if jobs and not save_data(activities, students, USERS, teachers):
+        # Undo the changes so memory matches the file, and don't hand out passwords that don't work.
+        for name, _, is_new in jobs:
+            if is_new:
+                USERS.pop(name, None)
+        USERS.update(originals)
+        return None
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("username", "student_id", "name", "password"))
+        for (name, s_id, _), password in zip(jobs, passwords):
+            s_data = students.get(s_id, {})
+            writer.writerow((name, s_id, f"{s_data.get('firstname', '')} {s_data.get('surname', '')}".strip(), password))
+    return created, rotated
+
+def teacher_username(teacher_id):
+    """Returns the username given to a provisioned teacher account (e.g. 't3001')."""
+    return f"t{teacher_id}"
+
+def provision_teacher_accounts(output_path="new_teacher_passwords.csv"):
+    """Creates a 'teacher' login, linked by teacher_id, for every teacher that doesn't have one.
+
+    New passwords are written to 'output_path' (only after the single save has worked) and only their hashes
+    are kept. Returns how many were created, or None if the save failed (nothing is changed).
+    """
+    existing = {info.get("teacher_id") for info in USERS.values() if info.get("role") == "teacher"}
+    new_ids = [t_id for t_id in sorted(teachers) if t_id not in existing and teacher_username(t_id) not in USERS]
+    passwords = [secrets.token_urlsafe(9) for _ in new_ids]
+    hashes = _hash_many(passwords)
+    for t_id, hashed in zip(new_ids, hashes):
+        USERS[teacher_username(t_id)] = {"password_hash": hashed, "role": "teacher", "teacher_id": t_id}
+    if new_ids and not save_data(activities, students, USERS, teachers):
+        for t_id in new_ids:
+            del USERS[teacher_username(t_id)]
+        return None
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("username", "teacher_id", "name", "password"))
+        for t_id, password in zip(new_ids, passwords):
+            t_data = teachers[t_id]
+            writer.writerow((teacher_username(t_id), t_id, f"{t_data.get('firstname', '')} {t_data.get('surname', '')}".strip(), password))
+    return len(new_ids)
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python credentials.py provision|provision-teachers|migrate [options]"""
+    parser = argparse.ArgumentParser(description="Manage hashed user credentials.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    provision = commands.add_parser("provision", help="Create accounts for every student without one.")
+    provision.add_argument("--rotate", action="store_true", help="Also give existing student accounts new passwords.")
+    provision.add_argument("--output", default="new_passwords.csv", help="CSV file to write the new passwords to.")
+    teacher_provision = commands.add_parser("provision-teachers", help="Create a teacher login for every teacher without one.")
+    teacher_provision.add_argument("--output", default="new_teacher_passwords.csv", help="CSV file to write the new passwords to.")
+    commands.add_parser("migrate", help="Hash any plain-text passwords still in the data file.")
+    args = parser.parse_args(argv)
+
+    if args.command == "provision":
+        result = provision_accounts(args.output, args.rotate, args.workers)
+        if result is None:
+            print("The data file could not be saved, so no accounts were changed and no passwords were written.")
+            return
+        print(f"Created {result[0]} account(s), rotated {result[1]}. Passwords written to {args.output}")
+    elif args.command == "provision-teachers":
+        created = provision_teacher_accounts(args.output)
+        if created is None:
+            print("The data file could not be saved, so no accounts were changed and no passwords were written.")
+            return
+        print(f"Created {created} teacher account(s). Passwords written to {args.output}")
+    else:
+        print(f"Hashed {migrate_plaintext_passwords(args.workers)} plain-text password(s).")
+
+# The guard also stops worker processes re-running the command when they import this module.
+if __name__ == "__main__":
+    main()
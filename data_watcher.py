@@ -0,0 +1,182 @@
+# Import json to read the data file again when it changes.
+import json
+# Import os to check the data file's size and modification time.
+import os
+# Import threading and queue: the file is watched and read on a background thread, and the
+# results are handed to the GUI thread, which is the only one allowed to change the data.
+import threading
+import queue
+# Import select and ctypes to use Linux's inotify (file change notifications) when it is available.
+import select
+import ctypes
+import ctypes.util
+
+# Import common as a module so the current DATA_FILE is read each time (it changes when switching campus).
+import common
+from common import update_data, save_listeners, reload_listeners
+# Import the calendar cache, which holds parsed schedules of changed activities.
+from activity_calendar import invalidate_calendar
+
+# --- Hot Reload of the Data File ---
+# When the data file is changed outside this program (a backup restored from the command line, a
+# script fixing records, another copy of the program saving), the running program picks up the
+# changes without a restart:
+#   1. A background thread notices the file has changed. On Linux it sleeps until inotify reports a
+#      change in the file's folder; elsewhere it checks the file's size and modification time every
+#      POLL_SECONDS.
+#   2. The same thread reads and converts the new file, so the GUI never waits for the JSON parsing.
+#   3. The GUI thread (every CHECK_MS) passes it to common.update_data(), which swaps only the records
+#      that differ into the existing dictionaries and re-indexes just those, then tells the open views.
+# This program's own saves are recognised (see _remember_save) and not read back in.
+POLL_SECONDS = 1.0
+CHECK_MS = 500
+# How long a changed file is left to settle before it is read, so writers (including this program's
+# own saves, which are recognised just after the file is swapped in) can finish first.
+SETTLE_SECONDS = 0.2
+
+# Data file -> (modification time, size, inode) of the version that is in memory.
+_known = {}
+# Reloaded data waiting for the GUI thread: (data_file, signature, (activities, students, users, teachers)).
+_pending = queue.Queue()
+_stop = threading.Event()
+_worker = None
+
+def _signature(path):
+    """Returns (modification time, size, inode) for a file, or None if it doesn't exist."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size, info.st_ino
+
+def _remember_save(data_file):
+    """Save listener: records the file this program just wrote, so it isn't reloaded."""
+    _known[data_file] = _signature(data_file)
+
+def _read_file(data_file):
+    """Reads a data file and returns (activities, students, users, teachers) with integer IDs."""
+    with open(data_file, "r") as f:
+        data = json.load(f)
+    return ({int(k): v for k, v in data.get("activities", {}).items()},
+            {int(k): v for k, v in data.get("students", {}).items()},
+            data.get("users", {}),
+            {int(k): v for k, v in data.get("teachers", {}).items()})
+
+# --- inotify (Linux) ---
+# Only the events that mean a file in the folder was finished or swapped in.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+class _Inotify:
+    """Waits for files in one folder to change, using the C library's inotify functions."""
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        # The folder is watched rather than the file, because saves replace the file with a new one.
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder or "."), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"Can't watch '{folder}'")
+
+    def wait(self, timeout):
+        """Waits up to 'timeout' seconds for a change and clears the events that arrived."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            os.read(self.fd, 65536)
+
+    def close(self):
+        os.close(self.fd)
+
+def _open_notifier(data_file):
+    """Returns an inotify watcher for the data file's folder, or None where inotify isn't available."""
+    try:
+        return _Inotify(os.path.dirname(data_file))
+    except (OSError, AttributeError, TypeError):
+        # AttributeError: the C library has no inotify functions (macOS). TypeError: no C library found (Windows).
+        return None
+
+# --- Background Thread ---
+
+def _watch_loop():
+    """Background thread: reads the data file each time it is changed by something else."""
+    watched, notifier = None, None
+    while not _stop.is_set():
+        data_file = common.DATA_FILE
+        if data_file != watched:
+            # A different file (another campus) is now in use. What is in memory was just read from it.
+            if notifier:
+                notifier.close()
+            watched, notifier = data_file, _open_notifier(data_file)
+            _known.setdefault(data_file, _signature(data_file))
+        if notifier:
+            # Still wake up now and then, so a change of data file is noticed.
+            notifier.wait(POLL_SECONDS * 5)
+        else:
+            _stop.wait(POLL_SECONDS)
+        if _signature(data_file) == _known.get(data_file):
+            continue
+        _stop.wait(SETTLE_SECONDS)
+        signature = _signature(data_file)
+        if signature is None or signature == _known.get(data_file):
+            continue
+        try:
+            new_data = _read_file(data_file)
+        except (OSError, ValueError, AttributeError) as e:
+            # Usually a file that is still being written or was saved with a mistake in it; it is tried
+            # again the next time it changes. Logged to the console like other background jobs.
+            print(f"Could not reload '{data_file}': {e}")
+        else:
+            _pending.put((data_file, signature, new_data))
+        _known[data_file] = signature
+    if notifier:
+        notifier.close()
+
+def start_watching(app):
+    """Starts watching the data file. 'app' is the Tk window whose event loop applies the changes."""
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _stop.clear()
+        _worker = threading.Thread(target=_watch_loop, daemon=True)
+        _worker.start()
+    app.after(CHECK_MS, lambda: _check_pending(app))
+
+def stop_watching():
+    """Stops the background thread (it finishes within a few seconds)."""
+    _stop.set()
+
+def _check_pending(app):
+    """Runs on the GUI thread: applies any reloaded data, then checks again in CHECK_MS."""
+    apply_pending()
+    if not _stop.is_set():
+        app.after(CHECK_MS, lambda: _check_pending(app))
+
+def apply_pending():
+    """Applies reloaded data waiting from the background thread. Returns the changes, or None if there were none."""
+    latest = None
+    while True:
+        try:
+            latest = _pending.get_nowait()
+        except queue.Empty:
+            break
+    if latest is None:
+        return None
+    data_file, signature, new_data = latest
+    # Only apply it if its campus is still the one in use and the file hasn't been saved again since it
+    # was read (for example by this program, whose newer data is already in memory).
+    if data_file != common.DATA_FILE or _signature(data_file) != signature:
+        return None
+    changes = update_data(*new_data)
+    if not any(changes.values()):
+        return None
+    for act_id in changes["activity"]:
+        invalidate_calendar(act_id)
+    print("Reloaded changes to '{}': {}".format(data_file, ", ".join(f"{len(ids)} {kind}(s)" for kind, ids in changes.items() if ids)))
+    for listener in reload_listeners:
+        listener(changes)
+    return changes
+
+# Recognise this program's own saves.
+save_listeners.append(_remember_save)
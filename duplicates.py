@@ -0,0 +1,362 @@
+# Import csv to read student import files.
+import csv
+# Import copy to keep an untouched copy of records in case a merge can't be saved.
+import copy
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import SequenceMatcher for approximate string similarity.
+from difflib import SequenceMatcher
+# Import combinations to compare each pair of students in a small block once.
+from itertools import combinations
+# Import bisect to find a new record's neighbours in a big block.
+from bisect import bisect_left, insort
+
+# Import shared data and helpers from common.py.
+from common import activities, students, USERS, teachers, save_data, rebuild_enrolment_index, touch_record
+# Import the attendance and ledger helpers that move a merged student's history.
+from attendance import merge_student_attendance
+from ledger import transfer_student
+
+# --- Duplicate Student Detection ---
+# Comparing every student with every other one takes far too long for a big school, so students are
+# first put into 'blocks' that a duplicate would almost certainly share:
+#   - the Soundex code of their surname plus their date of birth ("Smith" and "Smyth" share S530), and
+#   - their house plus their year level.
+# Only students in the same block are compared, using approximate string similarity on their names.
+# A pair scoring at least DUPLICATE_THRESHOLD (0 to 1) is reported as a likely duplicate.
+DUPLICATE_THRESHOLD = 0.85
+# Blocks up to this size are compared pair by pair. In bigger ones (e.g. a whole house and year) students
+# are sorted by name, surname first and then first name first, and each is only compared with its
+# NEIGHBOUR_WINDOW nearest neighbours in each order, so the work grows in step with the block.
+FULL_COMPARE_SIZE = 50
+NEIGHBOUR_WINDOW = 10
+# Columns read from an import file (student_id is optional; new IDs are given out if it's missing).
+IMPORT_FIELDS = ("student_id", "firstname", "surname", "gender", "year_level", "house", "dob")
+
+SOUNDEX_CODES = {letter: str(code) for code, letters in enumerate(("aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"))
+                 for letter in letters}
+
+def soundex(name):
+    """Returns the Soundex code of a name (e.g. 'Robert' and 'Rupert' -> 'R163'), or '' if it has no letters."""
+    letters = [c for c in name.lower() if c.isalpha() and c in SOUNDEX_CODES]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES[letters[0]]
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES[letter]
+        # Vowels (0) are dropped but separate repeated codes; 'h' and 'w' don't.
+        if digit != "0" and digit != previous:
+            code += digit
+        if letter not in "hw":
+            previous = digit
+    return (code + "000")[:4]
+
+def _clean(text):
+    """Lower-cases a name and keeps only its letters, for comparisons."""
+    return "".join(c for c in str(text or "").lower() if c.isalpha())
+
+def blocking_keys(s_data):
+    """Returns the blocks a student record belongs to."""
+    keys = []
+    surname_code = soundex(s_data.get("surname", ""))
+    if surname_code and s_data.get("dob"):
+        keys.append(("surname+dob", surname_code, s_data["dob"]))
+    if s_data.get("house") and s_data.get("year_level") is not None:
+        keys.append(("house+year", s_data["house"], str(s_data["year_level"])))
+    return keys
+
+def _name_similarity(a, b, floor=0.0):
+    """Returns how alike two strings are (0 to 1), or 0 early if they can't reach 'floor'."""
+    if a == b:
+        return 1.0
+    # The best possible ratio for these lengths, checked before building the (slower) matcher.
+    if not a or not b or 2 * min(len(a), len(b)) / (len(a) + len(b)) < floor:
+        return 0.0
+    matcher = SequenceMatcher(None, a, b)
+    if floor > 0 and matcher.quick_ratio() < floor:
+        return 0.0
+    return matcher.ratio()
+
+def _dob_similarity(a, b):
+    """Compares two dates of birth split into (day, month, year) parts.
+
+    Returns 1 for the same date, 0.5 for a likely typo (one part different, or day and month swapped)
+    or a missing date, otherwise 0.
+    """
+    if not a or not b:
+        return 0.5
+    if a == b:
+        return 1.0
+    if len(a) == len(b) == 3 and (a[2] == b[2]) + (a[1] == b[1]) + (a[0] == b[0]) == 2:
+        return 0.5
+    if len(a) == len(b) == 3 and a[0] == b[1] and a[1] == b[0] and a[2] == b[2]:
+        return 0.5
+    return 0.0
+
+def _prepare(s_data):
+    """Returns the parts of a record that are compared: (first name, surname, dob parts, house, year), names cleaned."""
+    dob = s_data.get("dob")
+    return (_clean(s_data.get("firstname")), _clean(s_data.get("surname")), tuple(dob.split("/")) if dob else None,
+            s_data.get("house"), str(s_data.get("year_level")))
+
+def _score(a, b, at_least=0.0):
+    """Scores two prepared records (see similarity). Returns 0 early once the pair can't reach 'at_least'."""
+    rest = 0.2 * _dob_similarity(a[2], b[2]) + 0.1 * (a[3] == b[3] and a[4] == b[4])
+    # The average name similarity the pair needs to reach 'at_least'.
+    need = (at_least - rest) / 0.7
+    if need > 1:
+        return 0.0
+    best = 0.0
+    # Names as entered, then first name and surname the wrong way round.
+    for first_b, sur_b in ((b[0], b[1]), (b[1], b[0])):
+        # Each name can add at most 1 to the sum of two, so the surname alone must reach 2*need - 1.
+        sur = _name_similarity(a[1], sur_b, 2 * need - 1)
+        first = _name_similarity(a[0], first_b, 2 * need - sur)
+        best = max(best, (sur + first) / 2)
+    return 0.7 * best + rest
+
+def similarity(a, b):
+    """Returns a 0 to 1 score for how likely two student records are the same person."""
+    return _score(_prepare(a), _prepare(b))
+
+def name_orders(s_data):
+    """Returns the two sort keys used inside big blocks: surname first, and first name first."""
+    first, surname = _clean(s_data.get("firstname")), _clean(s_data.get("surname"))
+    return (f"{surname} {first}", f"{first} {surname}")
+
+def build_blocks(records):
+    """Groups records ({id: record}) into blocks.
+
+    Returns {block key: [[(surname-first key, id), ...], [(first-name-first key, id), ...]]}, each list sorted.
+    """
+    blocks = {}
+    for record_id, s_data in records.items():
+        orders = name_orders(s_data)
+        for key in blocking_keys(s_data):
+            block = blocks.setdefault(key, [[], []])
+            block[0].append((orders[0], record_id))
+            block[1].append((orders[1], record_id))
+    for block in blocks.values():
+        block[0].sort()
+        block[1].sort()
+    return blocks
+
+def _block_pairs(block):
+    """Yields the pairs of IDs to compare within one block."""
+    if len(block[0]) <= FULL_COMPARE_SIZE:
+        yield from combinations([record_id for _, record_id in block[0]], 2)
+        return
+    for order in block:
+        for i in range(len(order)):
+            for j in range(i + 1, min(i + 1 + NEIGHBOUR_WINDOW, len(order))):
+                yield order[i][1], order[j][1]
+
+def _block_candidates(block, s_data):
+    """Returns the IDs in a block that a new record should be compared with."""
+    if len(block[0]) <= FULL_COMPARE_SIZE:
+        return [record_id for _, record_id in block[0]]
+    candidates = []
+    for order, sort_key in zip(block, name_orders(s_data)):
+        # The new record's place in each order, and its neighbours either side.
+        i = bisect_left(order, (sort_key,))
+        candidates += [record_id for _, record_id in order[max(i - NEIGHBOUR_WINDOW, 0):i + NEIGHBOUR_WINDOW]]
+    return candidates
+
+# --- Bulk Audit ---
+
+def find_duplicates(threshold=None):
+    """Returns likely duplicate pairs among all students as [(score, lower_id, higher_id)], best first."""
+    threshold = threshold or DUPLICATE_THRESHOLD
+    prepared = {s_id: _prepare(s_data) for s_id, s_data in students.items()}
+    scores = {}
+    for block in build_blocks(students).values():
+        for a, b in _block_pairs(block):
+            a, b = min(a, b), max(a, b)
+            # The same pair can share two blocks (or both name orders); compare it once.
+            if (a, b) not in scores:
+                scores[(a, b)] = _score(prepared[a], prepared[b], threshold)
+    return sorted(((score, a, b) for (a, b), score in scores.items() if score >= threshold), key=lambda p: (-p[0], p[1], p[2]))
+
+# --- Import ---
+
+def read_student_csv(path):
+    """Reads a student import CSV. Returns (records, errors): records are (line number, record) pairs."""
+    records, errors = [], []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            record = {field: (row.get(field) or "").strip() for field in IMPORT_FIELDS if (row.get(field) or "").strip()}
+            if not record.get("firstname") or not record.get("surname"):
+                errors.append(f"Line {line}: a first name and surname are needed.")
+                continue
+            try:
+                if "year_level" in record:
+                    record["year_level"] = int(record["year_level"])
+                if "student_id" in record:
+                    record["student_id"] = int(record["student_id"])
+            except ValueError:
+                errors.append(f"Line {line}: year_level and student_id must be whole numbers.")
+                continue
+            records.append((line, record))
+    return records, errors
+
+def match_new_students(records, threshold=None):
+    """Checks new records against the existing students and each other, block by block.
+
+    Returns (clean, flagged): 'clean' are (line, record) pairs that look new, 'flagged' are
+    (line, record, [(score, existing student ID or 'line N')]) for likely duplicates.
+    """
+    threshold = threshold or DUPLICATE_THRESHOLD
+    blocks = build_blocks(students)
+    # Records accepted so far in this import, so a file listing a student twice is caught too.
+    accepted = {}
+    clean, flagged = [], []
+    for line, record in records:
+        if record.get("student_id") in students:
+            flagged.append((line, record, [(1.0, record["student_id"])]))
+            continue
+        matches = {}
+        for key in blocking_keys(record):
+            if key not in blocks:
+                continue
+            for other in set(_block_candidates(blocks[key], record)):
+                other_data = students[other] if other in students else accepted[other]
+                score = _score(_prepare(record), _prepare(other_data), threshold)
+                if score >= threshold:
+                    matches[other] = max(score, matches.get(other, 0))
+        if matches:
+            flagged.append((line, record, sorted(((s, o) for o, s in matches.items()), key=lambda m: -m[0])))
+            continue
+        clean.append((line, record))
+        label = f"line {line}"
+        accepted[label] = record
+        orders = name_orders(record)
+        for key in blocking_keys(record):
+            block = blocks.setdefault(key, [[], []])
+            # Sorted by name only: the labels can't be compared with the existing students' IDs.
+            insort(block[0], (orders[0], label), key=lambda item: item[0])
+            insort(block[1], (orders[1], label), key=lambda item: item[0])
+    return clean, flagged
+
+def add_students(records):
+    """Adds new student records with a single save. Returns their IDs (an empty list if saving failed)."""
+    next_id = max(students, default=100000) + 1
+    added = []
+    for record in records:
+        record = dict(record)
+        s_id = record.pop("student_id", None)
+        if s_id is None or s_id in students:
+            s_id = next_id
+        next_id = max(next_id, s_id + 1)
+        record.setdefault("activities_enrolled", [])
+        students[s_id] = record
+        touch_record("student", s_id)
+        added.append(s_id)
+    if not added:
+        return []
+    if not save_data(activities, students, USERS, teachers):
+        # Take the new records out again so memory matches the file.
+        for s_id in added:
+            del students[s_id]
+        return []
+    rebuild_enrolment_index()
+    return added
+
+def import_students(path, add_duplicates=False):
+    """Imports students from a CSV, leaving out likely duplicates unless add_duplicates is True.
+
+    Returns {'added': [ids], 'flagged': [...], 'errors': [...]} (see match_new_students for 'flagged').
+    """
+    records, errors = read_student_csv(path)
+    clean, flagged = match_new_students(records)
+    to_add = [record for _, record in clean]
+    if add_duplicates:
+        to_add += [record for _, record, _ in flagged]
+    return {"added": add_students(to_add), "flagged": flagged, "errors": errors}
+
+def describe_student(s_id_or_record):
+    """Returns 'Name (year, house, dob)' for a student ID or record."""
+    s_data = students.get(s_id_or_record, {}) if not isinstance(s_id_or_record, dict) else s_id_or_record
+    name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}".strip()
+    return f"{name} (year {s_data.get('year_level', '?')}, {s_data.get('house', '?')}, {s_data.get('dob', '?')})"
+
+# --- Merging ---
+
+def merge_students(keep_id, drop_id):
+    """Merges student 'drop_id' into 'keep_id' with a single save. Returns True if it was saved.
+
+    - Enrolments are combined (each activity once).
+    - Fields the kept record is missing are filled in from the other one.
+    - Logins of the dropped student now belong to the kept one, unless it already has its own
+      (then they are removed, so each student has one account).
+    - Attendance and fee ledger history move to the kept student after the save.
+    """
+    if keep_id == drop_id or keep_id not in students or drop_id not in students:
+        raise ValueError("Two different existing students are needed to merge.")
+    keep, drop = students[keep_id], students[drop_id]
+    # Copies to put back if the save fails.
+    saved_keep = copy.deepcopy(keep)
+    saved_users = {name: copy.deepcopy(info) for name, info in USERS.items() if info.get("student_id") in (keep_id, drop_id)}
+
+    enrolled = list(keep.get("activities_enrolled", []))
+    enrolled += [a for a in drop.get("activities_enrolled", []) if a not in enrolled]
+    for field, value in drop.items():
+        if keep.get(field) in (None, "", []):
+            keep[field] = value
+    keep["activities_enrolled"] = enrolled
+
+    keep_has_login = any(info.get("student_id") == keep_id for info in saved_users.values())
+    for name, info in saved_users.items():
+        if info.get("student_id") == drop_id:
+            if keep_has_login:
+                del USERS[name]
+            else:
+                USERS[name]["student_id"] = keep_id
+    del students[drop_id]
+
+    if not save_data(activities, students, USERS, teachers):
+        students[keep_id] = saved_keep
+        students[drop_id] = drop
+        for name, info in saved_users.items():
+            USERS[name] = info
+        return False
+    rebuild_enrolment_index()
+    touch_record("student", keep_id)
+    touch_record("student", drop_id)
+    merge_student_attendance(drop_id, keep_id)
+    transfer_student(drop_id, keep_id)
+    return True
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python duplicates.py audit | import FILE [--add-duplicates] | merge KEEP DROP"""
+    parser = argparse.ArgumentParser(description="Find, import around and merge duplicate student records.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    audit = commands.add_parser("audit", help="List likely duplicate students.")
+    audit.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="Lowest score (0-1) to report.")
+    importer = commands.add_parser("import", help="Import students from a CSV, leaving out likely duplicates.")
+    importer.add_argument("file")
+    importer.add_argument("--add-duplicates", action="store_true", help="Add flagged rows too.")
+    merge = commands.add_parser("merge", help="Merge one student into another.")
+    merge.add_argument("keep", type=int)
+    merge.add_argument("drop", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "audit":
+        pairs = find_duplicates(args.threshold)
+        for score, a, b in pairs:
+            print(f"{score:.2f}  {a} {describe_student(a)}  <->  {b} {describe_student(b)}")
+        print(f"{len(pairs)} likely duplicate pair(s).")
+    elif args.command == "import":
+        result = import_students(args.file, args.add_duplicates)
+        print(f"Added {len(result['added'])} student(s).")
+        for line, record, matches in result["flagged"]:
+            print(f"Line {line}: {describe_student(record)} looks like " + ", ".join(f"{m} ({s:.2f})" for s, m in matches))
+        for error in result["errors"]:
+            print(error)
+    else:
+        print("Merged." if merge_students(args.keep, args.drop) else "Saving failed; nothing was changed.")
+
+if __name__ == "__main__":
+    main()
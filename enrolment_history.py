@@ -0,0 +1,191 @@
+# Import struct to pack each event into a fixed-width binary record.
+import struct
+# Import json for the file of pre-added bucket counts.
+import json
+# Import os and time for file sizes and event time stamps.
+import os
+import time
+# Import argparse to read options when this file is run from the command line.
+import argparse
+
+# Import the enrolment listener list and the enrolment index from common.py.
+from common import enrolment_listeners, get_enrolled_students
+# Import the archive's name lookup so the command line can name archived activities too.
+from archive import activity_name
+
+# --- Enrolment History ---
+# Every join and leave made through common.py is appended to EVENTS_FILE as one 13-byte record:
+#   time (seconds since 1970, unsigned 4 bytes), student_id (4 bytes), activity_id (4 bytes),
+#   change (1 byte: +1 joined, -1 left)
+# The file is only ever appended to, so several copies of the program can share it, and it can be
+# read in big blocks without any parsing beyond struct.
+EVENTS_FILE = "enrolment_events.bin"
+RECORD = struct.Struct("<IIIb")
+# How many records are read from the file at a time.
+READ_RECORDS = 65536
+
+# --- Pre-Added Buckets ---
+# Trends are drawn from per-activity counts for each hour and each day (local time), never from the raw
+# events. The counts are saved next to EVENTS_FILE (see buckets_file()) with how far into it they go, so
+# only events added since then (by this program or another copy) are read before each query.
+#   _buckets["hour"][activity_id]["2025-02-03 09"] = [joins, leaves]
+#   _buckets["day"][activity_id]["2025-02-03"] = [joins, leaves]
+RESOLUTIONS = {"hour": "%Y-%m-%d %H", "day": "%Y-%m-%d"}
+_buckets = {"hour": {}, "day": {}}
+# Byte offset in EVENTS_FILE that _buckets covers. None until the buckets file has been read.
+_offset = None
+
+def buckets_file():
+    """Returns the file holding the bucket counts for the current events file."""
+    return os.path.splitext(EVENTS_FILE)[0] + "_buckets.json"
+
+def use_events_file(path):
+    """Switches to a different events file (each campus has its own). It is read on next use."""
+    global EVENTS_FILE, _offset
+    EVENTS_FILE = path
+    for counts in _buckets.values():
+        counts.clear()
+    _offset = None
+
+def record_event(student_id, activity_id, joined, when=None):
+    """Appends one join (joined=True) or leave to the events file."""
+    with open(EVENTS_FILE, "ab") as f:
+        f.write(RECORD.pack(int(when if when is not None else time.time()), student_id, activity_id, 1 if joined else -1))
+
+def _on_enrolment_change(student_id, activity_id, joined):
+    """Enrolment listener: records every join and leave."""
+    try:
+        record_event(student_id, activity_id, joined)
+    except (OSError, struct.error) as e:
+        # History is only for charts, so a failure must never stop the enrolment itself.
+        print(f"Could not record enrolment event: {e}")
+
+# Record every join and leave made through common.py.
+enrolment_listeners.append(_on_enrolment_change)
+
+def iter_events(start=0):
+    """Yields (time, student_id, activity_id, change) for every complete record from byte 'start' on."""
+    try:
+        f = open(EVENTS_FILE, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(start)
+        while True:
+            block = f.read(RECORD.size * READ_RECORDS)
+            # A record still being written by another program is left for next time.
+            block = block[:len(block) - len(block) % RECORD.size]
+            if not block:
+                return
+            yield from RECORD.iter_unpack(block)
+
+# --- Keeping the Buckets Up to Date ---
+
+def _load_buckets():
+    """Reads the saved bucket counts (only the first time they are needed)."""
+    global _offset
+    if _offset is not None:
+        return
+    try:
+        with open(buckets_file(), "r") as f:
+            saved = json.load(f)
+        for resolution in RESOLUTIONS:
+            # JSON keys are strings; activity IDs are integers everywhere else.
+            _buckets[resolution].update({int(a): rows for a, rows in saved[resolution].items()})
+        _offset = saved["offset"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+        for counts in _buckets.values():
+            counts.clear()
+        _offset = 0
+    # An events file that is shorter than the saved offset was replaced, so count it again from the start.
+    if _offset > _events_size():
+        for counts in _buckets.values():
+            counts.clear()
+        _offset = 0
+
+def _events_size():
+    """Returns the size of the events file in bytes (0 if it doesn't exist yet)."""
+    try:
+        return os.path.getsize(EVENTS_FILE)
+    except OSError:
+        return 0
+
+def update_buckets():
+    """Adds any events recorded since the last update to the bucket counts. Returns how many were added."""
+    global _offset
+    _load_buckets()
+    added = 0
+    # Turning a time stamp into a label is the slow part, so it is done once per quarter hour
+    # (every time zone's offset is a whole number of quarter hours, so a quarter never spans two local hours).
+    labels = {}
+    for when, _, act_id, change in iter_events(_offset):
+        quarter = when - when % 900
+        if quarter not in labels:
+            local = time.localtime(quarter)
+            labels[quarter] = (time.strftime(RESOLUTIONS["hour"], local), time.strftime(RESOLUTIONS["day"], local))
+        for resolution, label in zip(RESOLUTIONS, labels[quarter]):
+            row = _buckets[resolution].setdefault(act_id, {}).setdefault(label, [0, 0])
+            row[0 if change > 0 else 1] += 1
+        added += 1
+    if added:
+        _offset += added * RECORD.size
+        _save_buckets()
+    return added
+
+def _save_buckets():
+    """Writes the bucket counts and the offset they cover (through a temporary file)."""
+    path = buckets_file()
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump({"offset": _offset, **_buckets}, f)
+    os.replace(temp_file, path)
+
+# --- Time Series ---
+
+def series(activity_id, resolution="day"):
+    """Returns an activity's enrolment trend as a list of (label, joins, leaves, enrolled), oldest first.
+
+    'resolution' is "hour" or "day". Only buckets with joins or leaves are listed. 'enrolled' is the
+    number enrolled at the end of that bucket, worked back from today's count, so students who joined
+    before history was recorded are included.
+    """
+    update_buckets()
+    rows = sorted(_buckets[resolution].get(activity_id, {}).items())
+    net = sum(joins - leaves for _, (joins, leaves) in rows)
+    enrolled = len(get_enrolled_students(activity_id)) - net
+    result = []
+    for label, (joins, leaves) in rows:
+        enrolled += joins - leaves
+        result.append((label, joins, leaves, enrolled))
+    return result
+
+def peak(activity_id, resolution="hour"):
+    """Returns the (label, joins) bucket with the most joins for an activity, or None if it has no history."""
+    rows = series(activity_id, resolution)
+    if not rows:
+        return None
+    label, joins, _, _ = max(rows, key=lambda row: row[1])
+    return label, joins
+
+def activities_with_history():
+    """Returns the IDs of activities that have any recorded joins or leaves."""
+    update_buckets()
+    return sorted(_buckets["day"])
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python enrolment_history.py ACTIVITY_ID [--hourly]"""
+    parser = argparse.ArgumentParser(description="Show how enrolment in an activity changed over time.")
+    parser.add_argument("activity_id", type=int, nargs="?", help="Activity to show (default: list activities with history).")
+    parser.add_argument("--hourly", action="store_true", help="Show hourly buckets instead of daily ones.")
+    args = parser.parse_args(argv)
+    if args.activity_id is None:
+        for act_id in activities_with_history():
+            print(f"{act_id}  {activity_name(act_id)}")
+        return
+    for label, joins, leaves, enrolled in series(args.activity_id, "hour" if args.hourly else "day"):
+        print(f"{label:<14} +{joins:<5} -{leaves:<5} {enrolled:>6} enrolled")
+
+if __name__ == "__main__":
+    main()
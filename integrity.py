@@ -0,0 +1,213 @@
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import Counter to summarise the problems found by kind.
+from collections import Counter
+
+# Import common as a module so the current DATA_FILE is read each time (it changes when switching campus).
+import common
+from common import activities, students, USERS, teachers, save_data, rebuild_enrolment_index, touch_record
+# Import the parsers used to check dates, days and times.
+from schedule import parse_date, parse_days, parse_time_range
+# Import the calendar cache, which holds parsed schedules of repaired activities.
+from activity_calendar import invalidate_calendar
+
+# --- Data Integrity Audit ---
+# Nothing stops data.json from pointing at records that no longer exist (a student enrolled in a
+# deleted activity, an activity whose teacher was removed, a login for a student who left) or from
+# holding fields in the wrong shape. check_integrity() looks at every record once, using the ID
+# dictionaries for lookups, so it takes time in proportion to the size of the data.
+# Each problem is a dictionary:
+#   {"kind": "student", "id": 101908, "field": "activities_enrolled", "problem": "...", "fix": "drop_missing" or None}
+# Problems with a 'fix' can be repaired automatically by repair_issues(); the others are only reported.
+ROLES = ("administrator", "staff", "student", "teacher")
+
+def _issue(issues, kind, record_id, field, problem, fix=None):
+    """Adds one problem to the list."""
+    issues.append({"kind": kind, "id": record_id, "field": field, "problem": problem, "fix": fix})
+
+def _check_id_list(issues, s_id, s_data, field):
+    """Checks a student's list of activity IDs ('activities_enrolled' or 'preferences')."""
+    ids = s_data.get(field, [])
+    if not isinstance(ids, list):
+        _issue(issues, "student", s_id, field, f"is not a list ({ids!r})", "reset_list")
+        return
+    seen = set()
+    for act_id in ids:
+        if act_id in seen:
+            _issue(issues, "student", s_id, field, f"lists activity {act_id} more than once", "drop_duplicates")
+        elif act_id not in activities:
+            _issue(issues, "student", s_id, field, f"points at missing activity {act_id!r}", "drop_missing")
+        seen.add(act_id)
+
+def check_integrity():
+    """Checks every record in the loaded data. Returns the list of problems found (empty if none)."""
+    issues = []
+
+    for s_id, s_data in students.items():
+        _check_id_list(issues, s_id, s_data, "activities_enrolled")
+        if "preferences" in s_data:
+            _check_id_list(issues, s_id, s_data, "preferences")
+        for field in ("firstname", "surname"):
+            if not isinstance(s_data.get(field), str) or not s_data.get(field).strip():
+                _issue(issues, "student", s_id, field, "is missing")
+        year = s_data.get("year_level")
+        if isinstance(year, str) and year.strip().isdigit():
+            _issue(issues, "student", s_id, "year_level", f"is text ({year!r}) instead of a number", "year_to_number")
+        elif year is not None and not isinstance(year, int):
+            _issue(issues, "student", s_id, "year_level", f"is not a year level ({year!r})")
+
+    for act_id, data in activities.items():
+        if not isinstance(data.get("activity"), str) or not data.get("activity").strip():
+            _issue(issues, "activity", act_id, "activity", "has no name")
+        teacher_id = data.get("teacher_id")
+        if teacher_id is not None and teacher_id not in teachers:
+            _issue(issues, "activity", act_id, "teacher_id", f"points at missing teacher {teacher_id!r}", "clear_teacher")
+        cost = data.get("cost", 0)
+        if isinstance(cost, bool) or not isinstance(cost, (int, float)) or cost < 0:
+            _issue(issues, "activity", act_id, "cost", f"is not a cost ({cost!r})", "zero_cost")
+        capacity = data.get("capacity")
+        if capacity is not None and (isinstance(capacity, bool) or not isinstance(capacity, int) or capacity < 0):
+            _issue(issues, "activity", act_id, "capacity", f"is not a number of seats ({capacity!r})", "drop_capacity")
+        # Dates, days and times are only checked when they are filled in ("N/A" means not set).
+        dates = {}
+        for field in ("start_date", "end_date"):
+            text = data.get(field)
+            if text not in (None, "", "N/A"):
+                dates[field] = parse_date(text)
+                if dates[field] is None:
+                    _issue(issues, "activity", act_id, field, f"is not a DD/MM/YYYY date ({text!r})")
+        if dates.get("start_date") and dates.get("end_date") and dates["end_date"] < dates["start_date"]:
+            _issue(issues, "activity", act_id, "end_date", "is before the start date")
+        if data.get("days") not in (None, "", "N/A") and not parse_days(data["days"]):
+            _issue(issues, "activity", act_id, "days", f"names no weekdays ({data['days']!r})")
+        if data.get("time") not in (None, "", "N/A") and parse_time_range(data["time"]) is None:
+            _issue(issues, "activity", act_id, "time", f"is not a time range like '3:30 PM - 4:30 PM' ({data['time']!r})")
+
+    for username, info in USERS.items():
+        if not isinstance(info, dict):
+            _issue(issues, "user", username, "", "is not a user record", "drop_user")
+            continue
+        role = info.get("role")
+        if role not in ROLES:
+            _issue(issues, "user", username, "role", f"is not a known role ({role!r})")
+        if "password" not in info and "password_hash" not in info:
+            _issue(issues, "user", username, "password", "has no password")
+        student_id = info.get("student_id")
+        if role == "student" or student_id is not None:
+            if isinstance(student_id, str) and student_id.strip().isdigit() and int(student_id) in students:
+                _issue(issues, "user", username, "student_id", f"is text ({student_id!r}) instead of a number", "student_id_to_number")
+            elif student_id not in students:
+                _issue(issues, "user", username, "student_id", f"points at missing student {student_id!r}", "drop_user")
+        teacher_id = info.get("teacher_id")
+        if (role == "teacher" or teacher_id is not None) and teacher_id not in teachers:
+            _issue(issues, "user", username, "teacher_id", f"points at missing teacher {teacher_id!r}", "drop_user")
+
+    for t_id, t_data in teachers.items():
+        if not isinstance(t_data.get("surname"), str) or not t_data.get("surname").strip():
+            _issue(issues, "teacher", t_id, "surname", "is missing")
+    return issues
+
+def describe_issue(issue):
+    """Returns one line describing a problem, for reports and lists."""
+    field = f" '{issue['field']}'" if issue["field"] else ""
+    repairable = "" if issue["fix"] else "  (fix by hand)"
+    return f"{issue['kind']} {issue['id']}{field} {issue['problem']}{repairable}"
+
+def summarise_issues(issues):
+    """Returns a one-line count of the problems, e.g. '3 problem(s): 2 student, 1 activity; 2 can be repaired'."""
+    if not issues:
+        return "No problems found."
+    kinds = Counter(issue["kind"] for issue in issues)
+    fixable = sum(1 for issue in issues if issue["fix"])
+    return (f"{len(issues)} problem(s): " + ", ".join(f"{n} {kind}" for kind, n in kinds.most_common())
+            + f"; {fixable} can be repaired automatically.")
+
+# --- Repair ---
+
+def repair_issues(issues):
+    """Repairs every problem that has a 'fix', then saves once. Returns how many records were changed, or None if saving failed.
+
+    Dangling enrolments are dropped without calling the enrolment listeners: the activity no longer
+    exists, so there is nothing to charge or credit.
+    """
+    fixes = {}
+    for issue in issues:
+        if issue["fix"]:
+            fixes.setdefault((issue["kind"], issue["id"]), set()).add((issue["field"], issue["fix"]))
+    if not fixes:
+        return 0
+
+    for (kind, record_id), record_fixes in fixes.items():
+        if kind == "student":
+            s_data = students[record_id]
+            for field, fix in record_fixes:
+                if fix == "reset_list":
+                    s_data[field] = []
+                elif fix in ("drop_missing", "drop_duplicates"):
+                    # Keep the first copy of each existing activity, in the original order.
+                    seen = set()
+                    s_data[field] = [a for a in s_data[field] if a in activities and not (a in seen or seen.add(a))]
+                elif fix == "year_to_number":
+                    s_data["year_level"] = int(s_data["year_level"])
+        elif kind == "activity":
+            data = activities[record_id]
+            for field, fix in record_fixes:
+                if fix == "clear_teacher":
+                    data["teacher_id"] = None
+                elif fix == "zero_cost":
+                    data["cost"] = 0
+                elif fix == "drop_capacity":
+                    data.pop("capacity", None)
+            invalidate_calendar(record_id)
+        elif kind == "user":
+            for field, fix in record_fixes:
+                if fix == "drop_user":
+                    USERS.pop(record_id, None)
+                elif fix == "student_id_to_number" and record_id in USERS:
+                    USERS[record_id]["student_id"] = int(USERS[record_id]["student_id"])
+
+    # Enrolments changed for many students at once, so the indexes are rebuilt once rather than per change.
+    rebuild_enrolment_index()
+    for kind, record_id in fixes:
+        if kind in ("student", "activity"):
+            touch_record(kind, record_id)
+    # --- Single Save ---
+    # If it fails (save_data shows the error), the repairs stay in memory and are saved with the next change.
+    if not save_data(activities, students, USERS, teachers):
+        return None
+    return len(fixes)
+
+def run_on_load(mode):
+    """Checks (mode "check") or checks and repairs (mode "repair") the data just loaded, printing the result."""
+    issues = check_integrity()
+    if not issues:
+        return issues
+    # Logged to the console like other warnings found while loading.
+    print(f"Data check of '{common.DATA_FILE}': {summarise_issues(issues)}")
+    for issue in issues[:20]:
+        print("  " + describe_issue(issue))
+    if len(issues) > 20:
+        print(f"  ...and {len(issues) - 20} more (run 'python integrity.py' for the full list)")
+    if mode == "repair":
+        changed = repair_issues(issues)
+        if changed is not None:
+            print(f"Repaired {changed} record(s).")
+    return issues
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python integrity.py [--repair]"""
+    parser = argparse.ArgumentParser(description="Check the data file for dangling references and malformed fields.")
+    parser.add_argument("--repair", action="store_true", help="Repair what can be repaired and save once.")
+    args = parser.parse_args(argv)
+    issues = check_integrity()
+    for issue in issues:
+        print(describe_issue(issue))
+    print(summarise_issues(issues))
+    if args.repair and issues:
+        changed = repair_issues(issues)
+        print("Saving the repairs failed." if changed is None else f"Repaired {changed} record(s) in {common.DATA_FILE}.")
+
+if __name__ == "__main__":
+    main()
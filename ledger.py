@@ -0,0 +1,280 @@
+# Import json to read and write ledger entries (one JSON object per line).
+import json
+# Import os and argparse for the statement batch job.
+import os
+import argparse
+# Import datetime to timestamp entries.
+from datetime import datetime
+# Import the process pool so statements can be rendered on several CPU cores at once.
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Import shared data and the enrolment listener list from common.py.
+from common import activities, students, enrolment_listeners
+# Import the session helpers used to prorate fees.
+from schedule import session_dates, today, format_date
+# Import the archive's name lookup, for charges from activities that have since been archived.
+from archive import activity_name
+
+# --- The Fee Ledger ---
+# Every charge, credit and payment is one line in LEDGER_FILE, appended as it happens (the file is never rewritten):
+#   {"time": "2025-02-03T09:15:00", "student_id": 101908, "activity_id": 2001, "kind": "charge",
+#    "cents": 4000, "balance": 4000, "note": "..."}
+# 'cents' is positive for money owed (charges) and negative for money paid or credited.
+# 'balance' is the student's running balance after the entry, so balances are never re-added from history:
+# loading just keeps the last balance seen for each student.
+LEDGER_FILE = "ledger.jsonl"
+# Default folder for the statement batch job.
+STATEMENTS_DIR = "statements"
+
+# Student ID -> current balance in cents (positive means the family owes money).
+_balances = {}
+# (student ID, activity ID) -> cents charged for that enrolment and not yet credited back.
+_open_charges = {}
+# Tracks whether the ledger file has been read yet (it is loaded on first use).
+_loaded = False
+
+def use_ledger_file(path):
+    """Switches to a different ledger file (each campus has its own). It is read on next use."""
+    global LEDGER_FILE, _loaded
+    LEDGER_FILE = path
+    _balances.clear()
+    _open_charges.clear()
+    _loaded = False
+
+def load_ledger():
+    """Reads the running balances and open charges from the ledger file (only the first time it is needed)."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    for entry in iter_entries():
+        _balances[entry["student_id"]] = entry["balance"]
+        key = (entry["student_id"], entry.get("activity_id"))
+        if entry["kind"] in ("charge", "credit"):
+            _open_charges[key] = _open_charges.get(key, 0) + entry["cents"]
+
+def iter_entries():
+    """Yields every ledger entry in the order it was recorded, reading the file a line at a time."""
+    try:
+        with open(LEDGER_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+def _record(student_id, activity_id, kind, cents, note=""):
+    """Appends one entry, updating the student's running balance. Returns the entry."""
+    load_ledger()
+    balance = _balances.get(student_id, 0) + cents
+    entry = {"time": datetime.now().isoformat(timespec="seconds"), "student_id": student_id, "activity_id": activity_id,
+             "kind": kind, "cents": cents, "balance": balance, "note": note}
+    with open(LEDGER_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    _balances[student_id] = balance
+    if kind in ("charge", "credit"):
+        key = (student_id, activity_id)
+        _open_charges[key] = _open_charges.get(key, 0) + cents
+    return entry
+
+# --- Prorating ---
+
+def remaining_fraction(activity_id, on=None):
+    """Returns the share of an activity's sessions still to come on a date (1.0 before it starts, 0.0 after it ends).
+
+    Activities without usable dates or days are charged in full.
+    """
+    on = on or today()
+    sessions = list(session_dates(activities.get(activity_id, {})))
+    if not sessions:
+        return 1.0
+    remaining = sum(1 for day in sessions if day >= on)
+    return remaining / len(sessions)
+
+def prorated_cents(activity_id, on=None):
+    """Returns the fee in cents for joining an activity on a date (its cost times the share of sessions left)."""
+    cost = activities.get(activity_id, {}).get("cost", 0) or 0
+    return round(cost * 100 * remaining_fraction(activity_id, on))
+
+# --- Recording Charges, Credits and Payments ---
+
+def record_join(student_id, activity_id, on=None):
+    """Charges a student for joining an activity, prorated by how much of it is left."""
+    cents = prorated_cents(activity_id, on)
+    if cents:
+        name = activities.get(activity_id, {}).get("activity", activity_id)
+        _record(student_id, activity_id, "charge", cents, f"Joined {name}")
+
+def record_leave(student_id, activity_id, on=None):
+    """Credits a student for leaving an activity: the unused share, but never more than was charged for it."""
+    load_ledger()
+    outstanding = _open_charges.get((student_id, activity_id), 0)
+    cents = min(prorated_cents(activity_id, on), outstanding)
+    if cents > 0:
+        name = activities.get(activity_id, {}).get("activity", activity_id)
+        _record(student_id, activity_id, "credit", -cents, f"Left {name}")
+
+def record_payment(student_id, cents, note="Payment"):
+    """Records a payment (a positive number of cents) against a student's balance."""
+    if cents <= 0:
+        raise ValueError("A payment must be more than zero.")
+    return _record(student_id, None, "payment", -cents, note)
+
+def transfer_student(from_id, to_id):
+    """Moves a student's balance and open charges to another student ID (used when merging duplicate records).
+
+    Each open charge is credited to the old ID and charged to the new one, so later leave credits still work;
+    anything left (e.g. payments) moves as a transfer.
+    """
+    load_ledger()
+    for (s_id, act_id), cents in list(_open_charges.items()):
+        if s_id == from_id and cents > 0:
+            _record(from_id, act_id, "credit", -cents, f"Moved to student {to_id}")
+            _record(to_id, act_id, "charge", cents, f"Moved from student {from_id}")
+    rest = _balances.get(from_id, 0)
+    if rest:
+        _record(from_id, None, "transfer", -rest, f"Moved to student {to_id}")
+        _record(to_id, None, "transfer", rest, f"Moved from student {from_id}")
+
+def _on_enrolment_change(student_id, activity_id, joined):
+    """Enrolment listener: charges on join and credits on leave."""
+    if joined:
+        record_join(student_id, activity_id)
+    else:
+        record_leave(student_id, activity_id)
+
+# Charge and credit automatically for every join and leave made through common.py.
+enrolment_listeners.append(_on_enrolment_change)
+
+# --- Balances ---
+
+def balance(student_id):
+    """Returns a student's current balance in cents."""
+    load_ledger()
+    return _balances.get(student_id, 0)
+
+def family_balance(family_id):
+    """Returns the combined balance of every student with the given 'family_id' (an optional student field)."""
+    load_ledger()
+    return sum(_balances.get(s_id, 0) for s_id, s_data in students.items() if s_data.get("family_id") == family_id)
+
+def format_cents(cents):
+    """Formats cents as dollars, e.g. 4050 -> '$40.50' and -500 -> '-$5.00'."""
+    return f"{'-' if cents < 0 else ''}${abs(cents) / 100:.2f}"
+
+# --- Statements ---
+
+def _entry_offsets():
+    """Reads the ledger once and returns {student_id: [byte offset of each of their entries]}, oldest first.
+
+    Only the offsets are kept, so statements can be built one student at a time without holding every entry.
+    """
+    offsets = {}
+    try:
+        with open(LEDGER_FILE, "rb") as f:
+            position = 0
+            for line in f:
+                if line.strip():
+                    offsets.setdefault(json.loads(line)["student_id"], []).append(position)
+                position += len(line)
+    except FileNotFoundError:
+        pass
+    return offsets
+
+def iter_statements(since=None):
+    """Yields a statement dictionary for every student, one at a time, in student ID order.
+
+    Students with no ledger entries get a statement with a zero balance; students who have left but
+    still have entries are included too. 'since' (a datetime) limits the listed entries; the opening
+    balance is simply the running balance stored on the student's last entry before it.
+    """
+    since_text = since.isoformat(timespec="seconds") if since else ""
+    offsets = _entry_offsets()
+    # The file is only opened if it has entries (it doesn't exist before the first charge).
+    f = open(LEDGER_FILE, "rb") if offsets else None
+    try:
+        for s_id in sorted(set(students) | set(offsets)):
+            statement = {"student_id": s_id, "opening": 0, "entries": [], "closing": 0}
+            for position in offsets.get(s_id, []):
+                f.seek(position)
+                entry = json.loads(f.readline())
+                if entry["time"] < since_text:
+                    statement["opening"] = entry["balance"]
+                else:
+                    statement["entries"].append(entry)
+                statement["closing"] = entry["balance"]
+            s_data = students.get(s_id, {})
+            statement["name"] = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}".strip() or "Unknown student"
+            statement["activity_names"] = {e["activity_id"]: activity_name(e["activity_id"], "")
+                                           for e in statement["entries"] if e.get("activity_id") is not None}
+            yield statement
+    finally:
+        if f:
+            f.close()
+
+def render_statement(statement, output_dir):
+    """Writes one student's statement as a text file. Runs in a worker process. Returns (student_id, path, closing)."""
+    lines = [f"Fee statement for {statement['name']} ({statement['student_id']})",
+             f"Issued {format_date(today())}", "",
+             f"Opening balance: {format_cents(statement['opening'])}"]
+    for entry in statement["entries"]:
+        lines.append(f"{entry['time'][:10]}  {entry['kind']:<8} {format_cents(entry['cents']):>10}  "
+                     f"balance {format_cents(entry['balance']):>10}  {entry.get('note', '')}")
+    lines += ["", f"Amount owing: {format_cents(statement['closing'])}"]
+    path = os.path.join(output_dir, f"statement_{statement['student_id']}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return statement["student_id"], path, statement["closing"]
+
+def _render_all(statements, output_dir, max_workers):
+    """Renders statements on a process pool with a bounded queue, yielding results as each one finishes."""
+    if max_workers == 1:
+        for statement in statements:
+            yield render_statement(statement, output_dir)
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        queue_limit = max_workers * 2
+        pending = set()
+        for statement in statements:
+            pending.add(executor.submit(render_statement, statement, output_dir))
+            if len(pending) >= queue_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+def generate_statements(output_dir=STATEMENTS_DIR, since=None, max_workers=None, progress=None):
+    """Writes a statement for every student plus a summary.csv. Returns (count, summary_path).
+
+    Statements are built and handed to the workers one at a time, so memory use doesn't grow with the ledger.
+    'progress' (optional) is called with the number of statements written so far as each one finishes.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, "summary.csv")
+    count = 0
+    with open(summary_path, "w", encoding="utf-8") as f:
+        f.write("student_id,balance,file\n")
+        for s_id, path, closing in _render_all(iter_statements(since), output_dir, max_workers):
+            f.write(f"{s_id},{closing / 100:.2f},{os.path.basename(path)}\n")
+            count += 1
+            if progress:
+                progress(count)
+    return count, summary_path
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python ledger.py [--since DD/MM/YYYY] [--output DIR] [--workers N]"""
+    parser = argparse.ArgumentParser(description="Write fee statements for every student.")
+    parser.add_argument("--since", help="Only list entries from this date (DD/MM/YYYY); earlier ones make up the opening balance.")
+    parser.add_argument("--output", default=STATEMENTS_DIR, help="Folder to write the statements to.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU).")
+    args = parser.parse_args(argv)
+    since = datetime.strptime(args.since, "%d/%m/%Y") if args.since else None
+    count, summary_path = generate_statements(args.output, since, args.workers)
+    print(f"Wrote {count} statement(s). Summary: {summary_path}")
+
+if __name__ == "__main__":
+    main()
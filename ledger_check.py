@@ -0,0 +1,82 @@
+# Import argparse to read options from the command line.
+import argparse
+# Import sys to set the exit code.
+import sys
+# Import os and csv to read the statements summary back.
+import os
+import csv
+# Import tempfile to run against a scratch copy of the data.
+import tempfile
+# Import timedelta to give the test activity dates around today.
+from datetime import timedelta
+
+# Import common as a module so DATA_FILE can be pointed at the scratch copy.
+import common
+from common import activities, students, enrol_student, delete_activity
+# Import the scratch-copy helpers from the load test.
+from load_test import prepare_workspace, use_workspace
+# Import the side files, so they can be put back afterwards.
+# (Importing ledger also turns on the automatic join/leave charges, exactly as in the views.)
+import attendance
+import ledger
+import enrolment_history
+from schedule import today, format_date
+
+# --- Fee Ledger Checks ---
+# Runs the fee paths the admin and student views use on a scratch copy of the data and checks the
+# balances that come out. The real data and ledger files are never touched.
+
+def check_cancellation_refund():
+    """Joins a student to a running activity, deletes the activity as the admin view does, and checks the credit.
+
+    Returns (name, passed, detail).
+    """
+    # Use the first activity with a cost, moved so it is running today with most of its sessions still to come.
+    act_id = next(a for a, data in sorted(activities.items()) if data.get("cost") and data.get("days") not in (None, "", "N/A"))
+    activities[act_id]["start_date"] = format_date(today() - timedelta(days=7))
+    activities[act_id]["end_date"] = format_date(today() + timedelta(days=70))
+    s_id = next(s for s in sorted(students) if act_id not in students[s].get("activities_enrolled", []))
+    before = ledger.balance(s_id)
+    enrol_student(s_id, act_id)
+    charged = ledger.balance(s_id) - before
+    delete_activity(act_id)
+    after = ledger.balance(s_id)
+    # Joined and cancelled on the same day, so the whole charge comes back.
+    return ("cancelled activity is refunded", charged > 0 and after == before,
+            f"charged {ledger.format_cents(charged)}, balance {ledger.format_cents(before)} -> {ledger.format_cents(after)}")
+
+def check_statements(folder):
+    """Writes every statement and checks there is one per student, with the balances the ledger holds.
+
+    Returns (name, passed, detail).
+    """
+    count, summary_path = ledger.generate_statements(os.path.join(folder, "statements"), max_workers=1)
+    with open(summary_path, "r", encoding="utf-8") as f:
+        rows = {int(row["student_id"]): row for row in csv.DictReader(f)}
+    wrong = [s_id for s_id in students if s_id not in rows or round(float(rows[s_id]["balance"]) * 100) != ledger.balance(s_id)]
+    return ("a statement for every student", not wrong and count == len(rows),
+            f"{count} statement(s) for {len(students)} student(s), {len(wrong)} missing or wrong")
+
+def run_checks(source_file=None):
+    """Runs every check on a scratch copy of the data. Returns (passed, report_lines)."""
+    source_file = source_file or common.DATA_FILE
+    original_files = (common.DATA_FILE, attendance.ATTENDANCE_FILE, ledger.LEDGER_FILE, enrolment_history.EVENTS_FILE)
+    with tempfile.TemporaryDirectory(prefix="ledger_check_") as folder:
+        use_workspace(prepare_workspace(source_file, folder))
+        try:
+            checks = [check_cancellation_refund(), check_statements(folder)]
+        finally:
+            # Put the program back on the real data file.
+            use_workspace(*original_files)
+    report = [f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}" for name, ok, detail in checks]
+    return all(ok for _, ok, _ in checks), report
+
+def main(argv=None):
+    """Command line entry point: python ledger_check.py"""
+    argparse.ArgumentParser(description="Check fee charges, credits and statements on a scratch copy of the data.").parse_args(argv)
+    passed, report = run_checks()
+    print("\n".join(report))
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
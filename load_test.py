@@ -0,0 +1,325 @@
+# Import argparse to read options from the command line.
+import argparse
+# Import csv to read a provisioned password list.
+import csv
+# Import os, shutil and tempfile to run against a scratch copy of the data.
+import os
+import shutil
+import tempfile
+# Import json to read the final data file back for the consistency checks.
+import json
+# Import random so each session picks its clubs differently (but repeatably, from a seed).
+import random
+# Import sys to set the exit code.
+import sys
+# Import threading and time for concurrent sessions and latency measurement.
+import threading
+import time
+# Import datetime to read the --on date.
+from datetime import datetime
+# Import nullcontext for running without the --serialise lock.
+from contextlib import nullcontext
+# Import the process pool for the "processes" mode.
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Import common as a module so DATA_FILE can be pointed at the scratch copy.
+import common
+from common import activities, students, USERS, teachers, save_data, enrol_student, unenrol_student, load_data
+from common import enrolment_index, co_enrolment, rebuild_enrolment_index
+# Import the same login check and club listing the student view uses.
+from credentials import check_login
+from recommendations import available_activities, recommend
+# Import the side files a join or leave writes to, so they can be pointed at the scratch copy too.
+# (Importing ledger also turns on the automatic join/leave charges, exactly as in the student view.)
+import attendance
+import ledger
+import enrolment_history
+
+# --- Load Test for the Enrolment Path ---
+# Simulates many students signing up at once. Each session:
+#   1. logs in through check_login() (the same USERS store as the login screen),
+#   2. lists the available clubs like StudentFrame.refresh_tabs() (available_activities + recommend),
+#   3. joins and leaves clubs like StudentFrame.perform_club_action() (enrol/unenrol, then save_data),
+#      listing the clubs again after each change, just as the view refreshes.
+# Sessions run either as threads sharing one copy of the data (like one program used by many people),
+# or as separate processes that each load the data file (like many computers running the program
+# against one shared data.json). The real data file is never touched: everything runs on a copy.
+# Each session uses a different student account, so afterwards every student's enrolments on disk
+# can be compared with what their session was told. Any difference is a lost update.
+
+OPERATIONS = ("login", "list", "join", "leave")
+
+def prepare_workspace(source_file, folder):
+    """Copies the data file into 'folder' and returns the copy's path."""
+    data_file = os.path.join(folder, "data.json")
+    shutil.copyfile(source_file, data_file)
+    return data_file
+
+def use_workspace(data_file, attendance_file=None, ledger_file=None, events_file=None):
+    """Points the program (data, attendance, ledger and enrolment history files) at the given files and loads the data.
+
+    The attendance, ledger and enrolment history files default to ones next to the data file.
+    """
+    folder = os.path.dirname(data_file)
+    common.DATA_FILE = data_file
+    attendance.use_attendance_file(attendance_file or os.path.join(folder, "attendance.json"))
+    ledger.use_ledger_file(ledger_file or os.path.join(folder, "ledger.jsonl"))
+    enrolment_history.use_events_file(events_file or os.path.join(folder, "enrolment_events.bin"))
+    load_data()
+
+def student_accounts(password, password_file=None):
+    """Returns [(username, password)] for every student login, using the passwords CSV if given."""
+    passwords = {}
+    if password_file:
+        # The CSV written by 'python credentials.py provision' (username, student_id, name, password).
+        with open(password_file, newline="", encoding="utf-8") as f:
+            passwords = {row["username"]: row["password"] for row in csv.DictReader(f)}
+    return [(name, passwords.get(name, password)) for name, info in sorted(USERS.items())
+            if info.get("role") == "student" and info.get("student_id") in students]
+
+# --- One Session ---
+
+# Serialises the join/leave + save step when --serialise is used (threads mode only).
+_store_lock = None
+
+def list_clubs(student_id, on):
+    """Lists the available clubs the way the student view's refresh does. Returns their IDs, best first."""
+    return [club_id for club_id, _, _ in recommend(student_id, available_activities(student_id, on))]
+
+def run_session(username, password, joins, leaves, seed, start_at, on):
+    """Runs one student session. Returns a result dictionary (latencies, errors and the expected enrolments)."""
+    rng = random.Random(seed)
+    latencies = {op: [] for op in OPERATIONS}
+    result = {"username": username, "student_id": None, "latencies": latencies, "errors": [], "changes": 0}
+    lock = _store_lock or nullcontext()
+
+    def timed(op, func, *args):
+        # Runs one step, recording how long it took and any error.
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            result["errors"].append(f"{op}: {e}")
+            return None
+        finally:
+            latencies[op].append(time.perf_counter() - started)
+
+    # Start every session at the same moment, as on sign-up day.
+    time.sleep(max(start_at - time.time(), 0))
+    info = timed("login", check_login, username, password)
+    if not info or info.get("role") != "student":
+        result["errors"].append("login: wrong password or not a student account")
+        return result
+    student_id = info["student_id"]
+    result["student_id"] = student_id
+    expected = set(students.get(student_id, {}).get("activities_enrolled", []))
+    joined = []
+
+    def join(club_id):
+        with lock:
+            if enrol_student(student_id, club_id):
+                # Like the view, the student is told they have joined before the save happens.
+                expected.add(club_id)
+                joined.append(club_id)
+                result["changes"] += 1
+                if not save_data(activities, students, USERS, teachers):
+                    raise RuntimeError("save_data() failed")
+
+    def leave(club_id):
+        with lock:
+            if unenrol_student(student_id, club_id):
+                expected.discard(club_id)
+                result["changes"] += 1
+                if not save_data(activities, students, USERS, teachers):
+                    raise RuntimeError("save_data() failed")
+
+    available = timed("list", list_clubs, student_id, on) or []
+    for _ in range(joins):
+        if not available:
+            break
+        # Students mostly pick from the top of the recommended list.
+        club_id = available[min(int(rng.expovariate(0.5)), len(available) - 1)]
+        timed("join", join, club_id)
+        available = timed("list", list_clubs, student_id, on) or []
+    for _ in range(min(leaves, len(joined))):
+        club_id = joined.pop(rng.randrange(len(joined)))
+        timed("leave", leave, club_id)
+        available = timed("list", list_clubs, student_id, on) or []
+
+    result["expected"] = sorted(expected)
+    return result
+
+def _init_process(data_file):
+    """Process pool initialiser: each process is a separate copy of the program using the shared file."""
+    use_workspace(data_file)
+
+# --- Running the Test ---
+
+def run_load_test(sessions=20, mode="threads", joins=3, leaves=1, serialise=False, on=None, seed=0,
+                  password="student123", password_file=None, source_file=None):
+    """Runs the load test on a scratch copy of the data. Returns (passed, report_lines)."""
+    global _store_lock
+    source_file = source_file or common.DATA_FILE
+    accounts = student_accounts(password, password_file)
+    if sessions > len(accounts):
+        raise ValueError(f"Only {len(accounts)} student accounts exist. Run fewer sessions, or provision more "
+                         f"accounts on a copy of the data (python credentials.py provision).")
+    rng = random.Random(seed)
+    chosen = rng.sample(accounts, sessions)
+
+    with tempfile.TemporaryDirectory(prefix="load_test_") as folder:
+        data_file = prepare_workspace(source_file, folder)
+        with open(data_file, "r") as f:
+            start_data = json.load(f)
+        original_files = (common.DATA_FILE, attendance.ATTENDANCE_FILE, ledger.LEDGER_FILE, enrolment_history.EVENTS_FILE)
+        use_workspace(data_file)
+        _store_lock = threading.Lock() if serialise and mode == "threads" else None
+        # Give every session time to be created before they all start together.
+        start_at = time.time() + 1.0
+        jobs = [(name, pw, joins, leaves, seed + i, start_at, on) for i, (name, pw) in enumerate(chosen)]
+        try:
+            if mode == "processes":
+                executor = ProcessPoolExecutor(max_workers=sessions, initializer=_init_process, initargs=(data_file,))
+            else:
+                executor = ThreadPoolExecutor(max_workers=sessions)
+            with executor:
+                futures = [executor.submit(run_session, *job) for job in jobs]
+                results = [future.result() for future in futures]
+            wall_time = time.time() - start_at
+            checks, lost = check_final_state(data_file, results, mode, start_data)
+        finally:
+            _store_lock = None
+            # Put the program back on the real data file.
+            use_workspace(*original_files)
+
+    report = format_report(results, wall_time, checks, lost, sessions, mode, serialise)
+    return all(ok for _, ok, _ in checks), report
+
+# --- Checking the Result ---
+
+def _dangling(students_data, activity_ids):
+    """Counts enrolments (in data.json layout) pointing at activities that don't exist."""
+    return sum(1 for s in students_data.values() for a in s.get("activities_enrolled", []) if a not in activity_ids)
+
+def _duplicates(students_data):
+    """Counts students (in data.json layout) listed in the same activity more than once."""
+    return sum(1 for s in students_data.values()
+               if len(s.get("activities_enrolled", [])) != len(set(s.get("activities_enrolled", []))))
+
+def check_final_state(data_file, results, mode, start_data):
+    """Compares the saved data with what the sessions did. Returns (checks, lost_update_count).
+
+    'start_data' is the data file's contents before the test. 'checks' is a list of (name, passed, detail).
+    """
+    checks = []
+    try:
+        with open(data_file, "r") as f:
+            saved = json.load(f)
+        checks.append(("data file readable", True, data_file))
+    except (OSError, json.JSONDecodeError) as e:
+        return [("data file readable", False, str(e))], None
+    saved_students = saved.get("students", {})
+    saved_activities = {int(k): v for k, v in saved.get("activities", {}).items()}
+
+    # Lost updates: a session's student doesn't have the enrolments the session was told it has.
+    lost = 0
+    affected = 0
+    changes = sum(r["changes"] for r in results)
+    for r in results:
+        if r["student_id"] is None or "expected" not in r:
+            continue
+        on_disk = set(saved_students.get(str(r["student_id"]), {}).get("activities_enrolled", []))
+        missing = len(set(r["expected"]) ^ on_disk)
+        lost += missing
+        affected += 1 if missing else 0
+    checks.append(("no lost updates", lost == 0, f"{lost} of {changes} change(s) missing, {affected} student(s) affected"))
+
+    # No new enrolments point at missing activities, and nobody is in the same activity twice.
+    # Problems already in the starting data aren't the load test's doing, so only new ones fail.
+    dangling = _dangling(saved_students, saved_activities)
+    duplicates = _duplicates(saved_students)
+    before_dangling = _dangling(start_data.get("students", {}), {int(k) for k in start_data.get("activities", {})})
+    before_duplicates = _duplicates(start_data.get("students", {}))
+    checks.append(("enrolments point at real activities", dangling <= before_dangling,
+                   f"{dangling} dangling ({before_dangling} already in the starting data)"))
+    checks.append(("no duplicate enrolments", duplicates <= before_duplicates,
+                   f"{duplicates} student(s) with duplicates ({before_duplicates} already in the starting data)"))
+
+    # Activities with a capacity (see allocation.py) aren't over-filled.
+    counts = {}
+    for s in saved_students.values():
+        for a in set(s.get("activities_enrolled", [])):
+            counts[a] = counts.get(a, 0) + 1
+    over = [a for a, data in saved_activities.items() if data.get("capacity") not in (None, "") and counts.get(a, 0) > int(data["capacity"])]
+    checks.append(("capacities respected", not over, f"{len(over)} over capacity"))
+
+    if mode == "threads":
+        # The shared in-memory copy should match the saved file and its own indexes.
+        in_memory = {str(k): v.get("activities_enrolled", []) for k, v in students.items()}
+        saved_lists = {k: v.get("activities_enrolled", []) for k, v in saved_students.items()}
+        checks.append(("memory matches saved file", in_memory == saved_lists, "students' enrolments compared"))
+        index_before = {a: set(s) for a, s in enrolment_index.items() if s}
+        pairs_before = {a: dict(row) for a, row in co_enrolment.items() if row}
+        rebuild_enrolment_index()
+        index_after = {a: set(s) for a, s in enrolment_index.items() if s}
+        pairs_after = {a: dict(row) for a, row in co_enrolment.items() if row}
+        checks.append(("enrolment index consistent", index_before == index_after, "compared with a full rebuild"))
+        checks.append(("co-enrolment counts consistent", pairs_before == pairs_after, "compared with a full rebuild"))
+    return checks, lost
+
+def percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile of an already sorted list (e.g. fraction=0.99)."""
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * len(sorted_values) + 0.5)) - 1, len(sorted_values) - 1)
+    return sorted_values[max(index, 0)]
+
+def format_report(results, wall_time, checks, lost, sessions, mode, serialise):
+    """Turns the results into lines of text."""
+    lines = [f"{sessions} concurrent session(s) as {mode}{' (store serialised)' if serialise and mode == 'threads' else ''}, "
+             f"{wall_time:.2f} s"]
+    changes = sum(len(r["latencies"]["join"]) + len(r["latencies"]["leave"]) for r in results)
+    lines.append(f"Throughput: {changes / wall_time:.1f} join/leave per second, {sessions / wall_time:.1f} sessions per second")
+    lines.append(f"{'Latency (ms)':<14}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for op in OPERATIONS:
+        values = sorted(v for r in results for v in r["latencies"][op])
+        if values:
+            lines.append(f"{op:<14}{len(values):>7}" + "".join(f"{percentile(values, p) * 1000:>9.1f}" for p in (0.5, 0.9, 0.99))
+                         + f"{values[-1] * 1000:>9.1f}")
+    errors = [f"{r['username']}: {e}" for r in results for e in r["errors"]]
+    lines.append(f"Errors: {len(errors)}")
+    lines += [f"  {e}" for e in errors[:10]]
+    if errors:
+        # save_data() reports failures with an error dialog, which can't open without a display.
+        lines.append("  (errors mentioning a display or default root are saves that failed and tried to show a dialog)")
+    lines += [f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}" for name, ok, detail in checks]
+    return lines
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python load_test.py [--sessions N] [--mode threads|processes] [--on DD/MM/YYYY]"""
+    parser = argparse.ArgumentParser(description="Load test the student join/leave path with concurrent sessions.")
+    parser.add_argument("--sessions", type=int, default=20, help="Number of concurrent student sessions.")
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads",
+                        help="threads: one shared copy of the data; processes: separate programs sharing the data file.")
+    parser.add_argument("--joins", type=int, default=3, help="Clubs each session tries to join.")
+    parser.add_argument("--leaves", type=int, default=1, help="Clubs each session then leaves again.")
+    parser.add_argument("--serialise", action="store_true", help="Threads mode: let only one session change and save at a time.")
+    parser.add_argument("--on", help="Pretend today is this date (DD/MM/YYYY) when listing clubs, e.g. sign-up day.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for which accounts and clubs are picked.")
+    parser.add_argument("--password", default="student123", help="Password shared by the student accounts.")
+    parser.add_argument("--passwords", help="CSV of passwords from 'python credentials.py provision'.")
+    args = parser.parse_args(argv)
+    on = datetime.strptime(args.on, "%d/%m/%Y").date() if args.on else None
+    try:
+        passed, report = run_load_test(args.sessions, args.mode, args.joins, args.leaves, args.serialise, on,
+                                       args.seed, args.password, args.passwords)
+    except ValueError as e:
+        print(e)
+        return 2
+    print("\n".join(report))
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,11 +6,23 @@ from sys import exit # Used to stop the application if critical data fails to lo
 # Import shared data dictionaries (USERS, students, teachers, activities) from common.py.
 # These are loaded from data.json by common.py when it's first imported.
 from common import USERS, students, teachers, activities # Import all data globals
+# Import the view cache so per-session cached text can be released on logout.
+from common import view_cache
+# Import the hashed-password login check.
+from credentials import check_login
+# Import the background backups (importing it also backs up every save), to finish any left on exit.
+from backups import flush_backups
+# Import the campus switching used when more than one school shares this program (see tenants.py).
+from tenants import list_tenants, active_tenant, activate_tenant, evict_idle, TenantError
+# Import the data file watcher, which brings in changes made to the data file while the program is open.
+from data_watcher import start_watching
+from common import reload_listeners
 
 # Import the custom Frame classes defined in other files for different user views.
 from admin_view import AdminFrame   # The view for administrators
 from staff_view import StaffFrame   # The view for staff members
 from student_view import StudentFrame # The view for students
+from teacher_view import TeacherFrame # The view for teachers (their own activities only)
 
 # --- Initial Data Load Checks ---
 # These checks run immediately after imports, ensuring essential data is available before creating the GUI.
@@ -34,18 +46,14 @@ if not teachers:
 
 # --- GUI Classes ---
 
-# Define the Login Window class, inheriting from tk.Tk (the main window class).
-class LoginWindow(tk.Tk):
-    # Constructor method, called when a LoginWindow object is created.
+# Define the single application window, inheriting from tk.Tk (the main window class).
+# Only one tk.Tk (and so one Tcl interpreter) is ever created. Logging in and out just swaps
+# which frame is shown inside it, so a kiosk can cycle through many logins without slowing down.
+class MainApplication(tk.Tk):
+    # Constructor method, called once when the application starts.
     def __init__(self):
         # Call the parent class (tk.Tk) constructor.
         super().__init__()
-        # Set the title of the login window.
-        self.title("Login - Extracurricular Program")
-        # Set the initial size of the window (width x height).
-        self.geometry("450x260") # Slightly larger for comfort
-        # Prevent the user from resizing the login window.
-        self.resizable(False, False) # Prevent resizing
 
         # --- Styling ---
         # Create a ttk Style object to manage widget appearances.
@@ -71,17 +79,72 @@ class LoginWindow(tk.Tk):
         style.configure("TEntry", fieldbackground=entry_bg, foreground=entry_fg) # Set background/foreground for entry fields
         style.configure("TButton", padding=5) # Add some internal padding to buttons
 
-        # --- Widgets ---
-        # Create a main frame within the window to hold all content, add padding.
-        main_frame = ttk.Frame(self, padding=20)
-        # Place the main frame, making it fill the entire window.
-        main_frame.pack(fill=tk.BOTH, expand=True)
+        # The frame currently shown in the window (either the login screen or a user's session).
+        self.current_frame = None
+        # Start on the login screen.
+        self.show_login()
+        # Let whichever frame is shown refresh itself when the data file is changed outside the program.
+        reload_listeners.append(self.on_data_reloaded)
+
+    # Method to replace whatever is on screen with a new frame.
+    def switch_frame(self, new_frame):
+        """Destroy the current frame and show the new one in its place."""
+        # Destroying the old frame also destroys every widget (and Tcl callback) inside it.
+        if self.current_frame is not None:
+            self.current_frame.destroy()
+        self.current_frame = new_frame
+        self.current_frame.pack(fill=tk.BOTH, expand=True)
+
+    # Method to show the login screen.
+    def show_login(self):
+        """Show the login screen."""
+        # Set the title and size used for the login screen.
+        self.title("Login - Extracurricular Program")
+        self.geometry("450x260") # Slightly larger for comfort
+        # Prevent the user from resizing the login screen.
+        self.resizable(False, False) # Prevent resizing
+        self.switch_frame(LoginFrame(self))
+
+    # Method called by the login screen once the credentials are valid.
+    def start_session(self, role, student_id=None, teacher_id=None):
+        """Show the main view for a logged-in user."""
+        # Set the window title, incorporating the user's role.
+        self.title(f"Extracurricular Program - {role.capitalize()} View")
+        # Set the size of the main application window and allow resizing again.
+        self.geometry("950x600") # Adjusted size
+        self.resizable(True, True)
+        self.switch_frame(SessionFrame(self, role, student_id, teacher_id))
 
-        # Add a title label inside the main frame.
-        ttk.Label(main_frame, text="Please Login", font=("Arial", 20, "bold")).pack(pady=15) # Add vertical padding
+    # Method called (by data_watcher.py) after changes to the data file were loaded.
+    def on_data_reloaded(self, changes):
+        """Pass reloaded changes on to the current frame, if it shows any data."""
+        if hasattr(self.current_frame, "refresh_after_reload"):
+            self.current_frame.refresh_after_reload(changes)
+
+    # Method called when the Logout button is clicked (or a session can't be started).
+    def logout(self):
+        """Log out the current user and return to the login screen."""
+        # Release cached data built for the previous user so it doesn't build up between sessions.
+        view_cache.clear()
+        # Free the data of any other campus that hasn't been used for a while.
+        evict_idle()
+        self.show_login()
+
+# Define the Login screen class, inheriting from ttk.Frame.
+class LoginFrame(ttk.Frame):
+    # Constructor method. 'app' is the MainApplication window the frame is shown in.
+    def __init__(self, app):
+        # Call the parent class (ttk.Frame) constructor, adding padding.
+        super().__init__(app, padding=20)
+        # Keep a reference to the application so a successful login can start a session.
+        self.app = app
+
+        # --- Widgets ---
+        # Add a title label inside the frame.
+        ttk.Label(self, text="Please Login", font=("Arial", 20, "bold")).pack(pady=15) # Add vertical padding
 
         # Create a frame to hold the username label and entry field.
-        user_frame = ttk.Frame(main_frame)
+        user_frame = ttk.Frame(self)
         user_frame.pack(pady=5, fill=tk.X) # Add padding, fill horizontally
         # Add the "Username:" label, fix its width, align text left.
         ttk.Label(user_frame, text="Username:", width=10, anchor=tk.W).pack(side=tk.LEFT, padx=5)
@@ -92,8 +155,18 @@ class LoginWindow(tk.Tk):
         # Set the initial keyboard focus to the username field.
         self.username_entry.focus()
 
+        # When several campuses are set up in tenants.json, ask which one to log in to.
+        self.school_combo = None
+        if len(list_tenants()) > 1:
+            school_frame = ttk.Frame(self)
+            school_frame.pack(pady=5, fill=tk.X)
+            ttk.Label(school_frame, text="School:", width=10, anchor=tk.W).pack(side=tk.LEFT, padx=5)
+            self.school_combo = ttk.Combobox(school_frame, values=list_tenants(), state="readonly", width=28)
+            self.school_combo.set(active_tenant() or list_tenants()[0])
+            self.school_combo.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+
         # Create a frame for the password label and entry field.
-        pass_frame = ttk.Frame(main_frame)
+        pass_frame = ttk.Frame(self)
         pass_frame.pack(pady=5, fill=tk.X)
         # Add the "Password:" label.
         ttk.Label(pass_frame, text="Password:", width=10, anchor=tk.W).pack(side=tk.LEFT, padx=5)
@@ -104,7 +177,7 @@ class LoginWindow(tk.Tk):
         self.password_entry.bind("<Return>", self.check_credentials)
 
         # Create the Login button.
-        login_button = ttk.Button(main_frame, text="Login", command=self.check_credentials)
+        login_button = ttk.Button(self, text="Login", command=self.check_credentials)
         # Also bind the Enter key to the button (optional, provides another way to trigger login).
         login_button.bind("<Return>", self.check_credentials)
         login_button.pack(pady=20) # Add vertical padding
@@ -117,18 +190,22 @@ class LoginWindow(tk.Tk):
         username = self.username_entry.get().strip()
         password = self.password_entry.get().strip()
 
-        # Access the globally loaded USERS dictionary (from common.py).
-        # Try to get the user information associated with the entered username.
-        user_info = USERS.get(username)
-
-        # Check if the username exists (user_info is not None) AND
-        # if the stored password matches the entered password.
-        if user_info and user_info["password"] == password:
-            # If credentials are valid:
-            self.destroy() # Close the login window.
-            # Create and launch the main application window, passing the user's role
-            # and student_id (if available, otherwise it will be None).
-            MainApplication(role=user_info["role"], student_id=user_info.get("student_id"))
+        # Switch to the chosen campus first; its data is only loaded the first time someone logs in to it.
+        if self.school_combo is not None:
+            try:
+                activate_tenant(self.school_combo.get())
+            except TenantError as e:
+                messagebox.showerror("Login Failed", str(e))
+                return
+
+        # Check the username and password against the hashed credentials in USERS (see credentials.py).
+        # This returns the user's information if they match, or None if they don't.
+        user_info = check_login(username, password)
+
+        if user_info:
+            # If credentials are valid, ask the application to swap this frame for the user's view,
+            # passing the user's role and student_id or teacher_id (if available, otherwise they will be None).
+            self.app.start_session(role=user_info["role"], student_id=user_info.get("student_id"), teacher_id=user_info.get("teacher_id"))
         else:
             # If credentials are invalid:
             # Show an error message box.
@@ -138,27 +215,19 @@ class LoginWindow(tk.Tk):
             # Optionally, move the focus back to the username field.
             self.username_entry.focus() # Keep focus on username
 
-# Define the Main Application Window class, inheriting from tk.Tk.
-class MainApplication(tk.Tk):
-    # Constructor method. Takes the user's role and optional student_id as arguments.
-    def __init__(self, role, student_id=None):
-        # Call the parent class (tk.Tk) constructor.
-        super().__init__()
-        # Store the user's role and student ID.
+# Define the logged-in session class, inheriting from ttk.Frame.
+class SessionFrame(ttk.Frame):
+    # Constructor method. Takes the application window, the user's role and optional student_id or teacher_id.
+    def __init__(self, app, role, student_id=None, teacher_id=None):
+        # Call the parent class (ttk.Frame) constructor.
+        super().__init__(app)
+        # Store the application, the user's role and student ID.
+        self.app = app
         self.role = role
         self.student_id = student_id
-
-        # Set the window title, incorporating the user's role.
-        self.title(f"Extracurricular Program - {role.capitalize()} View")
-        # Set the initial size of the main application window.
-        self.geometry("950x600") # Adjusted size
-
-        # Apply the same theme used in the login window for consistency.
-        style = ttk.Style(self)
-        try:
-            style.theme_use("clam")
-        except tk.TclError:
-            style.theme_use("default")
+        self.teacher_id = teacher_id
+        # The role view (AdminFrame, StaffFrame or StudentFrame) once it has been created.
+        self.view = None
 
         # --- Top Bar Layout ---
         # Create a frame for the top bar (title and logout button).
@@ -167,7 +236,7 @@ class MainApplication(tk.Tk):
         # Add the main application title label to the left side of the top bar.
         ttk.Label(top_frame, text="Extracurricular Program Management", font=("Arial", 18, "bold")).pack(side=tk.LEFT)
         # Add a Logout button to the right side of the top bar.
-        logout_btn = ttk.Button(top_frame, text="Logout", command=self.logout)
+        logout_btn = ttk.Button(top_frame, text="Logout", command=self.app.logout)
         logout_btn.pack(side=tk.RIGHT, padx=10) # Add horizontal padding
 
         # --- Main Content Area ---
@@ -176,73 +245,83 @@ class MainApplication(tk.Tk):
         # Place the content frame, making it fill the remaining space.
         self.content_frame.pack(fill=tk.BOTH, expand=True)
 
-        # Call the method to load the appropriate view (Admin, Staff, or Student)
-        # into the content_frame based on the user's role.
-        self.load_role_frame()
-
-        # Start the Tkinter event loop for this window. This makes the window interactive.
-        # Note: Typically, mainloop() is called only once on the initial window (LoginWindow in this case).
-        # Calling it here means the MainApplication runs its own event loop after login.
-        # This is acceptable but slightly less common than managing frames within a single mainloop.
-        # self.mainloop() # This might be redundant if LoginWindow().mainloop() is the primary loop. Let's remove it for now.
+        # Load the appropriate view (Admin, Staff, or Student) into the content_frame based on the role.
+        # If the view can't be shown, go back to the login screen once this frame has finished being built.
+        error = self.load_role_frame()
+        if error:
+            messagebox.showerror("Error", error)
+            self.after_idle(self.app.logout)
 
     # Method to load the correct user interface frame based on the role.
     def load_role_frame(self):
-        """Creates and displays the frame based on the user's role."""
-        # Clear any widgets currently in the content_frame.
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
-
+        """Creates and displays the frame based on the user's role. Returns an error message on failure."""
         # Check the user's role and instantiate the corresponding Frame class.
         if self.role == "administrator":
             # Create an instance of AdminFrame (from admin_view.py), passing the content_frame as its parent.
-            AdminFrame(self.content_frame).pack(fill=tk.BOTH, expand=True)
+            self.view = AdminFrame(self.content_frame)
         elif self.role == "staff":
              # Create an instance of StaffFrame (from staff_view.py).
-            StaffFrame(self.content_frame).pack(fill=tk.BOTH, expand=True)
+            self.view = StaffFrame(self.content_frame)
         elif self.role == "student":
              # Create an instance of StudentFrame (from student_view.py).
              # Student view requires the student_id.
-            if self.student_id:
-                # Double-check if the student_id actually exists in the loaded student data.
-                # Access the global 'students' dictionary from common.py.
-                if self.student_id in students:
-                    # Create the StudentFrame, passing the content_frame and student_id.
-                    StudentFrame(self.content_frame, self.student_id).pack(fill=tk.BOTH, expand=True)
-                else:
-                    # If the student ID from login doesn't match any student record.
-                    messagebox.showerror("Error", f"Student ID {self.student_id} not found in student data.")
-                    self.logout() # Log out and return to login screen.
-            else:
+            if not self.student_id:
                 # If the role is student but no student_id was provided during login.
-                messagebox.showerror("Error", "Student ID not found for student login.")
-                self.logout() # Log out.
+                return "Student ID not found for student login."
+            # Double-check if the student_id actually exists in the loaded student data.
+            if self.student_id not in students:
+                # If the student ID from login doesn't match any student record.
+                return f"Student ID {self.student_id} not found in student data."
+            # Create the StudentFrame, passing the content_frame and student_id.
+            self.view = StudentFrame(self.content_frame, self.student_id)
+        elif self.role == "teacher":
+            # Teacher logins are linked to a record in 'teachers' by their teacher_id.
+            if self.teacher_id not in teachers:
+                return f"Teacher ID {self.teacher_id} not found in teacher data."
+            self.view = TeacherFrame(self.content_frame, self.teacher_id)
         else:
             # If the role is unrecognized.
-            messagebox.showerror("Error", f"Unknown user role: {self.role}")
-            self.logout() # Log out.
-
-    # Method called when the Logout button is clicked.
-    def logout(self):
-        """Log out the current user and return to the login screen."""
-        # Destroy the current MainApplication window.
-        self.destroy()
-        # Create a new instance of the LoginWindow to show the login screen again.
-        # Call mainloop() on the new LoginWindow to start its event loop.
-        LoginWindow().mainloop()
+            return f"Unknown user role: {self.role}"
+        self.view.pack(fill=tk.BOTH, expand=True)
+        return None
+
+    # Method called when the data file was changed outside the program and the changes have been loaded.
+    def refresh_after_reload(self, changes):
+        """Refresh the role view, or log out if the logged-in student was removed."""
+        if self.view is None:
+            return
+        if self.role == "student" and self.student_id not in students:
+            messagebox.showwarning("Logged Out", "Your student record was removed, so you have been logged out.")
+            self.app.logout()
+            return
+        if self.role == "teacher" and self.teacher_id not in teachers:
+            messagebox.showwarning("Logged Out", "Your teacher record was removed, so you have been logged out.")
+            self.app.logout()
+            return
+        self.view.refresh_after_reload(changes)
 
 # --- Main Execution Block ---
 # This is the entry point of the application.
 
 def main():
-    """Start the application by creating and showing the login window."""
-    # Create an instance of the LoginWindow.
-    login_window = LoginWindow()
-    # Start the Tkinter event loop for the login window.
-    # The application will wait here until the login window is closed.
-    login_window.mainloop()
+    """Start the application by creating the window, which opens on the login screen."""
+    # Read the campus list (tenants.json) before any window is built, so a broken one is reported clearly.
+    try:
+        list_tenants()
+    except TenantError as e:
+        messagebox.showerror("Fatal Error", f"{e}\nApplication cannot start.")
+        exit()
+    # Create the one and only application window.
+    app = MainApplication()
+    # Watch the data file for changes made outside the program (backups restored, scripts, other copies).
+    start_watching(app)
+    # Start the Tkinter event loop. This is the only mainloop() call in the whole application;
+    # the application will wait here until the window is closed.
+    app.mainloop()
+    # Write any backup still waiting for the background thread before the program exits.
+    flush_backups()
 
 # The standard Python construct to ensure the main() function is called
 # only when the script is executed directly (not when imported as a module).
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,253 @@
+# Import asyncio to run many email sends concurrently without blocking on each one.
+import asyncio
+# Import smtplib to talk to the school's mail server.
+import smtplib
+# Import threading so the GUI can send notifications in the background.
+import threading
+# Import time for the rate limiter's clock.
+import time
+# Import EmailMessage to build properly formatted emails.
+from email.message import EmailMessage
+
+# Import shared data and the enrolment index from common.py.
+from common import activities, students, get_enrolled_students
+
+# --- Mail Server Settings ---
+# Address and port of the SMTP server used to send notifications.
+SMTP_HOST = "localhost"
+SMTP_PORT = 25
+# Address that notification emails are sent from.
+SENDER_ADDRESS = "activities@school.example"
+
+# --- Dispatcher Settings ---
+# How many messages are sent over one connection before it is handed back to the pool.
+BATCH_SIZE = 20
+# How many SMTP connections are kept open and reused at the same time.
+POOL_SIZE = 3
+# How many times a message is retried after a temporary failure (e.g., dropped connection).
+MAX_RETRIES = 3
+# Seconds to wait before the first retry; doubled after each failed attempt.
+RETRY_DELAY = 0.5
+# Maximum number of messages sent per second across all connections (0 means no limit).
+RATE_LIMIT_PER_SECOND = 10
+# Seconds to wait for the server before giving up on a connection.
+SMTP_TIMEOUT = 10
+
+# Activity fields that students are told about when they change.
+# Key: field name in the activity data, Value: label used in the email.
+NOTIFY_FIELDS = {
+    "location": "Location",
+    "days": "Days",
+    "time": "Time",
+    "start_date": "Start Date",
+    "end_date": "End Date",
+}
+
+# --- Building Messages ---
+
+def describe_changes(old_data, new_data):
+    """Returns a list of 'Label: old -> new' lines for the notifiable fields that changed."""
+    changes = []
+    for key, label in NOTIFY_FIELDS.items():
+        old_value = old_data.get(key, "")
+        new_value = new_data.get(key, "")
+        if str(old_value) != str(new_value):
+            changes.append(f"{label}: {old_value or 'N/A'} -> {new_value or 'N/A'}")
+    return changes
+
+def _student_message(student_id, subject, body):
+    """Builds one email for a student, or returns None if the student has no email address."""
+    student_data = students.get(student_id, {})
+    address = student_data.get("email")
+    if not address:
+        return None
+    msg = EmailMessage()
+    msg["From"] = SENDER_ADDRESS
+    msg["To"] = address
+    msg["Subject"] = subject
+    msg.set_content(f"Hi {student_data.get('firstname', 'Student')},\n\n{body}\n")
+    return msg
+
+def build_messages(student_ids, subject, body):
+    """Builds one email per student.
+
+    Returns a tuple (messages, skipped_ids) where skipped_ids lists students with no email address.
+    """
+    messages = []
+    skipped = []
+    for s_id in sorted(student_ids):
+        msg = _student_message(s_id, subject, body)
+        if msg is None:
+            skipped.append(s_id)
+        else:
+            messages.append(msg)
+    return messages, skipped
+
+def build_change_messages(activity_id, old_data):
+    """Builds emails telling enrolled students that an activity's place or time has changed.
+
+    'old_data' is a copy of the activity before it was edited. Returns ([], []) if nothing relevant changed.
+    """
+    new_data = activities.get(activity_id, {})
+    changes = describe_changes(old_data, new_data)
+    if not changes:
+        return [], []
+    name = new_data.get("activity", f"Activity {activity_id}")
+    body = f"The details of '{name}' have changed:\n\n" + "\n".join(changes)
+    return build_messages(get_enrolled_students(activity_id), f"Change to {name}", body)
+
+def build_cancellation_messages(activity_name, student_ids):
+    """Builds emails telling students that an activity has been cancelled.
+
+    The student IDs must be collected before the activity is deleted, since deletion clears its enrolments.
+    """
+    body = f"'{activity_name}' has been cancelled and you have been removed from it."
+    return build_messages(student_ids, f"{activity_name} cancelled", body)
+
+# --- Sending Messages ---
+
+class RateLimiter:
+    """Spaces out sends so no more than 'per_second' messages start each second."""
+    def __init__(self, per_second):
+        # Minimum gap between two sends (0 disables the limit).
+        self.interval = 1.0 / per_second if per_second else 0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        """Waits until the next send is allowed."""
+        if not self.interval:
+            return
+        # The lock makes concurrent senders take turns reserving a time slot.
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class SMTPConnectionPool:
+    """Keeps up to 'size' SMTP connections open so they can be reused between batches."""
+    def __init__(self, host, port, size=POOL_SIZE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        # The queue holds idle connections. None is a free slot that hasn't been connected yet.
+        self.idle = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(None)
+        self.opened = []
+
+    async def acquire(self):
+        """Takes a connection from the pool, opening a new one if needed."""
+        conn = await self.idle.get()
+        if conn is None:
+            try:
+                # smtplib is blocking, so connecting happens on a worker thread.
+                conn = await asyncio.to_thread(smtplib.SMTP, self.host, self.port, timeout=self.timeout)
+            except Exception:
+                # Give the slot back so the pool doesn't shrink, then let the caller retry.
+                self.idle.put_nowait(None)
+                raise
+            self.opened.append(conn)
+        return conn
+
+    def release(self, conn, broken=False):
+        """Returns a connection to the pool. Broken connections are dropped and their slot freed."""
+        if broken:
+            self._close(conn)
+            conn = None
+        self.idle.put_nowait(conn)
+
+    def _close(self, conn):
+        """Closes one connection, ignoring errors from already-dead connections."""
+        if conn in self.opened:
+            self.opened.remove(conn)
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    async def close(self):
+        """Closes every connection that is still open."""
+        for conn in list(self.opened):
+            await asyncio.to_thread(self._close, conn)
+
+async def _send_batch(pool, limiter, batch, result, max_retries, retry_delay):
+    """Sends one batch of messages over a single pooled connection, retrying temporary failures.
+
+    The connection is held for the whole batch. If it breaks, it is dropped and a new one is taken
+    from the pool for the rest of the batch.
+    """
+    conn = None
+    try:
+        for msg in batch:
+            attempt = 0
+            while True:
+                try:
+                    if conn is None:
+                        conn = await pool.acquire()
+                    await limiter.wait()
+                    await asyncio.to_thread(conn.send_message, msg)
+                    result["sent"] += 1
+                    break
+                except smtplib.SMTPRecipientsRefused as e:
+                    # The server rejected the address itself; retrying won't help, but the connection is fine.
+                    result["failed"].append((msg["To"], str(e)))
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    # Connection problems or temporary server errors: drop the connection and try again.
+                    if conn is not None:
+                        pool.release(conn, broken=True)
+                        conn = None
+                    attempt += 1
+                    if attempt > max_retries:
+                        result["failed"].append((msg["To"], str(e)))
+                        break
+                    result["retries"] += 1
+                    await asyncio.sleep(retry_delay * (2 ** (attempt - 1)))
+    finally:
+        # Hand the connection back for the next batch.
+        if conn is not None:
+            pool.release(conn)
+
+async def dispatch(messages, host=SMTP_HOST, port=SMTP_PORT, batch_size=BATCH_SIZE, pool_size=POOL_SIZE,
+                   max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, rate_limit=RATE_LIMIT_PER_SECOND):
+    """Sends all messages in batches over a pool of reused SMTP connections.
+
+    Returns a dictionary: {'sent': int, 'retries': int, 'failed': [(address, error), ...]}.
+    """
+    result = {"sent": 0, "retries": 0, "failed": []}
+    if not messages:
+        return result
+    pool = SMTPConnectionPool(host, port, pool_size)
+    limiter = RateLimiter(rate_limit)
+    # Split the messages into batches; each batch runs as its own task and shares the pool.
+    batches = [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+    try:
+        await asyncio.gather(*(_send_batch(pool, limiter, batch, result, max_retries, retry_delay) for batch in batches))
+    finally:
+        await pool.close()
+    return result
+
+def send_notifications(messages, **settings):
+    """Sends messages and waits for the result. Accepts the same settings as dispatch()."""
+    return asyncio.run(dispatch(messages, **settings))
+
+def send_in_background(messages, on_done=None, **settings):
+    """Sends messages on a background thread so the GUI stays responsive.
+
+    'on_done' (optional) is called with the result dictionary once sending finishes.
+    """
+    def worker():
+        try:
+            result = send_notifications(messages, **settings)
+        except Exception as e:
+            result = {"sent": 0, "retries": 0, "failed": [("*", str(e))]}
+        # Log the outcome to the console, like other background actions in the app.
+        print(f"Notifications: {result['sent']} sent, {len(result['failed'])} failed, {result['retries']} retries")
+        if on_done:
+            on_done(result)
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
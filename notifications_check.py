@@ -0,0 +1,164 @@
+# Import argparse to read options from the command line.
+import argparse
+# Import sys to set the exit code.
+import sys
+# Import socketserver and threading to run a small mail server in the background of this process.
+import socketserver
+import threading
+# Import EmailMessage to build the test emails.
+from email.message import EmailMessage
+
+# Import the dispatcher being checked.
+from notifications import send_notifications
+
+# --- Notification Dispatcher Checks ---
+# Sends emails through notifications.send_notifications() to a tiny SMTP "sink" running on this
+# machine, which accepts every message and records which connection it arrived on. No real mail
+# is sent. The checks are that each batch goes over one pooled connection, connections are reused
+# rather than opened per batch, and every recipient gets exactly one message, even when the
+# server drops a connection part-way through.
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """A minimal SMTP server that keeps every message it is sent instead of delivering it."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refuse_mail_number=None):
+        # Port 0 lets the operating system pick a free port.
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.lock = threading.Lock()
+        # (connection number, [recipients]) for every message accepted, in arrival order.
+        self.received = []
+        self.connections = 0
+        self.mail_commands = 0
+        # The MAIL command with this number (1 is the first) is answered with '421' and the connection
+        # is closed, like a server shutting down mid-batch. The message was not accepted, so it must be retried.
+        self.refuse_mail_number = refuse_mail_number
+
+    def start(self):
+        """Starts answering connections on a background thread. Returns the port."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP and QUIT."""
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.connections += 1
+            number = sink.connections
+        recipients = []
+        self.reply("220 sink ready")
+        for raw in self.rfile:
+            command = raw.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                with sink.lock:
+                    sink.mail_commands += 1
+                    refuse = sink.mail_commands == sink.refuse_mail_number
+                if refuse:
+                    self.reply("421 closing connection")
+                    return
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                # The message ends with a line holding a single full stop.
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                with sink.lock:
+                    sink.received.append((number, recipients))
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+def _messages(count):
+    """Builds 'count' test emails, each to a different address."""
+    messages = []
+    for i in range(count):
+        msg = EmailMessage()
+        msg["From"] = "activities@school.example"
+        msg["To"] = f"student{i}@school.example"
+        msg["Subject"] = "Notification check"
+        msg.set_content(f"Message {i}")
+        messages.append(msg)
+    return messages
+
+def _send(sink, count, batch_size, pool_size):
+    """Sends 'count' emails to the sink. Returns (messages, result)."""
+    port = sink.start()
+    messages = _messages(count)
+    # No rate limit and short retry delays, so the check runs in well under a second.
+    result = send_notifications(messages, host="127.0.0.1", port=port, batch_size=batch_size, pool_size=pool_size,
+                                retry_delay=0.01, rate_limit=0)
+    sink.shutdown()
+    sink.server_close()
+    return messages, result
+
+def _delivered(sink, messages):
+    """Returns the addresses that didn't get exactly one message (empty if everyone did)."""
+    counts = {}
+    for _, recipients in sink.received:
+        for address in recipients:
+            counts[address] = counts.get(address, 0) + 1
+    return [msg["To"] for msg in messages if counts.get(msg["To"]) != 1]
+
+def check_pooled_batches(count=45, batch_size=10, pool_size=3):
+    """Checks each batch is sent over one connection and at most pool_size connections are opened.
+
+    Returns (name, passed, detail).
+    """
+    sink = SMTPSink()
+    messages, result = _send(sink, count, batch_size, pool_size)
+    connection_of = {address: number for number, recipients in sink.received for address in recipients}
+    # Batches are consecutive slices of the message list (see notifications.dispatch()).
+    split = [batch for batch in (messages[i:i + batch_size] for i in range(0, count, batch_size))
+             if len({connection_of.get(msg["To"]) for msg in batch}) != 1]
+    missing = _delivered(sink, messages)
+    passed = not split and not missing and sink.connections <= pool_size and result["sent"] == count
+    return ("one pooled connection per batch", passed,
+            f"{result['sent']}/{count} sent over {sink.connections} connection(s) (pool of {pool_size}), "
+            f"{len(split)} batch(es) split across connections, {len(missing)} recipient(s) without exactly one message")
+
+def check_dropped_connection(count=30, batch_size=10, pool_size=2):
+    """Has the server drop a connection mid-batch and checks every recipient still gets one message.
+
+    Returns (name, passed, detail).
+    """
+    sink = SMTPSink(refuse_mail_number=5)
+    messages, result = _send(sink, count, batch_size, pool_size)
+    missing = _delivered(sink, messages)
+    passed = not missing and result["sent"] == count and not result["failed"] and result["retries"] >= 1
+    return ("every recipient after a dropped connection", passed,
+            f"{result['sent']}/{count} sent, {result['retries']} retr{'y' if result['retries'] == 1 else 'ies'}, "
+            f"{len(result['failed'])} failed, {len(missing)} recipient(s) without exactly one message")
+
+def run_checks():
+    """Runs every check. Returns (passed, report_lines)."""
+    checks = [check_pooled_batches(), check_dropped_connection()]
+    report = [f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}" for name, ok, detail in checks]
+    return all(ok for _, ok, _ in checks), report
+
+def main(argv=None):
+    """Command line entry point: python notifications_check.py"""
+    argparse.ArgumentParser(description="Check the email dispatcher against a local SMTP sink (no real mail is sent).").parse_args(argv)
+    passed, report = run_checks()
+    print("\n".join(report))
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+# Import bisect to answer range questions (like cost < 30) from sorted lists, and to keep them sorted.
+from bisect import bisect_left, bisect_right, insort
+# Import shlex to split filter text while keeping quoted values (e.g., name~"van der") together.
+import shlex
+# Import re to split a condition like 'cost<30' into its parts.
+import re
+
+# Import shared data, the enrolment index and the change hooks from common.py.
+from common import activities, students, get_enrolled_students, record_listeners, enrolment_listeners, rebuild_listeners
+# Import the day parser so activities can be filtered by weekday.
+from schedule import parse_days, DAY_NUMBERS
+
+# --- Query Language ---
+# A filter is a list of conditions separated by spaces, all of which must match, e.g.
+#   students:   year_level=10 house=Bradman enrolment_count=0
+#   activities: cost<30 day=Tue spare_seats>0
+# Supported operators: = != < <= > >= and ~ (text contains, ignoring case).
+# Special fields:
+#   students   - enrolment_count (number of activities), enrolled_in (an activity ID), name
+#   activities - day (Mon..Sun), enrolled (number of students), spare_seats (needs a 'capacity' field;
+#                activities without one never run out of seats), has_student (a student ID)
+
+OPERATORS = ("<=", ">=", "!=", "=", "<", ">", "~")
+CONDITION_PATTERN = re.compile(r"^([A-Za-z_]+)\s*(<=|>=|!=|=|<|>|~)\s*(.+)$")
+
+class QueryError(ValueError):
+    """Raised when a filter can't be understood."""
+
+class Predicate:
+    """One condition of a query, e.g. Predicate('cost', '<', 30)."""
+    def __init__(self, field, op, value):
+        if op not in OPERATORS:
+            raise QueryError(f"Unknown operator '{op}'")
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return f"{self.field}{self.op}{self.value}"
+
+def parse_filter(text):
+    """Turns filter text like 'year_level=10 house=Bradman' into a list of Predicates."""
+    predicates = []
+    try:
+        parts = shlex.split(text)
+    except ValueError as e:
+        raise QueryError(f"Could not read filter: {e}")
+    for part in parts:
+        match = CONDITION_PATTERN.match(part)
+        if not match:
+            raise QueryError(f"'{part}' is not a condition (expected something like field=value)")
+        field, op, raw = match.groups()
+        field = field.lower()
+        predicates.append(Predicate(field, op, _day_number(raw) if field == "day" else _convert(raw)))
+    return predicates
+
+def _day_number(raw):
+    """Turns a day typed in a filter ('Tue', 'tuesday' or 1) into its weekday number (Monday is 0).
+
+    Done once here, so the index and the scan both compare against the numbers from parse_days().
+    """
+    text = raw.strip().lower()
+    if text.isdigit() and int(text) in DAY_NUMBERS.values():
+        return int(text)
+    if text[:3] in DAY_NUMBERS:
+        return DAY_NUMBERS[text[:3]]
+    raise QueryError(f"'{raw}' is not a day (expected Mon, Tue, ... Sun)")
+
+def _convert(raw):
+    """Turns a value typed in a filter into a number where possible."""
+    for convert in (int, float):
+        try:
+            return convert(raw)
+        except ValueError:
+            pass
+    return raw
+
+# --- Reading Field Values (used when scanning) ---
+
+def _student_value(s_id, field):
+    """Returns the value of a (possibly computed) student field."""
+    s_data = students.get(s_id, {})
+    if field == "student_id":
+        return s_id
+    if field == "name":
+        return f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
+    if field == "enrolment_count":
+        return len(s_data.get("activities_enrolled", []))
+    if field == "enrolled_in":
+        return s_data.get("activities_enrolled", [])
+    return s_data.get(field)
+
+def _activity_value(act_id, field):
+    """Returns the value of a (possibly computed) activity field."""
+    data = activities.get(act_id, {})
+    if field == "activity_id":
+        return act_id
+    if field == "day":
+        return parse_days(data.get("days", ""))
+    if field == "enrolled":
+        return len(get_enrolled_students(act_id))
+    if field == "spare_seats":
+        capacity = data.get("capacity")
+        return float("inf") if capacity in (None, "") else int(capacity) - len(get_enrolled_students(act_id))
+    if field == "has_student":
+        return get_enrolled_students(act_id)
+    return data.get(field)
+
+def _matches(value, op, target):
+    """Checks one value against one condition. List/set values match if any member matches (for '=')."""
+    if isinstance(value, (list, set)):
+        if op == "=":
+            return target in value
+        if op == "!=":
+            return target not in value
+        return False
+    if op == "~":
+        return str(target).lower() in str(value).lower()
+    if value is None:
+        return op == "!="
+    # Compare numbers as numbers and everything else as case-insensitive text.
+    if isinstance(value, (int, float)) and isinstance(target, (int, float)):
+        a, b = value, target
+    else:
+        a, b = str(value).lower(), str(target).lower()
+        if op not in ("=", "!="):
+            return False
+    return {"=": a == b, "!=": a != b, "<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+# --- Indexes ---
+
+class _Indexes:
+    """Lookup tables used by the planner.
+
+    Built in full the first time they are needed and again after the whole data set is reloaded
+    (install_data, replace_data or anything else that calls rebuild_enrolment_index). Otherwise only the
+    records passed to touch_record(), and the activities students join or leave, are re-indexed.
+    """
+    def __init__(self):
+        self.built = False
+        # (kind, ID) of records changed since the indexes were last brought up to date.
+        self.dirty = set()
+        # Equality indexes: field -> value -> set of IDs.
+        self.student_eq = {}
+        self.activity_eq = {}
+        # Sorted indexes for ranges: field -> sorted list of (value, ID).
+        self.student_sorted = {}
+        self.activity_sorted = {}
+        # What each record was last indexed under, so it can be taken out again when it changes.
+        self.student_entries = {}
+        self.activity_entries = {}
+
+    def record_changed(self, kind, record_id):
+        """touch_record() listener: re-index this record before the next query."""
+        if kind in ("student", "activity"):
+            self.dirty.add((kind, record_id))
+
+    def enrolment_changed(self, student_id, activity_id, joined):
+        """Enrolment listener: the activity's 'enrolled' count has changed."""
+        self.dirty.add(("activity", activity_id))
+
+    def rebuilt(self):
+        """rebuild_enrolment_index() listener: everything may have changed, so build from scratch."""
+        self.built = False
+
+    def refresh(self):
+        """Brings the indexes up to date with the data, re-indexing only the records that changed."""
+        # Lots of changes (like a bulk import) are quicker to index in one go.
+        if not self.built or len(self.dirty) > (len(students) + len(activities)) // 2:
+            self._build()
+            return
+        while self.dirty:
+            kind, record_id = self.dirty.pop()
+            if kind == "student":
+                old = self.student_entries.pop(record_id, None)
+                _unindex(self.student_eq, self.student_sorted, record_id, old)
+                if record_id in students:
+                    self.student_entries[record_id] = _index(self.student_eq, self.student_sorted, record_id, _student_entry(record_id))
+                # The activities the student joined or left have a different 'enrolled' count.
+                before = old[2] if old else set()
+                after = self.student_entries[record_id][2] if record_id in self.student_entries else set()
+                self.dirty.update(("activity", act_id) for act_id in before ^ after)
+            else:
+                _unindex(self.activity_eq, self.activity_sorted, record_id, self.activity_entries.pop(record_id, None))
+                if record_id in activities:
+                    self.activity_entries[record_id] = _index(self.activity_eq, self.activity_sorted, record_id, _activity_entry(record_id))
+
+    def _build(self):
+        """Indexes every student and activity from scratch."""
+        self.student_eq = {"year_level": {}, "house": {}, "gender": {}, "enrolment_count": {}}
+        self.student_sorted = {"year_level": [], "enrolment_count": []}
+        self.activity_eq = {"day": {}, "teacher_id": {}, "location": {}}
+        self.activity_sorted = {"cost": [], "enrolled": []}
+        self.student_entries = {s_id: _index(self.student_eq, None, s_id, _student_entry(s_id)) for s_id in students}
+        self.activity_entries = {a_id: _index(self.activity_eq, None, a_id, _activity_entry(a_id)) for a_id in activities}
+        # Sort each range list once at the end rather than inserting one at a time.
+        for entries, ranged in ((self.student_entries, self.student_sorted), (self.activity_entries, self.activity_sorted)):
+            for record_id, (_, values, _) in entries.items():
+                for field, value in values.items():
+                    if value is not None:
+                        ranged[field].append((value, record_id))
+            for pairs in ranged.values():
+                pairs.sort()
+        self.dirty.clear()
+        self.built = True
+
+def _student_entry(s_id):
+    """Returns what a student is indexed under: ({field: [keys]}, {field: sortable value or None}, activity IDs)."""
+    s_data = students[s_id]
+    count = len(s_data.get("activities_enrolled", []))
+    year_level = s_data.get("year_level")
+    eq = {field: [_key(s_data.get(field))] for field in ("year_level", "house", "gender")}
+    eq["enrolment_count"] = [count]
+    ranged = {"year_level": year_level if isinstance(year_level, int) else None, "enrolment_count": count}
+    return eq, ranged, set(s_data.get("activities_enrolled", []))
+
+def _activity_entry(act_id):
+    """Returns what an activity is indexed under, in the same form as _student_entry()."""
+    data = activities[act_id]
+    cost = data.get("cost")
+    eq = {"day": list(parse_days(data.get("days", "")))}
+    for field in ("teacher_id", "location"):
+        eq[field] = [_key(data.get(field))]
+    ranged = {"cost": cost if isinstance(cost, (int, float)) else None,
+              "enrolled": len(get_enrolled_students(act_id))}
+    return eq, ranged, set()
+
+def _index(eq_index, sorted_index, record_id, entry):
+    """Adds a record to the equality (and, unless sorted_index is None, range) indexes. Returns the entry."""
+    keys, values, _ = entry
+    for field, field_keys in keys.items():
+        for key in field_keys:
+            eq_index[field].setdefault(key, set()).add(record_id)
+    if sorted_index is not None:
+        for field, value in values.items():
+            if value is not None:
+                insort(sorted_index[field], (value, record_id))
+    return entry
+
+def _unindex(eq_index, sorted_index, record_id, entry):
+    """Takes a record out of the indexes, using the entry it was added with (does nothing for None)."""
+    if entry is None:
+        return
+    keys, values, _ = entry
+    for field, field_keys in keys.items():
+        for key in field_keys:
+            ids = eq_index[field].get(key)
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del eq_index[field][key]
+    for field, value in values.items():
+        if value is not None:
+            pairs = sorted_index[field]
+            position = bisect_left(pairs, (value, record_id))
+            if position < len(pairs) and pairs[position] == (value, record_id):
+                del pairs[position]
+
+_indexes = _Indexes()
+# Keep the indexes up to date as records change.
+record_listeners.append(_indexes.record_changed)
+enrolment_listeners.append(_indexes.enrolment_changed)
+rebuild_listeners.append(_indexes.rebuilt)
+
+def _key(value):
+    """Normalises a value for equality lookups (text is compared ignoring case)."""
+    return value.lower() if isinstance(value, str) else value
+
+def _range_ids(sorted_pairs, op, target):
+    """Returns the set of IDs in a sorted (value, ID) list that satisfy a comparison."""
+    if op == "<":
+        end = bisect_left(sorted_pairs, (target, float("-inf")))
+        return {i for _, i in sorted_pairs[:end]}
+    if op == "<=":
+        end = bisect_right(sorted_pairs, (target, float("inf")))
+        return {i for _, i in sorted_pairs[:end]}
+    if op == ">":
+        start = bisect_right(sorted_pairs, (target, float("inf")))
+        return {i for _, i in sorted_pairs[start:]}
+    start = bisect_left(sorted_pairs, (target, float("-inf")))  # '>='
+    return {i for _, i in sorted_pairs[start:]}
+
+def _range_count(sorted_pairs, op, target):
+    """Counts how many entries a comparison would return, without building the set."""
+    n = len(sorted_pairs)
+    lo = bisect_left(sorted_pairs, (target, float("-inf")))
+    hi = bisect_right(sorted_pairs, (target, float("inf")))
+    return {"<": lo, "<=": hi, ">": n - hi, ">=": n - lo}[op]
+
+# --- Planner ---
+
+def _index_lookup(entity, pred, estimate_only=False):
+    """Uses an index to answer a predicate.
+
+    Returns the matching ID set (or its size if estimate_only), or None if no index can answer it.
+    """
+    eq = _indexes.student_eq if entity == "student" else _indexes.activity_eq
+    ranged = _indexes.student_sorted if entity == "student" else _indexes.activity_sorted
+    value = pred.value
+
+    # Membership questions are answered straight from the enrolment index.
+    if entity == "student" and pred.field == "enrolled_in" and pred.op == "=" and isinstance(value, int):
+        found = get_enrolled_students(value)
+        return len(found) if estimate_only else set(found)
+    if entity == "activity" and pred.field == "has_student" and pred.op == "=" and isinstance(value, int):
+        found = set(students.get(value, {}).get("activities_enrolled", []))
+        return len(found) if estimate_only else found
+
+    if pred.op == "=" and pred.field in eq:
+        found = eq[pred.field].get(_key(value), set())
+        return len(found) if estimate_only else set(found)
+    if pred.op in ("<", "<=", ">", ">=") and pred.field in ranged and isinstance(value, (int, float)):
+        pairs = ranged[pred.field]
+        return _range_count(pairs, pred.op, value) if estimate_only else _range_ids(pairs, pred.op, value)
+    return None
+
+def plan(entity, predicates):
+    """Orders predicates for evaluation: indexed ones first (fewest matches first), then scans.
+
+    Returns a list of (predicate, estimated_matches) where estimated_matches is None for scans.
+    """
+    _indexes.refresh()
+    planned = [(pred, _index_lookup(entity, pred, estimate_only=True)) for pred in predicates]
+    indexed = sorted((p for p in planned if p[1] is not None), key=lambda p: p[1])
+    scanned = [p for p in planned if p[1] is None]
+    return indexed + scanned
+
+def run_query(entity, predicates):
+    """Returns the sorted IDs of students or activities (entity 'student' or 'activity') matching every predicate."""
+    if entity not in ("student", "activity"):
+        raise QueryError(f"Unknown entity '{entity}'")
+    if isinstance(predicates, str):
+        predicates = parse_filter(predicates)
+    source = students if entity == "student" else activities
+    read_value = _student_value if entity == "student" else _activity_value
+
+    candidates = None
+    for pred, estimate in plan(entity, predicates):
+        if candidates is not None and not candidates:
+            break  # Nothing left to filter.
+        if estimate is not None:
+            # Indexed: intersect sets, smallest first, so the candidate set shrinks as fast as possible.
+            found = _index_lookup(entity, pred)
+            candidates = found if candidates is None else candidates & found
+        else:
+            # Not indexed: check each remaining candidate (or everything, if no index has run yet).
+            pool = candidates if candidates is not None else source.keys()
+            candidates = {i for i in pool if _matches(read_value(i, pred.field), pred.op, pred.value)}
+    if candidates is None:
+        candidates = set(source.keys())
+    return sorted(candidates)
+
+def explain(entity, text):
+    """Returns a short description of how a filter will be evaluated (useful when tuning)."""
+    steps = []
+    for pred, estimate in plan(entity, parse_filter(text)):
+        steps.append(f"{pred}: index (~{estimate} match)" if estimate is not None else f"{pred}: scan")
+    return steps
@@ -0,0 +1,85 @@
+# Import sqrt for normalising co-enrolment counts by activity size.
+from math import sqrt
+
+# Import shared data, the enrolment index, the co-enrolment counts and the year level rule from common.py.
+from common import activities, students, co_enrolment, get_enrolled_students, is_year_eligible
+# Import the calendar helpers for ended activities and parsed schedules (used for clash checks).
+from activity_calendar import has_ended, get_schedule
+
+# --- How Recommendations Work ---
+# Each activity can be thought of as a vector with one entry per student (1 if enrolled).
+# The similarity of two activities is the cosine of the angle between their vectors:
+#     shared students / sqrt(students in X * students in Y)
+# common.co_enrolment already holds the "shared students" count for every pair that has any, so a
+# student's scores only need the rows of the activities they're in. The cost depends on how many
+# activities there are, not on how many students there are.
+
+def clashes(activity_a, activity_b):
+    """Returns True if two activities meet on the same weekday at overlapping times during overlapping dates.
+
+    Activities missing dates, days or times are never treated as clashing (there's nothing to compare).
+    """
+    a = get_schedule(activity_a)
+    b = get_schedule(activity_b)
+    if not (a["start"] and a["end"] and b["start"] and b["end"] and a["times"] and b["times"]):
+        return False
+    if a["end"] < b["start"] or b["end"] < a["start"]:
+        return False
+    if not set(a["weekdays"]) & set(b["weekdays"]):
+        return False
+    return a["times"][0] < b["times"][1] and b["times"][0] < a["times"][1]
+
+def available_activities(student_id, on=None):
+    """Returns the IDs of activities a student could join: eligible by year level, not ended,
+    not already joined and not clashing with anything they're already in."""
+    s_data = students.get(student_id, {})
+    enrolled = set(s_data.get("activities_enrolled", []))
+    year = s_data.get("year_level")
+    available = []
+    for act_id, data in activities.items():
+        if act_id in enrolled or not is_year_eligible(year, data.get("year_level", "N/A")) or has_ended(act_id, on):
+            continue
+        if any(clashes(act_id, other) for other in enrolled if other in activities):
+            continue
+        available.append(act_id)
+    return available
+
+def recommend(student_id, candidates=None, limit=None):
+    """Ranks activities for a student. Returns a list of (activity_id, score, reason_activity_id).
+
+    'score' is the summed similarity to the student's current activities (0 when nothing links them)
+    and 'reason_activity_id' is the activity that contributed most (None for a score of 0).
+    'candidates' defaults to available_activities(student_id). Ties, including students with no
+    activities yet, are broken by popularity and then by ID.
+    """
+    if candidates is None:
+        candidates = available_activities(student_id)
+    candidates = set(candidates)
+    enrolled = students.get(student_id, {}).get("activities_enrolled", [])
+
+    scores = {}
+    reasons = {}  # activity_id -> (best contribution, activity it came from)
+    for x in set(enrolled):
+        size_x = len(get_enrolled_students(x))
+        # Only the activities that share students with x appear in its row.
+        for y, shared in co_enrolment.get(x, {}).items():
+            if y not in candidates:
+                continue
+            contribution = shared / sqrt(size_x * max(len(get_enrolled_students(y)), 1))
+            scores[y] = scores.get(y, 0.0) + contribution
+            if contribution > reasons.get(y, (0.0, None))[0]:
+                reasons[y] = (contribution, x)
+
+    ranked = sorted(candidates, key=lambda a: (-scores.get(a, 0.0), -len(get_enrolled_students(a)), a))
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [(a, scores.get(a, 0.0), reasons.get(a, (0.0, None))[1]) for a in ranked]
+
+def describe_reason(activity_id, reason_activity_id):
+    """Returns the 'students who joined X also joined Y' line for a recommendation (or '' if there is none)."""
+    if reason_activity_id is None:
+        return ""
+    shared = co_enrolment.get(reason_activity_id, {}).get(activity_id, 0)
+    reason_name = activities.get(reason_activity_id, {}).get("activity", "another club")
+    name = activities.get(activity_id, {}).get("activity", "this club")
+    return f"{shared} student(s) who joined {reason_name} also joined {name}."
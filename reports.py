@@ -0,0 +1,180 @@
+# Import the csv library to write the spreadsheet-friendly roster files.
+import csv
+# Import html so names and other text can be safely escaped before going into the HTML pages.
+import html
+# Import os for building file paths and creating the output folder.
+import os
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import the process pool so rosters can be rendered on several CPU cores at once.
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Import shared data and helpers from common.py.
+# The enrolment index lets us find each activity's students without scanning every student record.
+from common import activities, students, format_teacher_name, get_enrolled_students
+# Import the rosters of archived (ended) activities, which are no longer in the live data.
+from archive import iter_archived_rosters
+
+# Default folder (relative to where the app is run) where generated reports are written.
+REPORTS_DIR = "reports"
+
+# Columns written to each activity's roster CSV file.
+ROSTER_CSV_COLUMNS = ("student_id", "name", "year_level", "house", "email", "contact")
+
+# --- Building Roster Data (runs in the main process) ---
+
+def teacher_display_name(teacher_id):
+    """Returns a teacher's name with their title, or 'N/A' if the teacher is unknown."""
+    # Uses the cached formatter from common.py so reports and detail panels share the same names.
+    return format_teacher_name(teacher_id)
+
+def roster_student(s_id):
+    """Returns one student's row of a roster, read straight from their record ('N/A' for anything missing)."""
+    s_data = students.get(s_id, {})
+    return {
+        "student_id": s_id,
+        "name": f"{s_data.get('firstname', 'N/A')} {s_data.get('surname', 'N/A')}" if s_data else "N/A",
+        "year_level": s_data.get("year_level", "N/A"),
+        "house": s_data.get("house", "N/A"),
+        "email": s_data.get("email", "N/A"),
+        "contact": s_data.get("contact_number", "N/A"),
+    }
+
+def build_roster(activity_id):
+    """Collects everything needed to print one activity's roster into a plain dictionary.
+
+    Only plain data (strings and numbers) goes into the result so it can be sent to a worker process.
+    """
+    data = activities.get(activity_id, {})
+    # Students come straight from the enrolment index, sorted by ID for a stable order.
+    enrolled_ids = sorted(get_enrolled_students(activity_id))
+    cost = data.get("cost", 0)
+
+    roster_students = [roster_student(s_id) for s_id in enrolled_ids]
+
+    return {
+        "activity_id": activity_id,
+        "activity": data.get("activity", "N/A"),
+        "teacher": teacher_display_name(data.get("teacher_id")),
+        "location": data.get("location", "N/A"),
+        "schedule": f"{data.get('days', 'N/A')} at {data.get('time', 'N/A')}",
+        "dates": f"{data.get('start_date', 'N/A')} to {data.get('end_date', 'N/A')}",
+        "cost": cost,
+        "income": cost * len(enrolled_ids),
+        "students": roster_students,
+    }
+
+def iter_rosters(activity_ids=None):
+    """Yields one roster at a time (sorted by activity ID) so only a few are in memory at once."""
+    for act_id in sorted(activity_ids if activity_ids is not None else activities.keys()):
+        yield build_roster(act_id)
+
+# --- Rendering Roster Files (runs in worker processes) ---
+
+def render_roster(roster, output_dir):
+    """Writes one roster as an HTML page and a CSV file. Returns a summary row for the index file."""
+    act_id = roster["activity_id"]
+    html_path = os.path.join(output_dir, f"roster_{act_id}.html")
+    csv_path = os.path.join(output_dir, f"roster_{act_id}.csv")
+
+    # --- CSV File ---
+    # newline='' stops the csv module from writing blank lines between rows on Windows.
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ROSTER_CSV_COLUMNS)
+        for student in roster["students"]:
+            writer.writerow([student[col] for col in ROSTER_CSV_COLUMNS])
+
+    # --- HTML File ---
+    # Rows are written one at a time rather than building the whole page as one big string.
+    esc = html.escape
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">")
+        f.write(f"<title>Roster - {esc(roster['activity'])}</title>")
+        f.write("<style>body{font-family:Arial,sans-serif}table{border-collapse:collapse}"
+                "th,td{border:1px solid #999;padding:4px 8px;text-align:left}</style></head><body>\n")
+        f.write(f"<h1>{esc(roster['activity'])} (ID: {act_id})</h1>\n<p>")
+        f.write(f"Teacher: {esc(roster['teacher'])}<br>")
+        f.write(f"Location: {esc(roster['location'])}<br>")
+        f.write(f"Schedule: {esc(roster['schedule'])}<br>")
+        f.write(f"Dates: {esc(roster['dates'])}<br>")
+        f.write(f"Cost: ${roster['cost']} &mdash; Students: {len(roster['students'])} &mdash; Income: ${roster['income']}</p>\n")
+        f.write("<table>\n<tr>" + "".join(f"<th>{esc(col.replace('_', ' ').title())}</th>" for col in ROSTER_CSV_COLUMNS) + "</tr>\n")
+        for student in roster["students"]:
+            f.write("<tr>" + "".join(f"<td>{esc(str(student[col]))}</td>" for col in ROSTER_CSV_COLUMNS) + "</tr>\n")
+        f.write("</table>\n")
+        if not roster["students"]:
+            f.write("<p>No students currently enrolled in this activity.</p>\n")
+        f.write("</body></html>\n")
+
+    return (act_id, roster["activity"], roster["teacher"], len(roster["students"]), roster["income"], html_path, csv_path)
+
+# --- Running the Whole Batch ---
+
+def _render_all(rosters, output_dir, max_workers):
+    """Renders rosters on a process pool, yielding summary rows as each one finishes.
+
+    At most a couple of rosters per worker are queued at any time, so memory use does not grow
+    with the number of activities.
+    """
+    # A single worker means "don't bother with a pool" (useful for debugging and tiny datasets).
+    if max_workers == 1:
+        for roster in rosters:
+            yield render_roster(roster, output_dir)
+        return
+
+    # Default to one worker per CPU, like ProcessPoolExecutor itself does.
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        queue_limit = max_workers * 2
+        pending = set()
+        for roster in rosters:
+            pending.add(executor.submit(render_roster, roster, output_dir))
+            # Once the queue is full, wait for at least one roster to finish before building the next.
+            if len(pending) >= queue_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        # Collect whatever is still running.
+        for future in pending:
+            yield future.result()
+
+def generate_reports(output_dir=REPORTS_DIR, max_workers=None, activity_ids=None, archived=False, progress=None):
+    """Generates HTML and CSV rosters for every activity plus an index.csv summary.
+
+    With archived=True the rosters are for archived activities instead (see archive.py), as they were when archived.
+    'progress' (optional) is called with the number of rosters written so far as each one finishes.
+    Returns a tuple (number_of_rosters, path_to_index_file).
+    """
+    # Create the output folder if it doesn't already exist.
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, "index.csv")
+    count = 0
+    # The summary is written row by row as workers finish (so rows may be out of ID order).
+    with open(index_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("activity_id", "activity", "teacher", "enrolled", "income", "html_file", "csv_file"))
+        rosters = iter_archived_rosters(activity_ids) if archived else iter_rosters(activity_ids)
+        for row in _render_all(rosters, output_dir, max_workers):
+            writer.writerow(row)
+            count += 1
+            if progress:
+                progress(count)
+    return count, index_path
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python reports.py [output_dir] [--workers N] [--archived]"""
+    parser = argparse.ArgumentParser(description="Generate printable rosters for every activity.")
+    parser.add_argument("output_dir", nargs="?", default=REPORTS_DIR, help="Folder to write the reports into.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: one per CPU).")
+    parser.add_argument("--archived", action="store_true", help="Write rosters for archived activities instead.")
+    args = parser.parse_args(argv)
+    count, index_path = generate_reports(args.output_dir, args.workers, archived=args.archived)
+    print(f"Generated {count} roster(s). Summary written to {index_path}")
+
+# Only run the command line tool when this file is executed directly.
+# The guard is also required so worker processes don't re-run the batch when they import this module.
+if __name__ == "__main__":
+    main()
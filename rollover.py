@@ -0,0 +1,241 @@
+# Import json to write archived records and read snapshots.
+import json
+# Import os and shutil for creating folders and copying the data file.
+import os
+import shutil
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import datetime for the snapshot file names.
+from datetime import datetime
+
+# Import shared data, the data file location and the save/reload helpers from common.py.
+import common
+from common import activities, students, USERS, teachers, save_data, replace_data, rebuild_enrolment_index, view_cache
+from common import enrolment_listeners
+# Import the calendar helpers to find ended activities and refresh the calendar afterwards.
+from activity_calendar import has_ended, invalidate_calendar
+from schedule import today
+# Import the archive, which retired activities (and who was enrolled in them) are moved into.
+from archive import build_archive_records, write_archive_file, get_archive
+
+# --- Rollover Settings ---
+# Folder where pre-rollover snapshots, archives and reports are written.
+ROLLOVER_DIR = "rollover"
+# How many students are processed at a time. Only one chunk of changes is held in memory.
+CHUNK_SIZE = 500
+# Students in this year level (or above) graduate instead of being promoted.
+GRADUATING_YEAR = 12
+
+# --- Planning Changes ---
+
+def iter_student_chunks(chunk_size=CHUNK_SIZE):
+    """Yields lists of student IDs, 'chunk_size' at a time, in ID order."""
+    student_ids = sorted(students)
+    for i in range(0, len(student_ids), chunk_size):
+        yield student_ids[i:i + chunk_size]
+
+def plan_student_changes(student_ids, retired_ids, enrolment_mode):
+    """Works out what the rollover does to each student in a chunk, without changing anything.
+
+    Returns a list of change dictionaries: {'student_id', 'action' ('promote' or 'graduate'),
+    'old_year', 'new_year', 'enrolments' (list being cleared or archived)}.
+    """
+    changes = []
+    for s_id in student_ids:
+        s_data = students[s_id]
+        year = s_data.get("year_level")
+        enrolled = list(s_data.get("activities_enrolled", []))
+        if isinstance(year, int) and year >= GRADUATING_YEAR:
+            changes.append({"student_id": s_id, "action": "graduate", "old_year": year, "new_year": None, "enrolments": enrolled})
+        else:
+            new_year = year + 1 if isinstance(year, int) else year
+            # With enrolment_mode "keep", only enrolments in retired activities are dropped.
+            dropped = enrolled if enrolment_mode != "keep" else [a for a in enrolled if a in retired_ids]
+            changes.append({"student_id": s_id, "action": "promote", "old_year": year, "new_year": new_year, "enrolments": dropped})
+    return changes
+
+def find_retired_activities(as_of=None):
+    """Returns the sorted IDs of activities whose end date is before 'as_of' (today by default)."""
+    return sorted(act_id for act_id in activities if has_ended(act_id, as_of))
+
+def describe_change(change):
+    """Turns a planned student change into one line of the dry-run report."""
+    s_data = students.get(change["student_id"], {})
+    name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}".strip()
+    dropped = f", {len(change['enrolments'])} enrolment(s) cleared" if change["enrolments"] else ""
+    if change["action"] == "graduate":
+        return f"GRADUATE {change['student_id']} {name} (year {change['old_year']}){dropped}"
+    return f"PROMOTE  {change['student_id']} {name}: year {change['old_year']} -> {change['new_year']}{dropped}"
+
+# --- Running the Rollover ---
+
+def run_rollover(dry_run=True, as_of=None, enrolment_mode="archive", chunk_size=CHUNK_SIZE, output_dir=ROLLOVER_DIR):
+    """Runs the end-of-year rollover.
+
+    - Every student moves up a year level; students in year 12 graduate (their record and login are archived).
+    - 'enrolment_mode' is "archive" (keep the old list under 'past_enrolments'), "clear", or "keep".
+    - Activities that have ended are retired: moved into the compressed archive (see archive.py) with
+      who was enrolled in them, and removed from every student's enrolments and preferences.
+
+    With dry_run=True nothing is changed and only the report is written.
+    Otherwise a snapshot of data.json is taken first, all changes are saved with a single save_data(),
+    and the indexes are rebuilt once at the end. If anything fails, the snapshot is restored.
+    Once saved, every cleared enrolment is passed to the enrolment listeners as a leave, so the ledger
+    credits what is left of activities still running and the enrolment history records it. Enrolments
+    in retired activities are not: like archive.py, they move into the archive with the activity.
+    Returns a summary dictionary (counts plus the paths of the files written).
+    """
+    as_of = as_of or today()
+    label = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, f"rollover_{'dryrun' if dry_run else 'commit'}_{label}.txt")
+    summary = {"promoted": 0, "graduated": 0, "enrolments_cleared": 0, "activities_retired": 0,
+               "report": report_path, "snapshot": None, "archive": None, "activity_archive": None}
+
+    retired_ids = find_retired_activities(as_of)
+    retired_set = set(retired_ids)
+
+    snapshot_path = archive_file = activity_archive = None
+    # (student_id, activity_id) of every enrolment cleared in an activity that isn't being retired.
+    left = []
+    if not dry_run:
+        # --- Pre-Rollover Snapshot ---
+        # Save any pending changes, then copy the data file exactly as it is now so it can be restored.
+        if not save_data(activities, students, USERS, teachers):
+            raise RuntimeError("Could not save current data before the rollover.")
+        snapshot_path = os.path.join(output_dir, f"pre_rollover_{label}.json")
+        shutil.copy2(common.DATA_FILE, snapshot_path)
+        summary["snapshot"] = snapshot_path
+        # Graduated students are written here, one JSON record per line.
+        summary["archive"] = os.path.join(output_dir, f"archive_{label}.jsonl")
+        archive_file = open(summary["archive"], "w", encoding="utf-8")
+        # Retired activities go into the activity archive, read before any enrolment is changed.
+        activity_records = build_archive_records(retired_ids)
+
+    # Find the login accounts belonging to each student once, rather than searching USERS per graduate.
+    accounts_by_student = {}
+    for username, info in USERS.items():
+        if info.get("student_id") is not None:
+            accounts_by_student.setdefault(info["student_id"], []).append(username)
+
+    try:
+        with open(report_path, "w", encoding="utf-8") as report:
+            report.write(f"Year rollover {'DRY RUN' if dry_run else 'COMMIT'} as of {as_of.strftime('%d/%m/%Y')}\n\n")
+            # --- Students, One Chunk at a Time ---
+            for chunk in iter_student_chunks(chunk_size):
+                changes = plan_student_changes(chunk, retired_set, enrolment_mode)
+                for change in changes:
+                    report.write(describe_change(change) + "\n")
+                    summary["enrolments_cleared"] += len(change["enrolments"])
+                    summary["graduated" if change["action"] == "graduate" else "promoted"] += 1
+                    if not dry_run:
+                        _apply_student_change(change, enrolment_mode, as_of.year, accounts_by_student, archive_file, retired_set)
+                        left.extend((change["student_id"], a) for a in change["enrolments"] if a not in retired_set)
+
+            # --- Retired Activities ---
+            report.write("\n")
+            for act_id in retired_ids:
+                act_data = activities.get(act_id, {})
+                report.write(f"RETIRE   {act_id} {act_data.get('activity', 'N/A')} (ended {act_data.get('end_date', 'N/A')})\n")
+                summary["activities_retired"] += 1
+                if not dry_run:
+                    del activities[act_id]
+
+            report.write(f"\nPromoted: {summary['promoted']}, Graduated: {summary['graduated']}, "
+                         f"Enrolments cleared: {summary['enrolments_cleared']}, Activities retired: {summary['activities_retired']}\n")
+
+        if not dry_run:
+            archive_file.close()
+            if activity_records:
+                activity_archive = write_archive_file(activity_records)
+                summary["activity_archive"] = activity_archive[1]
+            # --- Single Save ---
+            if not save_data(activities, students, USERS, teachers):
+                raise RuntimeError("Saving the rolled-over data failed.")
+            # Only now are the retired activities listed in the archive's index.
+            if activity_archive:
+                get_archive().add_segment(activity_archive[0], activity_records)
+            _rebuild_indexes()
+    except Exception:
+        if not dry_run:
+            if archive_file and not archive_file.closed:
+                archive_file.close()
+            # Put everything back exactly as it was before the rollover started, including deleting
+            # (and, if it was already added, un-indexing) the activity archive file.
+            restore_snapshot(snapshot_path, activity_archive[1] if activity_archive else None)
+        raise
+    # --- Enrolment Listeners ---
+    # Called after the save, so nothing has to be reversed if it fails.
+    for s_id, act_id in left:
+        for listener in enrolment_listeners:
+            listener(s_id, act_id, False)
+    return summary
+
+def _apply_student_change(change, enrolment_mode, year_label, accounts_by_student, archive_file, retired_ids):
+    """Applies one planned student change to the in-memory data."""
+    s_id = change["student_id"]
+    s_data = students[s_id]
+    # Retired activities can't be allocated any more, so they are dropped from preferences too.
+    if "preferences" in s_data and retired_ids & set(s_data["preferences"]):
+        s_data["preferences"] = [a for a in s_data["preferences"] if a not in retired_ids]
+    if change["action"] == "graduate":
+        # Archive the student record and their logins, then remove them from the live data.
+        accounts = {name: USERS.pop(name) for name in accounts_by_student.get(s_id, []) if name in USERS}
+        archive_file.write(json.dumps({"type": "student", "student_id": s_id, "data": s_data, "users": accounts}) + "\n")
+        del students[s_id]
+        return
+    s_data["year_level"] = change["new_year"]
+    if change["enrolments"]:
+        if enrolment_mode == "archive":
+            # Keep a record of last year's activities on the student.
+            s_data.setdefault("past_enrolments", {})[str(year_label)] = change["enrolments"]
+        s_data["activities_enrolled"] = [a for a in s_data.get("activities_enrolled", []) if a not in change["enrolments"]]
+
+def _rebuild_indexes():
+    """Rebuilds every derived index once, after all records have changed."""
+    rebuild_enrolment_index()
+    invalidate_calendar()
+    view_cache.clear()
+
+def restore_snapshot(snapshot_path, activity_archive=None):
+    """Rolls back to a pre-rollover snapshot: copies it over data.json and reloads it in place.
+
+    'activity_archive' is the archive file the rollover wrote its retired activities to (the summary's
+    'activity_archive'). It is deleted and dropped from the archive index, because the snapshot has
+    those activities back in the live data.
+    """
+    with open(snapshot_path, "r") as f:
+        data = json.load(f)
+    shutil.copy2(snapshot_path, common.DATA_FILE)
+    replace_data(data)
+    if activity_archive:
+        get_archive().remove_segment(os.path.basename(activity_archive))
+    invalidate_calendar()
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python rollover.py [--commit] [--enrolments archive|clear|keep] [--rollback FILE]"""
+    parser = argparse.ArgumentParser(description="End-of-year rollover: promote students, graduate year 12, retire ended activities.")
+    parser.add_argument("--commit", action="store_true", help="Apply the changes (default is a dry run that only writes a report).")
+    parser.add_argument("--enrolments", choices=("archive", "clear", "keep"), default="archive", help="What to do with current enrolments.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Students processed per chunk.")
+    parser.add_argument("--rollback", metavar="SNAPSHOT", help="Restore a pre-rollover snapshot instead of rolling over.")
+    parser.add_argument("--remove-archive", metavar="FILE", help="With --rollback: the activity archive file the rollover wrote, to delete.")
+    args = parser.parse_args(argv)
+
+    if args.rollback:
+        restore_snapshot(args.rollback, args.remove_archive)
+        print(f"Restored {args.rollback} to {common.DATA_FILE}" + (f" and removed {args.remove_archive}" if args.remove_archive else ""))
+        return
+    summary = run_rollover(dry_run=not args.commit, enrolment_mode=args.enrolments, chunk_size=args.chunk_size)
+    print(f"Promoted {summary['promoted']}, graduated {summary['graduated']}, cleared {summary['enrolments_cleared']} enrolment(s), "
+          f"retired {summary['activities_retired']} activit(ies). Report: {summary['report']}")
+    if summary["snapshot"]:
+        undo = f"python rollover.py --rollback {summary['snapshot']}"
+        if summary["activity_archive"]:
+            undo += f" --remove-archive {summary['activity_archive']}"
+        print(f"Pre-rollover snapshot: {summary['snapshot']} (undo with: {undo})")
+
+if __name__ == "__main__":
+    main()
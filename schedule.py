@@ -0,0 +1,71 @@
+# Import datetime tools for working with activity dates.
+from datetime import datetime, date, timedelta
+
+# Format used for all dates stored in data.json (e.g., "01/02/2025").
+DATE_FORMAT = "%d/%m/%Y"
+
+# Maps the day abbreviations used in an activity's 'days' field to Python weekday numbers (Monday = 0).
+DAY_NUMBERS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+def parse_date(text):
+    """Converts a 'DD/MM/YYYY' string into a date object. Returns None if it is missing or invalid."""
+    try:
+        return datetime.strptime(str(text).strip(), DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+def format_date(value):
+    """Converts a date object back into the 'DD/MM/YYYY' format used in data.json."""
+    return value.strftime(DATE_FORMAT)
+
+def parse_days(days_str):
+    """Converts a 'days' string like 'Mon, Wed' into a sorted list of weekday numbers ([0, 2])."""
+    weekdays = set()
+    for part in str(days_str or "").split(","):
+        # Only the first three letters matter, so 'Monday' and 'mon' both work.
+        key = part.strip().lower()[:3]
+        if key in DAY_NUMBERS:
+            weekdays.add(DAY_NUMBERS[key])
+    return sorted(weekdays)
+
+def parse_time_range(time_str):
+    """Converts a 'time' string like '3:30 PM - 4:30 PM' into (start, end) minutes after midnight.
+
+    Returns None if the string can't be understood.
+    """
+    try:
+        start_text, end_text = [part.strip() for part in str(time_str).split("-", 1)]
+        start = datetime.strptime(start_text, "%I:%M %p")
+        end = datetime.strptime(end_text, "%I:%M %p")
+    except ValueError:
+        return None
+    return (start.hour * 60 + start.minute, end.hour * 60 + end.minute)
+
+def session_dates(activity_data, until=None, first_day=None):
+    """Yields the date of every session of an activity, in order.
+
+    Sessions fall on the activity's 'days' between its 'start_date' and 'end_date' (inclusive).
+    If 'until' is given, no sessions after that date are produced; if 'first_day' is given, none before it.
+    Activities with missing or invalid dates/days have no sessions.
+    """
+    start = parse_date(activity_data.get("start_date", ""))
+    end = parse_date(activity_data.get("end_date", ""))
+    weekdays = parse_days(activity_data.get("days", ""))
+    if not start or not end or not weekdays:
+        return
+    if until is not None and until < end:
+        end = until
+    if first_day is not None and first_day > start:
+        start = first_day
+    # Jump straight to the first week and step a week at a time, rather than checking every single day.
+    week_start = start - timedelta(days=start.weekday())
+    while week_start <= end:
+        for weekday in weekdays:
+            day = week_start + timedelta(days=weekday)
+            if start <= day <= end:
+                yield day
+        week_start += timedelta(days=7)
+
+def today():
+    """Returns today's date (kept as a function so it is easy to replace when testing)."""
+    return date.today()
@@ -0,0 +1,155 @@
+# Import argparse to read options from the command line.
+import argparse
+# Import os to place the backups in the scratch folder.
+import os
+# Import inspect to measure how deep the call stack is inside each session.
+import inspect
+# Import gc to count how many Tk windows exist and to clean up between measurements.
+import gc
+# Import sys to set the exit code.
+import sys
+# Import tempfile to run against a scratch copy of the data.
+import tempfile
+# Import tracemalloc to measure how much memory Python is holding.
+import tracemalloc
+# Import tkinter to detect when no display is available.
+import tkinter as tk
+
+# Import the application window, the session it opens and the user accounts it logs in with.
+from main import MainApplication, SessionFrame
+import common
+from common import USERS
+# Import the login check, so every account can be tried once before the window opens.
+from credentials import check_login
+# Import the scratch-copy helpers from the load test, and the backups so they go to the scratch folder too.
+from load_test import prepare_workspace, use_workspace
+from tenants import list_tenants
+import attendance
+import ledger
+import enrolment_history
+import backups
+
+# --- Soak Test for the Login/Logout Cycle ---
+# Runs thousands of login/logout cycles in one window and checks that nothing builds up between them.
+# It needs a display; on a server run it under a virtual one, e.g.:  xvfb-run python session_soak.py
+# Like load_test.py it runs on a scratch copy of the data: logging in can save (old passwords are
+# upgraded to hashes), and those saves and their backups must never touch the real data file.
+
+def measure(app):
+    """Collects the numbers that must stay flat between cycles."""
+    gc.collect()
+    return {
+        "memory_kb": tracemalloc.get_traced_memory()[0] / 1024,
+        # Every Python callback given to Tk becomes a Tcl command, so leaked callbacks show up here.
+        "tcl_commands": len(app.tk.call("info", "commands")),
+        "widgets": len(app.winfo_children()),
+        "tk_roots": sum(1 for obj in gc.get_objects() if isinstance(obj, tk.Tk)),
+    }
+
+def login_once(app, username, password):
+    """Logs in through the login screen exactly as a user would, then logs out again.
+
+    Returns the call-stack depth seen from inside the session, which must be the same for every login:
+    if it grows, each session is being started from inside the previous one's callbacks.
+    """
+    depth = []
+    login = app.current_frame
+    # Stay on the scratch copy rather than switching to a campus's own data file (see tenants.py).
+    login.school_combo = None
+    login.username_entry.insert(0, username)
+    login.password_entry.insert(0, password)
+    login.check_credentials()
+    # Sampled from a Tk callback once the new session has been switched in, i.e. from inside the session.
+    app.after_idle(lambda: depth.append(len(inspect.stack(0))))
+    # Let Tk process the new session's drawing and any pending callbacks.
+    app.update()
+    if not isinstance(app.current_frame, SessionFrame):
+        raise RuntimeError(f"Logging in as '{username}' did not start a session.")
+    app.logout()
+    app.update()
+    return depth[0] if depth else None
+
+def run_soak(cycles=2000, warmup=50, max_growth_kb=512, usernames=None, password="student123", source_file=None):
+    """Runs the soak test on a scratch copy of the data. Returns (passed, report_lines).
+
+    Passwords are stored as hashes, so every account in 'usernames' must use the given password.
+    """
+    source_file = source_file or common.DATA_FILE
+    # The login screen lists the campuses, so read tenants.json while the real data file is still the one in use.
+    list_tenants()
+    original_files = (common.DATA_FILE, attendance.ATTENDANCE_FILE, ledger.LEDGER_FILE, enrolment_history.EVENTS_FILE)
+    original_backup_dir = backups.BACKUP_DIR
+    with tempfile.TemporaryDirectory(prefix="session_soak_") as folder:
+        use_workspace(prepare_workspace(source_file, folder))
+        backups.BACKUP_DIR = os.path.join(folder, "backups")
+        try:
+            return _soak(cycles, warmup, max_growth_kb, usernames, password)
+        finally:
+            # Take any waiting backups of the copy now, while the scratch folder still exists.
+            backups.flush_backups()
+            # Put the program back on the real data file.
+            backups.BACKUP_DIR = original_backup_dir
+            use_workspace(*original_files)
+
+def _soak(cycles, warmup, max_growth_kb, usernames, password):
+    """Runs the cycles on whatever data file is loaded. Returns (passed, report_lines)."""
+    usernames = usernames or [name for name, info in USERS.items() if info.get("role") == "student"]
+    usernames = usernames[:cycles + warmup]
+    # A wrong password would stop the test at the login screen's error box, so every account is
+    # checked first (this also upgrades any plain-text passwords, on the copy).
+    rejected = [name for name in usernames if check_login(name, password) is None]
+    if rejected:
+        raise ValueError(f"{len(rejected)} account(s) don't use the given password, e.g. '{rejected[0]}'.")
+    app = MainApplication()
+    # Keep the window off screen; it still behaves normally.
+    app.withdraw()
+    tracemalloc.start()
+    try:
+        # Warm up first so one-off costs (imports, caches, theme setup) aren't counted as growth.
+        for i in range(warmup):
+            name = usernames[i % len(usernames)]
+            login_once(app, name, password)
+        before = measure(app)
+        depths = []
+        for i in range(cycles):
+            name = usernames[i % len(usernames)]
+            depths.append(login_once(app, name, password))
+        after = measure(app)
+    finally:
+        tracemalloc.stop()
+        app.destroy()
+
+    growth_kb = after["memory_kb"] - before["memory_kb"]
+    checks = [
+        ("memory growth", growth_kb <= max_growth_kb, f"{growth_kb:.1f} KB (limit {max_growth_kb} KB)"),
+        ("stack depth", None not in depths and len(set(depths)) == 1,
+         f"{min(d for d in depths if d is not None)} -> {max(d for d in depths if d is not None)}" if any(depths) else "never sampled"),
+        ("tcl commands", after["tcl_commands"] == before["tcl_commands"], f"{before['tcl_commands']} -> {after['tcl_commands']}"),
+        ("widgets", after["widgets"] == before["widgets"], f"{before['widgets']} -> {after['widgets']}"),
+        ("tk roots", after["tk_roots"] == 1, f"{after['tk_roots']}"),
+    ]
+    report = [f"{cycles} login/logout cycles"]
+    report += [f"  {'PASS' if ok else 'FAIL'}  {name}: {detail}" for name, ok, detail in checks]
+    return all(ok for _, ok, _ in checks), report
+
+def main(argv=None):
+    """Command line entry point: python session_soak.py [--cycles N]"""
+    parser = argparse.ArgumentParser(description="Soak test the login/logout cycle.")
+    parser.add_argument("--cycles", type=int, default=2000, help="Number of login/logout cycles to run.")
+    parser.add_argument("--max-growth-kb", type=int, default=512, help="Allowed memory growth after warm-up.")
+    parser.add_argument("--password", default="student123", help="Password shared by the student test accounts.")
+    args = parser.parse_args(argv)
+    try:
+        passed, report = run_soak(args.cycles, max_growth_kb=args.max_growth_kb, password=args.password)
+    except tk.TclError as e:
+        # Usually means there is no display. Exit code 2 tells scripts the test could not run.
+        print(f"Could not start Tk ({e}). Run under a display, e.g. 'xvfb-run python session_soak.py'.")
+        return 2
+    except (ValueError, RuntimeError) as e:
+        print(f"Soak test could not run: {e}")
+        return 2
+    print("\n".join(report))
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# Import json to decode records and write change sets.
+import json
+# Import hashlib to fingerprint each record's content.
+import hashlib
+# Import re to skip whitespace between values quickly.
+import re
+# Import argparse to read options when this file is run from the command line.
+import argparse
+
+# --- Snapshot Diff and Patch ---
+# Compares two data.json snapshots record by record and produces a change set:
+#   {"format": 1,
+#    "sections": {"activities": {"added": {id: record}, "removed": {id: record}, "modified": {id: {"old": ..., "new": ...}}},
+#                 "students": {...}, "users": {...}, "teachers": {...}},
+#    "enrolments": {"joined": [[student_id, activity_id], ...], "left": [[student_id, activity_id], ...]}}
+# IDs are kept as the strings used in data.json. The same change set can be applied to a dataset as a patch.
+#
+# Snapshots are read a record at a time, so even very large files are never loaded whole:
+# the first pass keeps only a 16-byte fingerprint per record, and a second pass fetches the
+# full records for just the ones that changed.
+
+SECTIONS = ("activities", "students", "users", "teachers")
+# Sections whose keys are whole numbers in the running program (users are keyed by username).
+INT_KEYED = ("activities", "students", "teachers")
+# How much of a snapshot file is read at a time.
+CHUNK_SIZE = 1 << 20
+CHANGE_SET_FORMAT = 1
+# Matches any run of JSON whitespace (including none).
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+class PatchConflict(Exception):
+    """Raised when a change set doesn't match the data it is being applied to."""
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} conflict(s), e.g. {conflicts[0]}")
+
+# --- Reading Snapshots a Record at a Time ---
+
+class _StreamReader:
+    """Reads JSON values one at a time from a file, keeping only a small buffer in memory."""
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Reads the next chunk into the buffer, dropping what has already been used."""
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def next_char(self):
+        """Returns the next non-whitespace character and moves past it ('' at the end of the file)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                self.pos += 1
+                return self.buffer[self.pos - 1]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def expect(self, char):
+        """Reads the next character, which must be 'char'."""
+        found = self.next_char()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'end of file'}'")
+
+    def value(self):
+        """Decodes the next complete JSON value (a record, string, number...)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            try:
+                result, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number that ends exactly at the end of the buffer might continue in the next chunk.
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return result
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_records(path):
+    """Yields (section, record_id, record) for every record in a data.json-style file, one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _StreamReader(f)
+        reader.expect("{")
+        char = reader.next_char()
+        while char not in ("}", ""):
+            reader.pos -= 1  # Put the opening quote of the section name back.
+            section = reader.value()
+            reader.expect(":")
+            if reader.next_char() != "{":
+                # Not a section of records; skip its value.
+                reader.pos -= 1
+                reader.value()
+            else:
+                char = reader.next_char()
+                while char not in ("}", ""):
+                    reader.pos -= 1
+                    record_id = reader.value()
+                    reader.expect(":")
+                    yield section, record_id, reader.value()
+                    char = reader.next_char()
+                    if char == ",":
+                        char = reader.next_char()
+            char = reader.next_char()
+            if char == ",":
+                char = reader.next_char()
+
+def fingerprint(record):
+    """Returns a short hash of a record's content (the same for equal records, whatever their key order)."""
+    text = json.dumps(record, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def fingerprints(path):
+    """Returns {(section, record_id): fingerprint} for a snapshot file."""
+    return {(section, record_id): fingerprint(record) for section, record_id, record in iter_records(path)}
+
+# --- Diffing ---
+
+def _fetch(path, wanted):
+    """Returns {(section, record_id): record} for just the wanted keys, in one streaming pass."""
+    found = {}
+    if wanted:
+        for section, record_id, record in iter_records(path):
+            if (section, record_id) in wanted:
+                found[(section, record_id)] = record
+    return found
+
+def diff_snapshots(old_path, new_path):
+    """Compares two snapshot files and returns a change set (see the top of this file)."""
+    old = fingerprints(old_path)
+    new = fingerprints(new_path)
+    added = new.keys() - old.keys()
+    removed = old.keys() - new.keys()
+    modified = {key for key in old.keys() & new.keys() if old[key] != new[key]}
+    # Only the records that changed are read in full.
+    old_records = _fetch(old_path, removed | modified)
+    new_records = _fetch(new_path, added | modified)
+    return build_change_set(added, removed, modified, old_records, new_records)
+
+def diff_data(old_data, new_data):
+    """Compares two datasets already in memory (data.json layout, string keys) and returns a change set."""
+    old = {(section, str(k)): v for section in SECTIONS for k, v in old_data.get(section, {}).items()}
+    new = {(section, str(k)): v for section in SECTIONS for k, v in new_data.get(section, {}).items()}
+    added = new.keys() - old.keys()
+    removed = old.keys() - new.keys()
+    modified = {key for key in old.keys() & new.keys() if fingerprint(old[key]) != fingerprint(new[key])}
+    return build_change_set(added, removed, modified, old, new)
+
+def build_change_set(added, removed, modified, old_records, new_records):
+    """Builds the change set dictionary, including the enrolment changes implied by the student changes."""
+    sections = {name: {"added": {}, "removed": {}, "modified": {}} for name in SECTIONS}
+    for section, record_id in sorted(added):
+        sections.setdefault(section, {"added": {}, "removed": {}, "modified": {}})["added"][record_id] = new_records[(section, record_id)]
+    for section, record_id in sorted(removed):
+        sections.setdefault(section, {"added": {}, "removed": {}, "modified": {}})["removed"][record_id] = old_records[(section, record_id)]
+    for section, record_id in sorted(modified):
+        sections.setdefault(section, {"added": {}, "removed": {}, "modified": {}})["modified"][record_id] = {
+            "old": old_records[(section, record_id)], "new": new_records[(section, record_id)]}
+
+    joined, left = [], []
+    students = sections["students"]
+    for record_id in sorted(set(students["added"]) | set(students["removed"]) | set(students["modified"])):
+        before = students["removed"].get(record_id) or students["modified"].get(record_id, {}).get("old") or {}
+        after = students["added"].get(record_id) or students["modified"].get(record_id, {}).get("new") or {}
+        old_set = set(before.get("activities_enrolled", []))
+        new_set = set(after.get("activities_enrolled", []))
+        joined += [[record_id, act_id] for act_id in sorted(new_set - old_set)]
+        left += [[record_id, act_id] for act_id in sorted(old_set - new_set)]
+    return {"format": CHANGE_SET_FORMAT, "sections": sections, "enrolments": {"joined": joined, "left": left}}
+
+def summarise(change_set):
+    """Returns lines of text describing a change set."""
+    lines = []
+    for section, changes in change_set["sections"].items():
+        counts = [f"{len(changes[kind])} {kind}" for kind in ("added", "removed", "modified") if changes[kind]]
+        if counts:
+            lines.append(f"{section}: {', '.join(counts)}")
+    enrol = change_set["enrolments"]
+    if enrol["joined"] or enrol["left"]:
+        lines.append(f"enrolments: {len(enrol['joined'])} joined, {len(enrol['left'])} left")
+    return lines or ["No differences."]
+
+# --- Patching ---
+
+def apply_change_set(data, change_set, check=True, int_keys=False):
+    """Applies a change set to a dataset in place and returns it.
+
+    'data' maps each section name to its dictionary of records. Use int_keys=True for the running
+    program's dictionaries (whole-number IDs for the sections in INT_KEYED) and the default for the
+    data.json layout (string IDs). With check=True every record being removed or modified must still
+    equal its 'old' version and added records must not exist yet, otherwise PatchConflict is raised
+    and nothing is changed.
+    """
+    if change_set.get("format") != CHANGE_SET_FORMAT:
+        raise ValueError("Unsupported change set format.")
+
+    def key_for(section, record_id, records):
+        # Change sets always hold string IDs, as in data.json.
+        return int(record_id) if int_keys and section in INT_KEYED else record_id
+
+    conflicts = []
+    if check:
+        for section, changes in change_set["sections"].items():
+            records = data.get(section, {})
+            for record_id in changes["added"]:
+                if key_for(section, record_id, records) in records:
+                    conflicts.append(f"{section} {record_id} already exists")
+            for record_id, record in changes["removed"].items():
+                current = records.get(key_for(section, record_id, records))
+                if current is None or fingerprint(current) != fingerprint(record):
+                    conflicts.append(f"{section} {record_id} is missing or has changed")
+            for record_id, change in changes["modified"].items():
+                current = records.get(key_for(section, record_id, records))
+                if current is None or fingerprint(current) != fingerprint(change["old"]):
+                    conflicts.append(f"{section} {record_id} is missing or has changed")
+        if conflicts:
+            raise PatchConflict(conflicts)
+
+    for section, changes in change_set["sections"].items():
+        records = data.setdefault(section, {})
+        for record_id in changes["removed"]:
+            records.pop(key_for(section, record_id, records), None)
+        for record_id, record in changes["added"].items():
+            records[key_for(section, record_id, records)] = record
+        for record_id, change in changes["modified"].items():
+            records[key_for(section, record_id, records)] = change["new"]
+    return data
+
+def reverse_change_set(change_set):
+    """Returns the change set that undoes 'change_set'."""
+    sections = {}
+    for section, changes in change_set["sections"].items():
+        sections[section] = {
+            "added": dict(changes["removed"]),
+            "removed": dict(changes["added"]),
+            "modified": {rid: {"old": c["new"], "new": c["old"]} for rid, c in changes["modified"].items()},
+        }
+    enrol = change_set["enrolments"]
+    return {"format": CHANGE_SET_FORMAT, "sections": sections, "enrolments": {"joined": enrol["left"], "left": enrol["joined"]}}
+
+def patch_file(source_path, change_set, output_path, check=True):
+    """Applies a change set to a snapshot file and writes the result to output_path."""
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    apply_change_set(data, change_set, check)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+
+def apply_to_live_data(change_set, check=True):
+    """Applies a change set to the running program's data, then saves and rebuilds the indexes once."""
+    # Imported here so the diff tool itself runs without loading data.json.
+    import common
+    live = {"activities": common.activities, "students": common.students, "users": common.USERS, "teachers": common.teachers}
+    apply_change_set(live, change_set, check, int_keys=True)
+    common.rebuild_enrolment_index()
+    # Drop cached views of every record that changed.
+    kinds = {"activities": "activity", "students": "student", "teachers": "teacher"}
+    for section, kind in kinds.items():
+        changes = change_set["sections"].get(section, {})
+        for record_id in list(changes.get("added", {})) + list(changes.get("removed", {})) + list(changes.get("modified", {})):
+            common.touch_record(kind, int(record_id))
+    return common.save_data(common.activities, common.students, common.USERS, common.teachers)
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python snapshot_diff.py diff OLD NEW [-o CHANGES] | patch SOURCE CHANGES -o OUTPUT"""
+    parser = argparse.ArgumentParser(description="Compare data.json snapshots and apply the differences as patches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff_cmd = commands.add_parser("diff", help="Compare two snapshots.")
+    diff_cmd.add_argument("old")
+    diff_cmd.add_argument("new")
+    diff_cmd.add_argument("-o", "--output", help="Write the change set to this JSON file.")
+    patch_cmd = commands.add_parser("patch", help="Apply a change set to a snapshot.")
+    patch_cmd.add_argument("source")
+    patch_cmd.add_argument("changes")
+    patch_cmd.add_argument("-o", "--output", required=True, help="File to write the patched snapshot to.")
+    patch_cmd.add_argument("--reverse", action="store_true", help="Undo the change set instead of applying it.")
+    patch_cmd.add_argument("--force", action="store_true", help="Apply even if records don't match the change set.")
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        change_set = diff_snapshots(args.old, args.new)
+        print("\n".join(summarise(change_set)))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(change_set, f, indent=2)
+            print(f"Change set written to {args.output}")
+        return 0
+    with open(args.changes, "r", encoding="utf-8") as f:
+        change_set = json.load(f)
+    if args.reverse:
+        change_set = reverse_change_set(change_set)
+    try:
+        patch_file(args.source, change_set, args.output, check=not args.force)
+    except PatchConflict as e:
+        print("Patch not applied:\n  " + "\n  ".join(e.conflicts[:20]))
+        return 1
+    print(f"Patched snapshot written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
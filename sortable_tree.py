@@ -0,0 +1,160 @@
+# Import bisect to keep each column's sort order up to date without re-sorting everything.
+from bisect import bisect_left, insort
+# Import isfinite so "nan" and "inf" cells sort as text rather than breaking the numeric order.
+from math import isfinite
+
+# Arrows shown in the heading of the column the list is sorted by.
+ASCENDING_ARROW = " ▲"
+DESCENDING_ARROW = " ▼"
+
+def sort_key(value):
+    """Turns a cell value into something that sorts sensibly.
+
+    Numbers (including text like "$30", "12" or "75%") sort numerically and come first; everything else
+    sorts as text, ignoring case. NaN and infinity sort as text too, because NaN never compares equal
+    (so its row could not be found again in the sorted lists) and "inf" is usually a word, not a number.
+    """
+    if isinstance(value, (int, float)) and isfinite(value):
+        return (0, value, "")
+    text = str(value).strip()
+    try:
+        number = float(text.lstrip("$").rstrip("%").replace(",", ""))
+    except ValueError:
+        number = None
+    if number is not None and isfinite(number):
+        return (0, number, "")
+    return (1, 0, text.lower())
+
+class SortableTree:
+    """Adds click-to-sort headings to a ttk.Treeview.
+
+    A sorted list of (key, row ID) is kept for every column and updated as rows are inserted,
+    changed and deleted, so clicking a heading just reorders the existing rows in one call
+    instead of sorting the data again or deleting and re-inserting every row.
+    Rows must be added and removed through this class (not the Treeview directly).
+    """
+    def __init__(self, tree, columns, sort_column=None):
+        self.tree = tree
+        self.columns = list(columns)
+        # Column -> sorted list of (key, row ID).
+        self.orders = {col: [] for col in self.columns}
+        # Row ID -> tuple of keys (one per column), used to find the row again in each order.
+        self.row_keys = {}
+        # Row ID -> the values currently shown, so sync() can skip rows that haven't changed.
+        self.row_values = {}
+        # Start sorted by the first column (the ID column in every list), ascending.
+        self.sort_column = sort_column or self.columns[0]
+        self.descending = False
+        # Remember each heading's text so the arrow can be added and removed.
+        self.headings = {col: tree.heading(col, "text") for col in self.columns}
+        for col in self.columns:
+            tree.heading(col, command=lambda c=col: self.on_heading_click(c))
+        self.update_headings()
+
+    # --- Keeping the Sort Orders Up To Date ---
+
+    def _add_keys(self, iid, values):
+        """Records a row's keys in every column's sorted list. Returns its position in the current order."""
+        keys = tuple(sort_key(v) for v in values)
+        self.row_keys[iid] = keys
+        self.row_values[iid] = tuple(values)
+        for col, key in zip(self.columns, keys):
+            insort(self.orders[col], (key, iid))
+        return self._display_index(iid)
+
+    def _remove_keys(self, iid):
+        """Removes a row's keys from every column's sorted list."""
+        keys = self.row_keys.pop(iid)
+        self.row_values.pop(iid, None)
+        for col, key in zip(self.columns, keys):
+            order = self.orders[col]
+            # The (key, ID) pair is unique, so bisect finds it exactly.
+            del order[bisect_left(order, (key, iid))]
+
+    def _display_index(self, iid):
+        """Returns where a row belongs in the Treeview for the current sort column and direction."""
+        order = self.orders[self.sort_column]
+        index = bisect_left(order, (self.row_keys[iid][self.columns.index(self.sort_column)], iid))
+        return len(order) - 1 - index if self.descending else index
+
+    # --- Changing Rows ---
+
+    def insert(self, values, iid):
+        """Adds a row (or updates it if 'iid' is already shown) in its sorted position. Returns the row ID."""
+        iid = str(iid)
+        if iid in self.row_keys:
+            self.update(iid, values)
+            return iid
+        index = self._add_keys(iid, values)
+        self.tree.insert("", index, iid=iid, values=tuple(values))
+        return iid
+
+    def update(self, iid, values):
+        """Changes the values of an existing row and moves it if its sort position changed."""
+        iid = str(iid)
+        if self.row_values.get(iid) == tuple(values):
+            return  # Nothing to do.
+        self._remove_keys(iid)
+        index = self._add_keys(iid, values)
+        self.tree.item(iid, values=tuple(values))
+        # Detach first so the index counts only the other rows.
+        self.tree.detach(iid)
+        self.tree.move(iid, "", index)
+
+    def set_value(self, iid, column, value):
+        """Changes one cell of a row (like Treeview.set) and keeps the sort orders correct."""
+        values = list(self.row_values[str(iid)])
+        values[self.columns.index(column)] = value
+        self.update(iid, values)
+
+    def delete(self, iid):
+        """Removes a row."""
+        iid = str(iid)
+        if iid in self.row_keys:
+            self._remove_keys(iid)
+            self.tree.delete(iid)
+
+    def clear(self):
+        """Removes every row."""
+        self.tree.delete(*self.tree.get_children())
+        self.orders = {col: [] for col in self.columns}
+        self.row_keys.clear()
+        self.row_values.clear()
+
+    def sync(self, rows):
+        """Makes the list show exactly 'rows' (a dictionary of row ID -> values).
+
+        Only rows that are new, changed or gone are touched, so refreshing a large list after a small
+        change doesn't redraw everything.
+        """
+        rows = {str(iid): values for iid, values in rows.items()}
+        for iid in [i for i in self.row_keys if i not in rows]:
+            self.delete(iid)
+        for iid, values in rows.items():
+            self.insert(values, iid)
+
+    # --- Sorting ---
+
+    def on_heading_click(self, column):
+        """Sorts by a column; clicking the same column again reverses the direction."""
+        descending = not self.descending if column == self.sort_column else False
+        self.sort_by(column, descending)
+
+    def sort_by(self, column, descending=False):
+        """Reorders the rows by a column using its maintained order (no sorting needed)."""
+        self.sort_column = column
+        self.descending = descending
+        ordered = [iid for _, iid in self.orders[column]]
+        if descending:
+            ordered.reverse()
+        # Put the existing rows in the new order with a single call.
+        self.tree.set_children("", *ordered)
+        self.update_headings()
+
+    def update_headings(self):
+        """Shows an arrow on the heading of the column the list is sorted by."""
+        for col in self.columns:
+            arrow = ""
+            if col == self.sort_column:
+                arrow = DESCENDING_ARROW if self.descending else ASCENDING_ARROW
+            self.tree.heading(col, text=self.headings[col] + arrow)
@@ -1,11 +1,26 @@
 # Import tkinter library for GUI elements
 import tkinter as tk
-# Import themed widgets from tkinter
-from tkinter import ttk
+# Import themed widgets, message boxes and file dialogs from tkinter
+from tkinter import ttk, messagebox, filedialog, simpledialog
 
 # Import shared data (activities, students dictionaries) and the
 # utility function 'format_student_info' from the common.py file.
-from common import activities, students, format_student_info
+from common import activities, students, format_student_info, get_enrolled_students
+# Import the attendance functions used by the "Attendance" tab.
+from attendance import (get_sessions, mark_session, get_session_attendance, is_session_marked,
+                        activity_attendance_rate, student_attendance_rate, export_attendance_csv)
+# Import date helpers for choosing which session to mark.
+from schedule import format_date, parse_date, today
+# Import the calendar index used by the "Today" tab.
+from activity_calendar import activities_running_today
+# Import the teacher name helper shared with the roster reports.
+from reports import teacher_display_name
+# Import the query API used by the student filter bar.
+from query import run_query, QueryError
+# Import the helper that makes Treeview columns sortable by clicking their headings.
+from sortable_tree import SortableTree
+# Import the fee ledger for balances and payments (importing it also turns on automatic join/leave charges).
+from ledger import balance, record_payment, format_cents
 
 # Define the StaffFrame class, inheriting from ttk.Frame.
 # This class represents the main panel for the staff view.
@@ -46,7 +61,7 @@ class StaffFrame(ttk.Frame):
         # Create the Treeview widget for activities.
         self.act_tree = ttk.Treeview(act_list_frame, columns=columns_act, show="headings", height=10)
         # Configure the columns (headings, widths) using the helper method.
-        self.setup_treeview_columns(self.act_tree, columns_act, {"enrollments": 100, "activity_id": 80})
+        self.act_sorter = self.setup_treeview_columns(self.act_tree, columns_act, {"enrollments": 100, "activity_id": 80})
         # Place the Treeview, making it fill space.
         self.act_tree.pack(fill=tk.BOTH, expand=True, pady=5)
         # Bind the selection event (single click) to the 'on_activity_select' method.
@@ -59,7 +74,7 @@ class StaffFrame(ttk.Frame):
         # Create the Treeview widget for enrolled students.
         self.act_students_tree = ttk.Treeview(act_list_frame, columns=cols_students, show="headings", height=8)
         # Configure its columns.
-        self.setup_treeview_columns(self.act_students_tree, cols_students, {"year_level": 80, "student_id": 80})
+        self.act_students_sorter = self.setup_treeview_columns(self.act_students_tree, cols_students, {"year_level": 80, "student_id": 80})
         # Place the Treeview.
         self.act_students_tree.pack(fill=tk.BOTH, expand=True, pady=5)
         # Bind the selection event (single click) to the 'on_enrolled_student_select' method.
@@ -95,12 +110,22 @@ class StaffFrame(ttk.Frame):
         # --- Widgets within the Left Frame of Students Tab ---
         # Label for the main student list.
         ttk.Label(student_list_frame, text="All Students:", font=("Arial", 12)).pack(anchor=tk.NW)
+        # Filter bar, e.g. "year_level=10 house=Bradman enrolment_count=0" (see query.py for the syntax).
+        st_filter_frame = ttk.Frame(student_list_frame)
+        st_filter_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(st_filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.st_filter_entry = ttk.Entry(st_filter_frame)
+        self.st_filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        # Pressing Enter in the filter box applies it.
+        self.st_filter_entry.bind("<Return>", lambda event: self.refresh_students())
+        ttk.Button(st_filter_frame, text="Apply", command=self.refresh_students).pack(side=tk.LEFT)
+        ttk.Button(st_filter_frame, text="Clear", command=self.clear_student_filter).pack(side=tk.LEFT, padx=(5, 0))
         # Define columns for the all students Treeview.
         columns_st = ("student_id", "name", "year", "house", "num_activities")
         # Create the Treeview widget. Set a larger height.
         self.st_tree = ttk.Treeview(student_list_frame, columns=columns_st, show="headings", height=20)
         # Configure its columns.
-        self.setup_treeview_columns(self.st_tree, columns_st, {"student_id": 80, "year": 60, "house": 80, "num_activities": 100})
+        self.st_sorter = self.setup_treeview_columns(self.st_tree, columns_st, {"student_id": 80, "year": 60, "house": 80, "num_activities": 100})
         # Place the Treeview.
         self.st_tree.pack(fill=tk.BOTH, expand=True, pady=5)
         # Bind the Double-Click event (<Double-1>) to the 'on_student_double_click' method.
@@ -118,65 +143,146 @@ class StaffFrame(ttk.Frame):
         self.info_label_st = ttk.Label(self.student_info_frame_st, text="Double-click a student in the list to view details.", justify=tk.LEFT, wraplength=350, padding=10)
         # Place the label.
         self.info_label_st.pack(fill=tk.BOTH, expand=True, anchor=tk.NW)
+        # Button for recording a fee payment for the student being shown.
+        self.payment_button = ttk.Button(self.student_info_frame_st, text="Record Payment", state=tk.DISABLED, command=self.record_student_payment)
+        self.payment_button.pack(pady=10, anchor=tk.SW)
+        # ID of the student whose details are shown (None until one is double-clicked).
+        self.info_student_id = None
+
+        # --- Attendance Tab ---
+        # Create a frame for marking the roll and add it as the third tab.
+        self.attendance_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(self.attendance_tab, text="Attendance")
+
+        # Row of drop-down lists for choosing the activity and the session date.
+        att_select_frame = ttk.Frame(self.attendance_tab)
+        att_select_frame.pack(fill=tk.X)
+        ttk.Label(att_select_frame, text="Activity:").pack(side=tk.LEFT, padx=(0, 5))
+        # 'readonly' stops staff typing values that aren't in the list.
+        self.att_activity_combo = ttk.Combobox(att_select_frame, state="readonly", width=30)
+        self.att_activity_combo.pack(side=tk.LEFT, padx=5)
+        self.att_activity_combo.bind("<<ComboboxSelected>>", self.on_attendance_activity_select)
+        ttk.Label(att_select_frame, text="Session:").pack(side=tk.LEFT, padx=(15, 5))
+        self.att_session_combo = ttk.Combobox(att_select_frame, state="readonly", width=14)
+        self.att_session_combo.pack(side=tk.LEFT, padx=5)
+        self.att_session_combo.bind("<<ComboboxSelected>>", self.on_attendance_session_select)
+
+        # Treeview listing the enrolled students and whether they are present.
+        cols_att = ("student_id", "name", "present", "attendance_rate")
+        self.att_tree = ttk.Treeview(self.attendance_tab, columns=cols_att, show="headings", height=15)
+        self.att_sorter = self.setup_treeview_columns(self.att_tree, cols_att, {"student_id": 80, "present": 80, "attendance_rate": 120})
+        self.att_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        # Double-clicking a student (or pressing Space) toggles them between present and absent.
+        self.att_tree.bind("<Double-1>", self.toggle_attendance)
+        self.att_tree.bind("<space>", self.toggle_attendance)
+
+        # Label showing the overall attendance rate for the chosen activity.
+        self.att_rate_label = ttk.Label(self.attendance_tab, text="Choose an activity and session to take the roll.")
+        self.att_rate_label.pack(anchor=tk.W)
+
+        # Buttons for marking, saving and exporting.
+        att_btn_frame = ttk.Frame(self.attendance_tab)
+        att_btn_frame.pack(pady=10, anchor=tk.SW)
+        ttk.Button(att_btn_frame, text="Mark All Present", command=lambda: self.set_all_attendance("Yes")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(att_btn_frame, text="Mark All Absent", command=lambda: self.set_all_attendance("No")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(att_btn_frame, text="Save Roll", command=self.save_roll).pack(side=tk.LEFT, padx=5)
+        ttk.Button(att_btn_frame, text="Export Attendance CSV", command=self.export_attendance).pack(side=tk.LEFT, padx=5)
+
+        # --- Today Tab ---
+        # Create a frame listing the activities with a session today.
+        self.today_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(self.today_tab, text="Today")
+        self.today_label = ttk.Label(self.today_tab, text="", font=("Arial", 12))
+        self.today_label.pack(anchor=tk.NW)
+        cols_today = ("activity_id", "activity", "time", "location", "teacher", "enrollments")
+        self.today_tree = ttk.Treeview(self.today_tab, columns=cols_today, show="headings", height=15)
+        self.today_sorter = self.setup_treeview_columns(self.today_tree, cols_today, {"activity_id": 80, "enrollments": 100, "time": 140})
+        self.today_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        ttk.Button(self.today_tab, text="Refresh Today", command=self.refresh_today).pack(pady=10, anchor=tk.SW)
 
         # --- Initial Data Population ---
         # Call the refresh methods to load data into the Treeviews when the StaffFrame is created.
         self.refresh_activities()
         self.refresh_students()
+        self.refresh_attendance_activities()
+        self.refresh_today()
 
     # --- Helper Method ---
     # Method to configure the columns of a Treeview widget (reused for all trees).
     def setup_treeview_columns(self, tree, cols, widths=None):
-        """Helper to configure Treeview columns."""
+        """Helper to configure Treeview columns. Returns the SortableTree used to fill the tree."""
         widths = widths or {} # Default to empty dict if no widths provided
         for col in cols:
             # Set column heading text (replace underscores, capitalize).
             tree.heading(col, text=col.replace("_", " ").title())
             # Set column width (use provided or default), align content left (West).
             tree.column(col, width=widths.get(col, 120), anchor=tk.W) # Default width 120
+        # Clicking a heading sorts by that column. Rows must be added through the returned sorter.
+        return SortableTree(tree, cols)
 
     # --- Refresh Methods ---
     # Method to reload data for the Activities tab (activity list).
     def refresh_activities(self):
         """Reload data for the activities tree and clear student list/details."""
-        # Clear existing items from the activity tree.
-        self.act_tree.delete(*self.act_tree.get_children())
-        # Access the global 'activities' and 'students' dictionaries from common.py.
-        # Sort activities by ID for consistent order.
-        sorted_activities = sorted(activities.items()) # Sort by ID
-
-        # Loop through each activity.
-        for act_id, data in sorted_activities:
-            # Count enrollments for this activity by checking the 'students' dictionary.
-            enroll_count = sum(1 for s in students.values() if act_id in s.get("activities_enrolled", []))
-            # Insert the activity data into the activity tree.
-            self.act_tree.insert("", tk.END, values=(act_id, data.get("activity", "N/A"), enroll_count))
+        # Build the rows for every activity (row ID -> values).
+        rows = {}
+        for act_id, data in activities.items():
+            # Count enrollments for this activity using the enrolment index.
+            enroll_count = len(get_enrolled_students(act_id))
+            rows[act_id] = (act_id, data.get("activity", "N/A"), enroll_count)
+        # Only new, changed or removed rows are updated; the list keeps its current sort order.
+        self.act_sorter.sync(rows)
 
         # Clear the enrolled students tree associated with the activities tab.
-        self.act_students_tree.delete(*self.act_students_tree.get_children())
+        self.act_students_sorter.clear()
         # Reset the student details label in the right panel of the activities tab.
         self.student_info_label_act.config(text="Select an activity, then select a student from the 'Enrolled Students' list.")
 
+    # Method called when the data file was changed outside the program (see data_watcher.py).
+    def refresh_after_reload(self, changes):
+        """Refresh only the tabs that show the kinds of records that changed."""
+        if changes["activity"] or changes["student"]:
+            self.refresh_activities()
+            self.refresh_today()
+        if changes["student"]:
+            self.refresh_students()
+        if changes["activity"]:
+            self.refresh_attendance_activities()
+
     # Method to reload data for the Students tab (all students list).
     def refresh_students(self):
         """Reload data for the main student list."""
-        # Clear existing items from the main student list tree.
-        self.st_tree.delete(*self.st_tree.get_children())
-        # Access the global 'students' dictionary from common.py.
-        # Sort students by ID.
-        sorted_students = sorted(students.items()) # Sort by ID
-
-        # Loop through each student.
-        for s_id, s_data in sorted_students:
+        # Work out which students to show. With a filter, the query API returns just the matching IDs.
+        filter_text = self.st_filter_entry.get().strip()
+        if filter_text:
+            try:
+                student_ids = run_query("student", filter_text)
+            except QueryError as e:
+                messagebox.showerror("Filter Error", str(e))
+                return
+        else:
+            student_ids = students.keys()
+
+        # Build the rows for the students to show (row ID -> values).
+        rows = {}
+        for s_id in student_ids:
+            s_data = students.get(s_id, {})
             # Construct the full name.
             fullname = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
             # Count the number of activities the student is enrolled in.
             num_act = len(s_data.get("activities_enrolled", []))
-            # Insert the student data into the main student tree.
-            self.st_tree.insert("", tk.END, values=(s_id, fullname, s_data.get("year_level", "N/A"), s_data.get("house", "N/A"), num_act))
+            rows[s_id] = (s_id, fullname, s_data.get("year_level", "N/A"), s_data.get("house", "N/A"), num_act)
+        # Only new, changed or removed rows are updated; the list keeps its current sort order.
+        self.st_sorter.sync(rows)
         # Reset the student details label in the right panel of the students tab.
         self.info_label_st.config(text="Double-click a student in the list to view details.")
 
+    # Method to remove the student filter and show everyone again.
+    def clear_student_filter(self):
+        """Clear the filter box and reload the full student list."""
+        self.st_filter_entry.delete(0, tk.END)
+        self.refresh_students()
+
     # --- Event Handlers ---
     # Method called when an activity is selected in the 'act_tree' (Activities Tab).
     def on_activity_select(self, event):
@@ -192,24 +298,20 @@ class StaffFrame(ttk.Frame):
             # Get the activity ID (first value) and convert to integer.
             activity_id = int(item_vals[0])
             # Clear the 'Enrolled Students' tree ('act_students_tree').
-            self.act_students_tree.delete(*self.act_students_tree.get_children())
+            self.act_students_sorter.clear()
             # Update the details label to prompt selection from the student list.
             self.student_info_label_act.config(text="Select a student from the list above.")
 
             enrolled_count = 0
-            # Access the global 'students' dictionary.
-            # Sort students by ID before iterating.
-            sorted_students_view = sorted(students.items()) # Sort students
-            # Loop through all students to find those enrolled in the selected activity.
-            for s_id, s_data in sorted_students_view:
-                # Check if the activity_id is in the student's enrollment list.
-                if activity_id in s_data.get("activities_enrolled", []):
-                    # Construct name and get year level.
-                    name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
-                    year = s_data.get("year_level", 'N/A')
-                    # Insert the enrolled student into the 'act_students_tree'.
-                    self.act_students_tree.insert("", tk.END, values=(s_id, name, year))
-                    enrolled_count += 1
+            # Use the enrolment index to visit only the students enrolled in the selected activity.
+            for s_id in get_enrolled_students(activity_id):
+                s_data = students.get(s_id, {})
+                # Construct name and get year level.
+                name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
+                year = s_data.get("year_level", 'N/A')
+                # Insert the enrolled student in its sorted position in the 'act_students_tree'.
+                self.act_students_sorter.insert((s_id, name, year), s_id)
+                enrolled_count += 1
             # If no students were found, update the details label.
             if enrolled_count == 0:
                  self.student_info_label_act.config(text="No students enrolled in this activity.")
@@ -261,8 +363,145 @@ class StaffFrame(ttk.Frame):
             student_id = int(item_vals[0])
             # Use 'format_student_info' (from common.py) to get formatted details.
             info = format_student_info(student_id)
+            # Add the running fee balance from the ledger (no history needs adding up).
+            info += f"\n\nFee balance: {format_cents(balance(student_id))}"
             # Update the details label ('info_label_st') in the right frame of the Students tab.
             self.info_label_st.config(text=info)
+            self.info_student_id = student_id
+            self.payment_button.config(state=tk.NORMAL)
         except (ValueError, IndexError):
             # Handle errors.
-            self.info_label_st.config(text="Could not retrieve student details.")
\ No newline at end of file
+            self.info_label_st.config(text="Could not retrieve student details.")
+
+    # Method called when the "Record Payment" button is clicked.
+    def record_student_payment(self):
+        """Ask for a payment amount and record it in the fee ledger for the student being shown."""
+        if self.info_student_id is None:
+            return
+        amount = simpledialog.askfloat("Record Payment", f"Amount paid by student {self.info_student_id} ($):", minvalue=0.01, parent=self)
+        if amount is None:
+            return  # Cancelled.
+        try:
+            record_payment(self.info_student_id, round(amount * 100))
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Payment Error", f"Could not record the payment: {e}")
+            return
+        # Show the updated balance.
+        self.info_label_st.config(text=f"{format_student_info(self.info_student_id)}\n\nFee balance: {format_cents(balance(self.info_student_id))}")
+
+    # Method to reload the "Today" tab.
+    def refresh_today(self):
+        """List the activities that have a session today, in start-time order."""
+        self.today_sorter.clear()
+        # The calendar index only looks at activities running on today's weekday, so this stays fast.
+        running = activities_running_today()
+        self.today_label.config(text=f"{today().strftime('%A %d/%m/%Y')}: {len(running)} activit{'y' if len(running) == 1 else 'ies'} running")
+        for act_id in running:
+            data = activities.get(act_id, {})
+            self.today_sorter.insert((act_id, data.get("activity", "N/A"), data.get("time", "N/A"),
+                                      data.get("location", "N/A"), teacher_display_name(data.get("teacher_id")),
+                                      len(get_enrolled_students(act_id))), act_id)
+
+    # --- Attendance Tab Methods ---
+    # Method to fill the activity drop-down on the Attendance tab.
+    def refresh_attendance_activities(self):
+        """Load the list of activities into the attendance activity drop-down."""
+        # Each entry shows the ID and name, e.g. "2001 - Basketball". The ID is read back from the start.
+        self.att_activity_combo["values"] = [f"{act_id} - {data.get('activity', 'N/A')}" for act_id, data in sorted(activities.items())]
+        self.att_session_combo.set("")
+        self.att_sorter.clear()
+
+    # Helper to read the activity ID from the activity drop-down.
+    def get_attendance_activity_id(self):
+        """Return the ID of the activity chosen on the Attendance tab, or None."""
+        try:
+            return int(self.att_activity_combo.get().split(" - ", 1)[0])
+        except ValueError:
+            return None
+
+    # Method called when an activity is chosen on the Attendance tab.
+    def on_attendance_activity_select(self, event=None):
+        """List the activity's sessions and pre-select the most recent one."""
+        activity_id = self.get_attendance_activity_id()
+        if activity_id is None:
+            return
+        # Only sessions up to today can be marked. If the activity hasn't started, show all its sessions.
+        sessions = get_sessions(activity_id, until=today()) or get_sessions(activity_id)
+        self.att_session_combo["values"] = [format_date(d) for d in sessions]
+        if sessions:
+            self.att_session_combo.set(format_date(sessions[-1]))
+            self.on_attendance_session_select()
+        else:
+            self.att_session_combo.set("")
+            self.att_sorter.clear()
+            self.att_rate_label.config(text="This activity has no sessions (check its days and dates).")
+
+    # Method called when a session date is chosen (or after choosing an activity).
+    def on_attendance_session_select(self, event=None):
+        """Show the enrolled students with their attendance for the chosen session."""
+        activity_id = self.get_attendance_activity_id()
+        session_date = parse_date(self.att_session_combo.get())
+        if activity_id is None or session_date is None:
+            return
+        self.att_sorter.clear()
+        marked = is_session_marked(activity_id, session_date)
+        present_ids = get_session_attendance(activity_id, session_date)
+        for s_id in get_enrolled_students(activity_id):
+            s_data = students.get(s_id, {})
+            name = f"{s_data.get('firstname', '')} {s_data.get('surname', '')}"
+            # A session with no roll yet defaults everyone to present, which is quicker to correct.
+            present = "Yes" if (s_id in present_ids or not marked) else "No"
+            rate = student_attendance_rate(s_id, activity_id)
+            rate_text = f"{rate:.0%}" if rate is not None else "N/A"
+            self.att_sorter.insert((s_id, name, present, rate_text), s_id)
+        self.update_attendance_rate_label(activity_id, marked)
+
+    # Helper to show the activity's overall attendance rate.
+    def update_attendance_rate_label(self, activity_id, marked):
+        """Update the summary label under the attendance list."""
+        rate = activity_attendance_rate(activity_id)
+        rate_text = f"{rate:.0%}" if rate is not None else "no rolls taken yet"
+        status = "Roll already taken (saving will replace it)." if marked else "Roll not yet taken."
+        self.att_rate_label.config(text=f"{status} Activity attendance rate: {rate_text}")
+
+    # Method to flip a student between present and absent.
+    def toggle_attendance(self, event=None):
+        """Toggle the 'Present' value of the selected students."""
+        # Changes go through the sorter so the list stays correctly sorted by the 'Present' column.
+        for item in self.att_tree.selection():
+            self.att_sorter.set_value(item, "present", "No" if self.att_tree.set(item, "present") == "Yes" else "Yes")
+
+    # Method to mark every listed student present or absent at once.
+    def set_all_attendance(self, value):
+        """Set the 'Present' value for every student in the attendance list."""
+        for item in self.att_tree.get_children():
+            self.att_sorter.set_value(item, "present", value)
+
+    # Method called when the "Save Roll" button is clicked.
+    def save_roll(self):
+        """Save the attendance shown in the list for the chosen session."""
+        activity_id = self.get_attendance_activity_id()
+        session_date = parse_date(self.att_session_combo.get())
+        if activity_id is None or session_date is None:
+            messagebox.showinfo("Attendance", "Please choose an activity and a session first.")
+            return
+        # The Treeview item IDs are the student IDs (set when the rows were inserted).
+        present_ids = {int(item) for item in self.att_tree.get_children() if self.att_tree.set(item, "present") == "Yes"}
+        mark_session(activity_id, session_date, present_ids)
+        messagebox.showinfo("Attendance", f"Roll saved for {self.att_session_combo.get()}.")
+        # Reload the list so the rates include the roll just saved.
+        self.on_attendance_session_select()
+
+    # Method called when the "Export Attendance CSV" button is clicked.
+    def export_attendance(self):
+        """Export every recorded attendance to a CSV file chosen by the user."""
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], initialfile="attendance.csv")
+        # The user cancelled the dialog.
+        if not path:
+            return
+        try:
+            rows = export_attendance_csv(path)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to export attendance: {e}")
+            return
+        messagebox.showinfo("Export Complete", f"Exported {rows} attendance record(s) to {path}.")
@@ -1,12 +1,22 @@
 # Import tkinter library for GUI elements
 import tkinter as tk
 # Import themed widgets (ttk) and message boxes from tkinter
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 
 # Import shared data dictionaries (activities, students, USERS, teachers)
 # and the save_data function from the common.py file.
 # 'save_data' is needed here because students can join/leave clubs, modifying the 'students' data.
-from common import activities, students, USERS, teachers, save_data
+from common import activities, students, USERS, teachers, save_data, enrol_student, unenrol_student, format_club_details
+# Import the helper that makes Treeview columns sortable by clicking their headings.
+from sortable_tree import SortableTree
+# Import the co-enrolment recommendations used to rank the Available Clubs tab.
+from recommendations import available_activities, recommend, describe_reason
+# Import the preference round helpers (ranked choices for activities whose seats are allocated).
+from allocation import is_preference_activity, get_preferences, set_preferences, MAX_PREFERENCES
+# Import the fee ledger so joining and leaving charge and credit fees automatically.
+import ledger
+# Import the calendar feed writer for the "Export Calendar" button.
+from calendar_feeds import write_student_feed
 
 # Define the StudentFrame class, inheriting from ttk.Frame.
 # This class represents the main panel for the student view.
@@ -53,11 +63,13 @@ class StudentFrame(ttk.Frame):
         # Create the Treeview widget to list clubs the student is enrolled in.
         self.my_clubs_tree = ttk.Treeview(self.my_clubs_tab, columns=columns, show="headings", height=15)
         # Configure the columns using the helper method.
-        self.setup_treeview_columns(self.my_clubs_tree, columns, {"club_id": 80})
+        self.my_clubs_sorter = self.setup_treeview_columns(self.my_clubs_tree, columns, {"club_id": 80})
         # Place the Treeview within the tab frame.
         self.my_clubs_tree.pack(fill=tk.BOTH, expand=True)
         # Bind the selection event (single click) to the 'on_my_club_select' method.
         self.my_clubs_tree.bind("<<TreeviewSelect>>", self.on_my_club_select)
+        # Add a button that saves the student's clubs as a calendar file for their phone or computer.
+        ttk.Button(self.my_clubs_tab, text="Export Calendar", command=self.export_calendar).pack(anchor=tk.W, pady=(5, 0))
 
         # --- "Available Clubs" Tab ---
         # Create a frame for the "Available Clubs" tab content.
@@ -65,15 +77,36 @@ class StudentFrame(ttk.Frame):
         # Add this frame to the notebook as a tab.
         self.notebook.add(self.available_clubs_tab, text="Available Clubs")
         # Create the Treeview widget to list clubs the student can join.
-        # Uses the same column definition as "My Clubs".
-        self.available_clubs_tree = ttk.Treeview(self.available_clubs_tab, columns=columns, show="headings", height=15)
+        # It has the "My Clubs" columns plus the recommendation rank and the club that led to it.
+        available_columns = columns + ("rank", "because_you_joined")
+        self.available_clubs_tree = ttk.Treeview(self.available_clubs_tab, columns=available_columns, show="headings", height=15)
         # Configure the columns.
-        self.setup_treeview_columns(self.available_clubs_tree, columns, {"club_id": 80})
+        self.available_clubs_sorter = self.setup_treeview_columns(self.available_clubs_tree, available_columns, {"club_id": 80, "rank": 60})
+        # Show the best suggestions first (the student can still click another heading to re-sort).
+        self.available_clubs_sorter.sort_by("rank")
+        # Club ID -> the club that led to it being recommended (shown in the details panel).
+        self.recommendation_reasons = {}
         # Place the Treeview within the tab frame.
         self.available_clubs_tree.pack(fill=tk.BOTH, expand=True)
         # Bind the selection event (single click) to the 'on_available_club_select' method.
         self.available_clubs_tree.bind("<<TreeviewSelect>>", self.on_available_club_select)
 
+        # --- "My Preferences" Tab ---
+        # Activities in a preference round can't be joined straight away. Students rank up to
+        # MAX_PREFERENCES of them here and seats are given out later by the admin's allocation run.
+        self.preferences_tab = ttk.Frame(self.notebook, padding=5)
+        self.notebook.add(self.preferences_tab, text="My Preferences")
+        pref_columns = ("rank", "club_id", "club_name")
+        self.preferences_tree = ttk.Treeview(self.preferences_tab, columns=pref_columns, show="headings", height=12)
+        self.preferences_sorter = self.setup_treeview_columns(self.preferences_tree, pref_columns, {"rank": 60, "club_id": 80})
+        self.preferences_tree.pack(fill=tk.BOTH, expand=True)
+        # Buttons for re-ordering and removing the selected preference.
+        pref_buttons = ttk.Frame(self.preferences_tab)
+        pref_buttons.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(pref_buttons, text="Move Up", command=lambda: self.move_preference(-1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pref_buttons, text="Move Down", command=lambda: self.move_preference(1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pref_buttons, text="Remove", command=self.remove_preference).pack(side=tk.LEFT, padx=5)
+
         # --- Right Panel: Club Details and Action Button ---
         # Create the right frame. Add padding and a visual border.
         right_frame = ttk.Frame(main_frame, padding=10, relief=tk.GROOVE, borderwidth=1)
@@ -132,110 +165,97 @@ class StudentFrame(ttk.Frame):
     # --- Helper Method ---
     # Method to configure Treeview columns (reused for both club trees).
     def setup_treeview_columns(self, tree, cols, widths=None):
-        """Helper to configure Treeview columns."""
+        """Helper to configure Treeview columns. Returns the SortableTree used to fill the tree."""
         widths = widths or {}
         for col in cols:
             tree.heading(col, text=col.replace("_", " ").title()) # Format heading text
             tree.column(col, width=widths.get(col, 150), anchor=tk.W) # Set width (default 150), align left
+        # Clicking a heading sorts by that column. Rows must be added through the returned sorter.
+        return SortableTree(tree, cols)
 
     # --- UI Update Methods ---
     # Method to reload data in both the "My Clubs" and "Available Clubs" tabs.
     def refresh_tabs(self):
         """Reload the 'My Clubs' and 'Available Clubs' lists."""
-        # Clear existing items from both Treeviews.
-        self.my_clubs_tree.delete(*self.my_clubs_tree.get_children())
-        self.available_clubs_tree.delete(*self.available_clubs_tree.get_children())
+        # Rows for each Treeview (row ID -> values), applied at the end so unchanged rows aren't redrawn.
+        my_rows = {}
+        available_rows = {}
 
         # Access global 'students' and 'activities' dictionaries from common.py.
         # Get the current student's data.
         student_data = students.get(self.student_id, {})
         # Get the set of IDs of clubs the student is currently enrolled in. Using a set is efficient for checking membership ('in').
         enrolled_ids = set(student_data.get("activities_enrolled", []))
-        # Get the student's year level for eligibility checks.
-        student_year = student_data.get("year_level")
-
-        # Get all activities and sort them by ID for consistent display order.
-        sorted_activities = sorted(activities.items())
-
-        # Iterate through all available activities in the school.
-        for club_id, club_data in sorted_activities:
-            club_name = club_data.get("activity", "Unknown Club")
-            # Get the year level requirement string for the club (e.g., "9-10", "7-12", "11", "N/A").
-            allowed_years_str = club_data.get("year_level", "N/A")
-
-            # --- Eligibility Check ---
-            is_eligible = False # Assume not eligible initially
-            # Only perform check if student year level is known and club has a requirement.
-            if student_year is not None and allowed_years_str != "N/A":
-                try:
-                    # Handle different formats of year level strings:
-                    if "all" in allowed_years_str.lower() or allowed_years_str == "7-12":
-                        is_eligible = True # Eligible for all years
-                    elif "-" in allowed_years_str: # Range format (e.g., "9-10")
-                        min_year, max_year = map(int, allowed_years_str.split('-'))
-                        if min_year <= student_year <= max_year:
-                            is_eligible = True
-                    elif "," in allowed_years_str: # List format (e.g., "7, 9, 11")
-                         allowed_years = [int(y.strip()) for y in allowed_years_str.split(',')]
-                         if student_year in allowed_years:
-                             is_eligible = True
-                    else: # Single year format (e.g., "10")
-                         if int(allowed_years_str) == student_year:
-                            is_eligible = True
-                except ValueError:
-                    # If the year level string is malformed (e.g., "Year 9"), print a warning.
-                    # Decide how to handle this: currently defaults to eligible.
-                    print(f"Warning: Could not parse year level '{allowed_years_str}' for club {club_id}")
-                    is_eligible = True # Default to eligible if parse fails? Or False? Let's stick to True for now.
-            elif allowed_years_str == "N/A": # If no year level is specified for the club
-                 is_eligible = True # Assume eligible
-
-            # --- Populate Trees ---
-            # Check if the student is already enrolled in this club.
-            if club_id in enrolled_ids:
-                # If enrolled, add it to the "My Clubs" tree.
-                self.my_clubs_tree.insert("", tk.END, values=(club_id, club_name))
-            # If not enrolled BUT eligible based on year level check.
-            elif is_eligible:
-                # Add it to the "Available Clubs" tree.
-                self.available_clubs_tree.insert("", tk.END, values=(club_id, club_name))
+
+        # --- "My Clubs" Rows ---
+        for club_id in enrolled_ids:
+            if club_id in activities:
+                my_rows[club_id] = (club_id, activities[club_id].get("activity", "Unknown Club"))
+
+        # --- "Available Clubs" Rows ---
+        # Clubs the student is eligible for (year level), that haven't ended and don't clash with their
+        # current clubs, ranked by how often students in the same clubs also joined them.
+        self.recommendation_reasons = {}
+        for rank, (club_id, score, reason_id) in enumerate(recommend(self.student_id, available_activities(self.student_id)), start=1):
+            self.recommendation_reasons[club_id] = reason_id
+            reason_name = activities.get(reason_id, {}).get("activity", "") if reason_id is not None else ""
+            available_rows[club_id] = (club_id, activities[club_id].get("activity", "Unknown Club"), rank, reason_name)
+
+        # Update both lists; each keeps whichever column the student last sorted by.
+        self.my_clubs_sorter.sync(my_rows)
+        self.available_clubs_sorter.sync(available_rows)
+        self.refresh_preferences()
 
         # After refreshing lists, clear the details panel and reset the action button.
         self.clear_details()
 
+    # Method called when the data file was changed outside the program (see data_watcher.py).
+    def refresh_after_reload(self, changes):
+        """Refresh the club lists with reloaded changes."""
+        # Other students' enrolments change the recommendations, so any student change counts.
+        if changes["activity"] or changes["student"]:
+            self.refresh_tabs()
+
+    # Method to reload the "My Preferences" list.
+    def refresh_preferences(self):
+        """Show the student's ranked preferences."""
+        rows = {}
+        for rank, club_id in enumerate(get_preferences(self.student_id), start=1):
+            rows[club_id] = (rank, club_id, activities.get(club_id, {}).get("activity", "Unknown Club"))
+        self.preferences_sorter.sync(rows)
+
+    # Method to move the selected preference up (-1) or down (+1) the ranking.
+    def move_preference(self, step):
+        """Swap the selected preference with its neighbour and save the new order."""
+        selection = self.preferences_tree.selection()
+        if not selection:
+            return
+        # The row IDs are the club IDs.
+        club_id = int(selection[0])
+        ranked = get_preferences(self.student_id)
+        index = ranked.index(club_id)
+        if 0 <= index + step < len(ranked):
+            ranked[index], ranked[index + step] = ranked[index + step], ranked[index]
+            set_preferences(self.student_id, ranked)
+            self.refresh_preferences()
+
+    # Method to take the selected club off the student's preferences.
+    def remove_preference(self):
+        """Remove the selected preference and save."""
+        selection = self.preferences_tree.selection()
+        if not selection:
+            return
+        set_preferences(self.student_id, [c for c in get_preferences(self.student_id) if c != int(selection[0])])
+        self.refresh_preferences()
+
     # Method to display the details of a selected club in the right panel's Text widget.
-    def display_club_details(self, club_id):
-        """Show details of the selected club in the text area."""
-        # Access global 'activities' and 'teachers' dictionaries from common.py.
-        # Get the data for the selected club ID.
-        club = activities.get(club_id)
-        # If the club ID doesn't exist (e.g., data inconsistency), show an error message.
-        if not club:
-            details = "Club details not found."
-        else:
-            # If club data exists, format the details into a list of strings.
-            details_list = [
-                f"Name: {club.get('activity', 'N/A')}",
-                f"Year Level(s): {club.get('year_level', 'N/A')}",
-                f"Location: {club.get('location', 'N/A')}",
-                f"Schedule: {club.get('days', 'N/A')} at {club.get('time', 'N/A')}",
-                f"Cost: ${club.get('cost', 0)}",
-                f"Dates: {club.get('start_date', 'N/A')} to {club.get('end_date', 'N/A')}"
-            ]
-            # Get the teacher ID associated with the club.
-            teacher_id = club.get("teacher_id")
-            teacher_info_str = "Teacher: N/A" # Default string
-            # If there is a teacher ID and that ID exists in the 'teachers' dictionary.
-            if teacher_id and teacher_id in teachers:
-                # Get the teacher's data.
-                t_data = teachers[teacher_id]
-                # Format the teacher's name (including title).
-                teacher_info_str = f"Teacher: {t_data.get('title','')} {t_data.get('firstname','')} {t_data.get('surname','')}"
-            # Add the teacher information string to the details list.
-            details_list.append(teacher_info_str)
-
-            # Join the list of detail strings into a single multi-line string.
-            details = "\n".join(details_list)
+    def display_club_details(self, club_id, note=""):
+        """Show details of the selected club in the text area, followed by an optional note."""
+        # Get the formatted details from common.py. The text is cached, so moving quickly
+        # through the list doesn't rebuild it (or look up the teacher) on every click.
+        details = format_club_details(club_id)
+        if note:
+            details = f"{details}\n\n{note}"
 
         # Update the Text widget with the details.
         self.club_details_text.config(state=tk.NORMAL)    # Temporarily enable writing to the widget.
@@ -260,6 +280,10 @@ class StudentFrame(ttk.Frame):
         elif action_type == 'join':
             button_text = "Join Club"
             button_state = tk.NORMAL # Enable the button
+        elif action_type == 'prefer':
+            # Seats in this club are allocated from students' ranked preferences.
+            button_text = "Remove from Preferences" if club_id in get_preferences(self.student_id) else "Add to Preferences"
+            button_state = tk.NORMAL
         # Placeholder for a potential 'contact' action in the future.
         # elif action_type == 'contact':
         #     button_text = "Contact Teacher"
@@ -269,6 +293,20 @@ class StudentFrame(ttk.Frame):
         self.action_button.config(text=button_text, state=button_state)
 
     # --- Event Handlers ---
+    # Method called when the "Export Calendar" button is clicked.
+    def export_calendar(self):
+        """Save the student's clubs as an iCalendar (.ics) file."""
+        path = filedialog.asksaveasfilename(title="Export Calendar", defaultextension=".ics",
+                                            initialfile="my_clubs.ics", filetypes=[("Calendar files", "*.ics")])
+        if not path:
+            return
+        try:
+            write_student_feed(self.student_id, path)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Failed to write '{path}': {e}")
+            return
+        messagebox.showinfo("Export Calendar", f"Your clubs were saved to {path}.\nOpen it with your calendar app to add them.")
+
     # Method called when a club is selected in the "My Clubs" Treeview.
     def on_my_club_select(self, event):
         """Handle selection in the 'My Clubs' list."""
@@ -312,10 +350,17 @@ class StudentFrame(ttk.Frame):
             try:
                 # Extract the club ID and convert to integer.
                 club_id = int(item_vals[0])
-                # Display the details for this club ID.
-                self.display_club_details(club_id)
-                # Update the action button to show "Join Club" and enable it.
-                self.update_action_button(club_id, 'join')
+                # Display the details for this club ID, with the reason it was recommended.
+                note = describe_reason(club_id, self.recommendation_reasons.get(club_id))
+                if is_preference_activity(club_id):
+                    # Clubs in a preference round are ranked, not joined directly.
+                    note = (note + "\n\n" if note else "") + "Places in this club are allocated from students' ranked preferences."
+                    self.display_club_details(club_id, note)
+                    self.update_action_button(club_id, 'prefer')
+                else:
+                    self.display_club_details(club_id, note)
+                    # Update the action button to show "Join Club" and enable it.
+                    self.update_action_button(club_id, 'join')
             except (ValueError, IndexError):
                 # If errors occur, clear the details panel.
                 self.clear_details()
@@ -355,8 +400,12 @@ class StudentFrame(ttk.Frame):
         if action == 'join':
             # Check if the student is NOT already enrolled.
             if club_id not in enrolled_list:
-                # Add the club ID to the student's enrollment list.
-                enrolled_list.append(club_id)
+                # Add the club ID to the student's enrollment list (this also updates the enrolment index).
+                # It is refused if every seat has been taken since the list was shown.
+                if not enrol_student(self.student_id, club_id):
+                    messagebox.showinfo("Club Full", f"Sorry, '{club_name}' is full.")
+                    self.refresh_tabs()
+                    return
                 # Show a success message.
                 messagebox.showinfo("Success", f"You have joined '{club_name}'.")
                 # --- Save Changes ---
@@ -368,13 +417,26 @@ class StudentFrame(ttk.Frame):
             else:
                 # If already enrolled, just inform the user.
                 messagebox.showinfo("Info", f"You are already enrolled in '{club_name}'.")
+        elif action == 'prefer':
+            # Add the club to the end of the ranking, or take it off if it's already there.
+            ranked = get_preferences(self.student_id)
+            if club_id in ranked:
+                ranked.remove(club_id)
+            elif len(ranked) >= MAX_PREFERENCES:
+                messagebox.showinfo("Preferences", f"You can rank at most {MAX_PREFERENCES} clubs. Remove one first.")
+                return
+            else:
+                ranked.append(club_id)
+            set_preferences(self.student_id, ranked)
+            self.refresh_preferences()
+            self.update_action_button(club_id, 'prefer')
         elif action == 'leave':
             # Check if the student IS currently enrolled.
             if club_id in enrolled_list:
                 # Ask for confirmation before leaving the club.
                 if messagebox.askyesno("Confirm Leave", f"Are you sure you want to leave '{club_name}'?"):
-                    # If confirmed, remove the club ID from the list.
-                    enrolled_list.remove(club_id)
+                    # If confirmed, remove the club ID from the list (this also updates the enrolment index).
+                    unenrol_student(self.student_id, club_id)
                     # Show a success message.
                     messagebox.showinfo("Success", f"You have left '{club_name}'.")
                     # --- Save Changes ---
@@ -0,0 +1,197 @@
+# Import tkinter library for GUI elements
+import tkinter as tk
+# Import themed widgets from tkinter
+from tkinter import ttk
+# Import heapq to merge each activity's session dates into one list in date order.
+import heapq
+# Import itertools to stop the merged sessions once enough have been found.
+import itertools
+from datetime import timedelta
+
+# Import shared data and the teacher -> activities index from common.py.
+from common import activities, students, teachers, get_teacher_activities, get_enrolled_students, format_student_info, format_teacher_name
+# Import the parsed schedules and session dates.
+from activity_calendar import get_schedule, iter_sessions, has_ended
+from schedule import today
+# Import the helper that makes Treeview columns sortable by clicking their headings.
+from sortable_tree import SortableTree
+
+# How many days ahead the "Upcoming Sessions" tab looks.
+UPCOMING_DAYS = 14
+
+# --- Teacher Schedules and Workload ---
+# Everything here starts from common.teacher_index, so it only visits the teacher's own activities.
+
+def format_minutes(minutes):
+    """Turns minutes after midnight into a time like '3:30 PM'."""
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+def upcoming_sessions(teacher_id, days=UPCOMING_DAYS, start=None):
+    """Returns a teacher's sessions from 'start' (today by default) for 'days' days as (date, start_minutes, activity_id), in order."""
+    start = start or today()
+    last = start + timedelta(days=days - 1)
+
+    def sessions(act_id):
+        # Each activity's dates come out in order, so heapq.merge can interleave them lazily.
+        times = get_schedule(act_id)["times"]
+        for day in iter_sessions(act_id, first_day=start):
+            yield (day, times[0] if times else 0, act_id)
+
+    merged = heapq.merge(*(sessions(a) for a in sorted(get_teacher_activities(teacher_id))))
+    return list(itertools.takewhile(lambda session: session[0] <= last, merged))
+
+def weekly_minutes(activity_id):
+    """Returns how many minutes a week an activity runs (0 if its days or times aren't known)."""
+    schedule = get_schedule(activity_id)
+    if not schedule["times"]:
+        return 0
+    start, end = schedule["times"]
+    return len(schedule["weekdays"]) * max(end - start, 0)
+
+def teacher_workload(teacher_id, on=None):
+    """Returns a teacher's workload: activities, sessions per week, hours per week and students.
+
+    Activities that have ended by 'on' (today by default) are not counted, only listed as 'ended'.
+    """
+    running = [a for a in get_teacher_activities(teacher_id) if not has_ended(a, on)]
+    return {
+        "teacher_id": teacher_id,
+        "activities": len(running),
+        "ended": len(get_teacher_activities(teacher_id)) - len(running),
+        "sessions_per_week": sum(len(get_schedule(a)["weekdays"]) for a in running),
+        "hours_per_week": sum(weekly_minutes(a) for a in running) / 60,
+        "students": sum(len(get_enrolled_students(a)) for a in running),
+    }
+
+def workload_rows(on=None):
+    """Returns teacher_workload() for every teacher, busiest first."""
+    rows = [teacher_workload(t_id, on) for t_id in teachers]
+    return sorted(rows, key=lambda row: row["hours_per_week"], reverse=True)
+
+# Define the TeacherFrame class, inheriting from ttk.Frame.
+# This class represents the dashboard shown to a teacher, covering only the activities they run.
+class TeacherFrame(ttk.Frame):
+    """Teacher dashboard: the teacher's own activities, their rosters and upcoming sessions."""
+    # Constructor method. 'teacher_id' links the login to a record in 'teachers'.
+    def __init__(self, parent, teacher_id):
+        super().__init__(parent, padding=10)
+        self.teacher_id = teacher_id
+        ttk.Label(self, text=f"Teacher Dashboard - {format_teacher_name(teacher_id)}", font=("Arial", 16, "bold")).pack(anchor=tk.NW, pady=(0, 10))
+
+        # Create a Notebook widget (for tabs).
+        self.notebook = ttk.Notebook(self)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+
+        # --- "My Activities" Tab ---
+        self.activities_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(self.activities_tab, text="My Activities")
+        # Left: the teacher's activities above the selected activity's roster. Right: the selected student's details.
+        list_frame = ttk.Frame(self.activities_tab)
+        list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        details_frame = ttk.Frame(self.activities_tab, relief=tk.GROOVE, borderwidth=1)
+        details_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+
+        ttk.Label(list_frame, text="My Activities:", font=("Arial", 12)).pack(anchor=tk.NW)
+        columns_act = ("activity_id", "activity", "days", "time", "location", "enrolled")
+        self.act_tree = ttk.Treeview(list_frame, columns=columns_act, show="headings", height=8)
+        self.act_sorter = self.setup_treeview_columns(self.act_tree, columns_act, {"activity_id": 70, "days": 90, "enrolled": 70})
+        self.act_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.act_tree.bind("<<TreeviewSelect>>", self.on_activity_select)
+
+        ttk.Label(list_frame, text="Roster:", font=("Arial", 12)).pack(anchor=tk.NW, pady=(10, 0))
+        columns_roster = ("student_id", "name", "year_level")
+        self.roster_tree = ttk.Treeview(list_frame, columns=columns_roster, show="headings", height=8)
+        self.roster_sorter = self.setup_treeview_columns(self.roster_tree, columns_roster, {"student_id": 80, "year_level": 80})
+        self.roster_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.roster_tree.bind("<<TreeviewSelect>>", self.on_student_select)
+
+        ttk.Label(details_frame, text="Student Information", font=("Arial", 14, "bold")).pack(pady=10, anchor=tk.NW)
+        self.student_info_label = ttk.Label(details_frame, text="Select an activity, then a student from its roster.",
+                                            justify=tk.LEFT, wraplength=300, padding=10)
+        self.student_info_label.pack(fill=tk.BOTH, expand=True, anchor=tk.NW)
+
+        # --- "Upcoming Sessions" Tab ---
+        self.upcoming_tab = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(self.upcoming_tab, text="Upcoming Sessions")
+        self.upcoming_label = ttk.Label(self.upcoming_tab, text="")
+        self.upcoming_label.pack(anchor=tk.NW)
+        columns_up = ("date", "start", "activity", "location", "enrolled")
+        self.upcoming_tree = ttk.Treeview(self.upcoming_tab, columns=columns_up, show="headings", height=15)
+        self.upcoming_sorter = self.setup_treeview_columns(self.upcoming_tree, columns_up, {"date": 110, "start": 80, "enrolled": 70})
+        self.upcoming_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        ttk.Button(self, text="Refresh", command=self.refresh_all).pack(anchor=tk.SW, pady=(5, 0))
+        self.refresh_all()
+
+    # --- Helper Method ---
+    # Method to configure the columns of a Treeview widget (reused for all trees).
+    def setup_treeview_columns(self, tree, cols, widths=None):
+        """Helper to configure Treeview columns. Returns the SortableTree used to fill the tree."""
+        widths = widths or {}
+        for col in cols:
+            tree.heading(col, text=col.replace("_", " ").title())
+            tree.column(col, width=widths.get(col, 120), anchor=tk.W)
+        return SortableTree(tree, cols)
+
+    # --- Refresh Methods ---
+    # Method to reload both tabs.
+    def refresh_all(self):
+        """Reload the activity list and the upcoming sessions."""
+        self.refresh_activities()
+        self.refresh_upcoming()
+
+    # Method to reload the "My Activities" list.
+    def refresh_activities(self):
+        """Show the activities this teacher runs (from the teacher index, not a scan of every activity)."""
+        rows = {}
+        for act_id in get_teacher_activities(self.teacher_id):
+            data = activities.get(act_id, {})
+            rows[act_id] = (act_id, data.get("activity", "N/A"), data.get("days", "N/A"), data.get("time", "N/A"),
+                            data.get("location", "N/A"), len(get_enrolled_students(act_id)))
+        self.act_sorter.sync(rows)
+        self.roster_sorter.clear()
+        self.student_info_label.config(text="Select an activity, then a student from its roster.")
+
+    # Method to reload the "Upcoming Sessions" list.
+    def refresh_upcoming(self):
+        """Show this teacher's sessions for the next UPCOMING_DAYS days."""
+        self.upcoming_sorter.clear()
+        sessions = upcoming_sessions(self.teacher_id)
+        self.upcoming_label.config(text=f"{len(sessions)} session(s) in the next {UPCOMING_DAYS} days"
+                                        if sessions else f"No sessions in the next {UPCOMING_DAYS} days.")
+        for i, (day, start, act_id) in enumerate(sessions):
+            data = activities.get(act_id, {})
+            time_text = format_minutes(start) if get_schedule(act_id)["times"] else "N/A"
+            # Dates are shown year first so the column sorts in date order. The row ID is the position,
+            # since an activity has many sessions.
+            self.upcoming_sorter.insert((day.strftime("%Y-%m-%d %a"), time_text, data.get("activity", "N/A"), data.get("location", "N/A"),
+                                         len(get_enrolled_students(act_id))), i)
+
+    # Method called when the data file was changed outside the program (see data_watcher.py).
+    def refresh_after_reload(self, changes):
+        """Refresh the dashboard if any activity or student changed."""
+        if changes["activity"] or changes["student"]:
+            self.refresh_all()
+
+    # --- Event Handlers ---
+    # Method called when an activity is selected in "My Activities".
+    def on_activity_select(self, event):
+        """Show the selected activity's roster."""
+        selection = self.act_tree.selection()
+        if not selection:
+            return
+        activity_id = int(selection[0])
+        rows = {}
+        for s_id in get_enrolled_students(activity_id):
+            s_data = students.get(s_id, {})
+            rows[s_id] = (s_id, f"{s_data.get('firstname', '')} {s_data.get('surname', '')}", s_data.get("year_level", "N/A"))
+        self.roster_sorter.sync(rows)
+        self.student_info_label.config(text="Select a student from the roster." if rows else "No students are enrolled in this activity.")
+
+    # Method called when a student is selected in the roster.
+    def on_student_select(self, event):
+        """Show the selected student's details."""
+        selection = self.roster_tree.selection()
+        if selection:
+            self.student_info_label.config(text=format_student_info(int(selection[0])))
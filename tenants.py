@@ -0,0 +1,249 @@
+# Import json to read the campus list, the data files and the summary files.
+import json
+# Import os to check data file timestamps and build file names.
+import os
+# Import time to record when each campus was last used.
+import time
+# Import argparse to read options when this file is run from the command line.
+import argparse
+# Import sys to set the exit code.
+import sys
+
+# Import common as a module so DATA_FILE can be switched for the campus being used.
+import common
+from common import activities, students, USERS, teachers, install_data
+# Import the helpers that keep per-campus caches separate.
+from activity_calendar import invalidate_calendar
+from attendance import use_attendance_file
+from ledger import use_ledger_file
+from enrolment_history import use_events_file
+
+# --- Multi-Campus Settings ---
+# tenants.json lists each campus and its data file, e.g.
+#   {"Home Campus": "data.json", "Northside": "campuses/northside.json"}
+# Without it the program runs as a single campus using common.DATA_FILE, exactly as before.
+TENANTS_FILE = "tenants.json"
+# Name used for the single campus when there is no tenants.json.
+DEFAULT_TENANT = "default"
+# A campus nobody has used for this many seconds has its data dropped from memory (its summary is kept).
+TENANT_IDLE_SECONDS = 30 * 60
+# Each data file gets a small summary file next to it, used for cross-campus reports.
+SUMMARY_SUFFIX = ".summary.json"
+
+class TenantError(Exception):
+    """Raised when a campus can't be found or its data can't be loaded."""
+
+class TenantContext:
+    """One campus: where its data lives and, while it is loaded, its data dictionaries.
+
+    Only the active campus is in common's globals (the views read those). Other campuses that
+    were used recently keep their dictionaries here until they have been idle for TENANT_IDLE_SECONDS.
+    """
+    def __init__(self, name, data_file):
+        self.name = name
+        self.data_file = data_file
+        # The data file's own attendance file (the original campus keeps attendance.json).
+        root = os.path.splitext(data_file)[0]
+        self.attendance_file = "attendance.json" if data_file == "data.json" else f"{root}_attendance.json"
+        self.ledger_file = "ledger.jsonl" if data_file == "data.json" else f"{root}_ledger.jsonl"
+        self.events_file = "enrolment_events.bin" if data_file == "data.json" else f"{root}_enrolment_events.bin"
+        # (activities, students, USERS, teachers) while loaded but not active, otherwise None.
+        self.stash = None
+        self.last_used = time.monotonic()
+
+    @property
+    def summary_file(self):
+        """Path of the summary file kept next to the data file."""
+        return self.data_file + SUMMARY_SUFFIX
+
+def _read_tenants():
+    """Reads tenants.json. Returns a dictionary of campus name -> TenantContext."""
+    try:
+        with open(TENANTS_FILE, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return {DEFAULT_TENANT: TenantContext(DEFAULT_TENANT, common.DATA_FILE)}
+    except json.JSONDecodeError as e:
+        raise TenantError(f"Could not read '{TENANTS_FILE}': {e}")
+    if not isinstance(config, dict) or not config or not all(isinstance(path, str) for path in config.values()):
+        raise TenantError(f"'{TENANTS_FILE}' must list each campus name with its data file, e.g. {{\"Home Campus\": \"data.json\"}}.")
+    return {name: TenantContext(name, data_file) for name, data_file in config.items()}
+
+# Every configured campus, by name. None until tenants.json is first needed (see _get_tenants),
+# so a broken tenants.json is reported by whoever uses it rather than while modules are imported.
+_tenants = None
+# The campus whose data is in common's globals.
+_active = None
+
+def _get_tenants():
+    """Returns every configured campus, reading tenants.json the first time.
+
+    common.py loads DATA_FILE when it is imported, so that campus starts out active. Raises TenantError
+    if tenants.json can't be read or doesn't list the data file that is loaded.
+    """
+    global _tenants, _active
+    if _tenants is None:
+        tenants = _read_tenants()
+        active = next((name for name, ctx in tenants.items() if ctx.data_file == common.DATA_FILE), None)
+        if active is None:
+            raise TenantError(f"The data file in use ('{common.DATA_FILE}') is not one of the campuses in '{TENANTS_FILE}'.")
+        _tenants, _active = tenants, active
+    return _tenants
+
+# --- Switching Campuses ---
+
+def list_tenants():
+    """Returns the campus names, in the order they appear in tenants.json."""
+    return list(_get_tenants())
+
+def active_tenant():
+    """Returns the name of the campus currently loaded into common's globals."""
+    _get_tenants()
+    return _active
+
+def _load_file(data_file):
+    """Reads a data file and returns (activities, students, users, teachers) with integer IDs."""
+    try:
+        with open(data_file, "r") as f:
+            data = json.load(f)
+        return ({int(k): v for k, v in data.get("activities", {}).items()},
+                {int(k): v for k, v in data.get("students", {}).items()},
+                data.get("users", {}),
+                {int(k): v for k, v in data.get("teachers", {}).items()})
+    except FileNotFoundError:
+        raise TenantError(f"Data file '{data_file}' not found.")
+    except (json.JSONDecodeError, ValueError, AttributeError) as e:
+        raise TenantError(f"Could not read '{data_file}': {e}")
+
+def activate_tenant(name):
+    """Makes a campus the active one, loading its data the first time it is used.
+
+    The outgoing campus's dictionaries are kept (not reloaded) in case it is used again soon.
+    Every module that imported common's dictionaries sees the new campus straight away,
+    because they are swapped in place.
+    """
+    global _active
+    ctx = _get_tenants().get(name)
+    if ctx is None:
+        raise TenantError(f"Unknown campus '{name}'.")
+    if name == _active:
+        ctx.last_used = time.monotonic()
+        return
+    # Load first, so a broken file leaves the current campus untouched.
+    incoming = ctx.stash or _load_file(ctx.data_file)
+
+    # Park the outgoing campus. Shallow copies are enough: install_data refills the globals with new dictionaries' contents.
+    if _active is not None:
+        outgoing = _tenants[_active]
+        outgoing.stash = (dict(activities), dict(students), dict(USERS), dict(teachers))
+        outgoing.last_used = time.monotonic()
+
+    install_data(*incoming)
+    ctx.stash = None
+    ctx.last_used = time.monotonic()
+    common.DATA_FILE = ctx.data_file
+    use_attendance_file(ctx.attendance_file)
+    use_ledger_file(ctx.ledger_file)
+    use_events_file(ctx.events_file)
+    invalidate_calendar()
+    _active = name
+    evict_idle()
+
+def evict_idle(now=None):
+    """Drops the data of campuses that haven't been used for TENANT_IDLE_SECONDS. Returns their names."""
+    now = now if now is not None else time.monotonic()
+    evicted = []
+    # Nothing can be idle before tenants.json has been read.
+    for name, ctx in (_tenants or {}).items():
+        if name != _active and ctx.stash is not None and now - ctx.last_used > TENANT_IDLE_SECONDS:
+            # Keep its summary up to date so cross-campus reports still don't need to load it.
+            _write_summary(ctx, summarise(ctx.stash[0], ctx.stash[1]))
+            ctx.stash = None
+            evicted.append(name)
+    return evicted
+
+# --- Per-Campus Summaries ---
+
+def summarise(activities_data, students_data):
+    """Returns the figures used by cross-campus reports for one campus's data."""
+    counts = {}
+    for s_data in students_data.values():
+        for act_id in s_data.get("activities_enrolled", []):
+            counts[act_id] = counts.get(act_id, 0) + 1
+    income = sum(data.get("cost", 0) * counts.get(act_id, 0) for act_id, data in activities_data.items())
+    return {
+        "students": len(students_data),
+        "activities": len(activities_data),
+        "enrolments": sum(counts.values()),
+        "income": income,
+    }
+
+def _file_stamp(path):
+    """Returns (modified time, size) of a file, used to tell whether a summary is out of date."""
+    info = os.stat(path)
+    return [info.st_mtime_ns, info.st_size]
+
+def _write_summary(ctx, summary):
+    """Saves a campus summary next to its data file, stamped with the data file it describes."""
+    try:
+        with open(ctx.summary_file, "w") as f:
+            json.dump({"source": _file_stamp(ctx.data_file), "summary": summary}, f)
+    except OSError:
+        # A missing summary only means the next report reads the data file instead.
+        pass
+
+def _read_summary(ctx):
+    """Returns a campus's saved summary if it still matches its data file, otherwise None."""
+    try:
+        with open(ctx.summary_file, "r") as f:
+            saved = json.load(f)
+        if saved.get("source") == _file_stamp(ctx.data_file):
+            return saved["summary"]
+    except (OSError, json.JSONDecodeError, KeyError):
+        pass
+    return None
+
+def tenant_summary(name):
+    """Returns one campus's summary, loading its data only if no up-to-date summary exists."""
+    ctx = _get_tenants()[name]
+    if name == _active:
+        summary = summarise(activities, students)
+    elif ctx.stash is not None:
+        summary = summarise(ctx.stash[0], ctx.stash[1])
+    else:
+        summary = _read_summary(ctx)
+        if summary is not None:
+            return summary
+        # Out of date: read the file once for the figures, without keeping the data loaded.
+        loaded = _load_file(ctx.data_file)
+        summary = summarise(loaded[0], loaded[1])
+    _write_summary(ctx, summary)
+    return summary
+
+def cross_campus_report():
+    """Returns (rows, totals): one (campus name, summary) row per campus plus the combined totals."""
+    rows = [(name, tenant_summary(name)) for name in _get_tenants()]
+    totals = {key: sum(summary[key] for _, summary in rows) for key in ("students", "activities", "enrolments", "income")}
+    return rows, totals
+
+def format_report(rows, totals):
+    """Turns cross_campus_report() output into lines of text."""
+    lines = []
+    for name, summary in rows + [("All campuses", totals)]:
+        lines.append(f"{name}: {summary['students']} students, {summary['activities']} activities, "
+                     f"{summary['enrolments']} enrolments, ${summary['income']} income")
+    return lines
+
+# --- Command Line Entry Point ---
+
+def main(argv=None):
+    """Command line entry point: python tenants.py  (prints the cross-campus summary)"""
+    argparse.ArgumentParser(description="Print enrolment and income totals for every campus in tenants.json.").parse_args(argv)
+    try:
+        print("\n".join(format_report(*cross_campus_report())))
+    except TenantError as e:
+        print(e)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
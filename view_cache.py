@@ -0,0 +1,56 @@
+# Import OrderedDict, which remembers the order keys were used in (needed for least-recently-used eviction).
+from collections import OrderedDict
+
+class LRUCache:
+    """A fixed-size cache of built view text, keyed by entity and checked against a version.
+
+    Each entry is stored under a key such as ("student", 101908) together with the version of the
+    data it was built from. A lookup with a different version counts as a miss and the entry is
+    rebuilt, so stale text is never shown. When the cache is full, the least recently used entry is dropped.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        # Key: entity key, Value: (version, cached value). The most recently used entries are at the end.
+        self.entries = OrderedDict()
+        # Counters used for tuning the cache size.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, version, builder):
+        """Returns the cached value for 'key' if it was built from 'version', otherwise builds and stores it."""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            # Mark the entry as recently used.
+            self.entries.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        value = builder()
+        self.entries[key] = (version, value)
+        self.entries.move_to_end(key)
+        # Drop the oldest entries if the cache has grown past its limit.
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def invalidate(self, key):
+        """Removes one entry (if present) so the next lookup rebuilds it."""
+        self.entries.pop(key, None)
+
+    def clear(self):
+        """Removes every entry (used when all data is reloaded). The statistics are kept."""
+        self.entries.clear()
+
+    def stats(self):
+        """Returns a dictionary of hit/miss counts and the current size, for tuning."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }